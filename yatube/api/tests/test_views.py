@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+encode = DjangoJSONEncoder().default
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Тест пост #{i}', group=cls.group
+            )
+            for i in range(settings.NUMBER_OF_POSTS + 3)
+        ]
+        cls.post = cls.posts[-1]
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        '''Ленты отдают посты страницами по курсору'''
+        newest = [post.id for post in reversed(self.posts)]
+        urls = (
+            reverse('api:post_list'),
+            reverse('api:group_post_list', kwargs={'slug': self.group.slug}),
+            reverse(
+                'api:profile_post_list',
+                kwargs={'username': self.author.username},
+            ),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url).json()
+                self.assertEqual(
+                    [post['id'] for post in first['results']],
+                    newest[: settings.NUMBER_OF_POSTS],
+                )
+                second = self.client.get(first['next']).json()
+                self.assertEqual(
+                    [post['id'] for post in second['results']],
+                    newest[settings.NUMBER_OF_POSTS:],
+                )
+                self.assertIsNone(second['next'])
+
+    def test_feed_in_one_query(self):
+        '''Страница ленты — один запрос, автор и группа в нём же'''
+        with self.assertNumQueries(1):
+            results = self.client.get(reverse('api:post_list')).json()
+        self.assertEqual(
+            results['results'][0],
+            {
+                'id': self.post.id,
+                'text': self.post.text,
+                'pub_date': encode(self.post.pub_date),
+                'updated': encode(self.post.updated),
+                'author': self.author.username,
+                'group': self.group.slug,
+                'image': None,
+            },
+        )
+
+    def test_sparse_fields(self):
+        '''?fields= оставляет в ответе только перечисленные поля'''
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.id})
+        response = self.client.get(url, {'fields': 'text,author'})
+        self.assertEqual(
+            response.json(),
+            {'text': self.post.text, 'author': self.author.username},
+        )
+        response = self.client.get(url, {'fields': 'text,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comments(self):
+        '''Комментарии поста с выбором полей'''
+        response = self.client.get(
+            reverse('api:comment_list', kwargs={'post_id': self.post.id}),
+            {'fields': 'author,text'},
+        )
+        self.assertEqual(
+            response.json()['results'],
+            [{'author': self.author.username, 'text': 'Комментарий'}],
+        )
+
+    def test_not_found(self):
+        '''Несуществующие объекты отвечают 404'''
+        urls = (
+            reverse('api:post_detail', kwargs={'post_id': 0}),
+            reverse('api:comment_list', kwargs={'post_id': 0}),
+            reverse('api:group_post_list', kwargs={'slug': 'missing'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_etag(self):
+        '''Неизменившаяся лента отвечает 304 без запросов к базе'''
+        url = reverse('api:post_list')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_etag(self):
+        '''Новый комментарий меняет ETag списка комментариев'''
+        url = reverse('api:comment_list', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.author, text='Ещё')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_comment_etag_follows_username(self):
+        '''ETag комментариев меняет только смена логина их автора'''
+        url = reverse('api:comment_list', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Имя'
+        author.set_password('new-password')
+        author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        author.username = 'Renamed'
+        author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'][0]['author'], 'Renamed')
+
+    def test_post_etag(self):
+        '''ETag поста меняют автор и группа, но не их новые посты'''
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.id})
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed-slug'
+        group.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['group'], 'renamed-slug')
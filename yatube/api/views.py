@@ -0,0 +1,237 @@
+import hashlib
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.http import condition, require_safe
+
+from posts import listings
+from posts.models import Comment, Group, Post, User
+from posts.utils import COMMENT_KEY, CURSOR_PARAM, FEED_KEY, CursorPaginator
+
+FIELDS_PARAM = 'fields'
+# Имя поля в ответе → поле для values(); связи берутся тем же запросом.
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'updated': 'updated',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+
+
+def image_url(name):
+    if not name:
+        return None
+    return Post._meta.get_field('image').storage.url(name)
+
+
+CONVERTERS = {'image': image_url}
+
+
+def selected_fields(request, available):
+    '''Поля из ?fields=a,b или все; None, если среди них есть чужие.'''
+    raw = request.GET.get(FIELDS_PARAM)
+    if not raw:
+        return list(available)
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    if not names or set(names) - available.keys():
+        return None
+    return list(dict.fromkeys(names))
+
+
+def fields_error(available):
+    return JsonResponse(
+        {'detail': f'Доступные поля: {", ".join(available)}.'}, status=400
+    )
+
+
+def not_found():
+    return JsonResponse({'detail': 'Не найдено.'}, status=404)
+
+
+def serialize(row, fields, available):
+    item = {}
+    for name in fields:
+        value = row[available[name]]
+        converter = CONVERTERS.get(name)
+        item[name] = converter(value) if converter else value
+    return item
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def page_response(request, queryset, available, key, per_page):
+    '''Страница строк values() по курсору, без экземпляров моделей.'''
+    fields = selected_fields(request, available)
+    if fields is None:
+        return fields_error(available)
+    # Поля ключа нужны пагинатору, даже если их не просили.
+    rows = queryset.values(*{available[name] for name in fields} | set(key))
+    paginator = CursorPaginator(rows, per_page, key=key)
+    page = paginator.get_page(request.GET.get(CURSOR_PARAM))
+    return JsonResponse(
+        {
+            'results': [serialize(row, fields, available) for row in page],
+            'next': page_url(request, page.next_cursor),
+            'previous': page_url(request, page.previous_cursor),
+        }
+    )
+
+
+def make_etag(request, *versions):
+    '''ETag из версий лент и строки запроса: курсор и поля тоже в нём.'''
+    raw = ':'.join([*map(str, versions), request.GET.urlencode()])
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def feed_etag(request, namespace):
+    return make_etag(request, listings.version(namespace))
+
+
+def group_id(slug):
+    return Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+
+
+def author_id(username):
+    return (
+        User.objects.filter(username=username)
+        .values_list('pk', flat=True)
+        .first()
+    )
+
+
+def post_list_etag(request):
+    return feed_etag(request, listings.INDEX)
+
+
+def group_post_list_etag(request, slug):
+    pk = group_id(slug)
+    if pk is None:
+        return None
+    return feed_etag(request, listings.group_namespace(pk))
+
+
+def profile_post_list_etag(request, username):
+    pk = author_id(username)
+    if pk is None:
+        return None
+    return feed_etag(request, listings.profile_namespace(pk))
+
+
+def post_detail_etag(request, post_id):
+    '''Время изменения поста и версии самих автора и группы.
+
+    Версии их лент сюда не входят: новый пост автора не меняет
+    ответ о старом.
+    '''
+    found = (
+        Post.objects.filter(pk=post_id)
+        .values_list('updated', 'author_id', 'group_id')
+        .first()
+    )
+    if found is None:
+        return None
+    updated, author, group = found
+    namespaces = [listings.author_entity_namespace(author)]
+    if group is not None:
+        namespaces.append(listings.group_entity_namespace(group))
+    versions = listings.versions(*namespaces)
+    return make_etag(
+        request, updated.timestamp(), *(versions[name] for name in namespaces)
+    )
+
+
+def comment_list_etag(request, post_id):
+    return feed_etag(request, listings.comments_namespace(post_id))
+
+
+@require_safe
+@condition(etag_func=post_list_etag)
+def post_list(request):
+    '''Главная лента.'''
+    return page_response(
+        request,
+        Post.objects.all(),
+        POST_FIELDS,
+        FEED_KEY,
+        settings.NUMBER_OF_POSTS,
+    )
+
+
+@require_safe
+@condition(etag_func=group_post_list_etag)
+def group_post_list(request, slug):
+    '''Лента группы.'''
+    pk = group_id(slug)
+    if pk is None:
+        return not_found()
+    return page_response(
+        request,
+        Post.objects.filter(group_id=pk),
+        POST_FIELDS,
+        FEED_KEY,
+        settings.NUMBER_OF_POSTS,
+    )
+
+
+@require_safe
+@condition(etag_func=profile_post_list_etag)
+def profile_post_list(request, username):
+    '''Лента автора.'''
+    pk = author_id(username)
+    if pk is None:
+        return not_found()
+    return page_response(
+        request,
+        Post.objects.filter(author_id=pk),
+        POST_FIELDS,
+        FEED_KEY,
+        settings.NUMBER_OF_POSTS,
+    )
+
+
+@require_safe
+@condition(etag_func=post_detail_etag)
+def post_detail(request, post_id):
+    '''Отдельный пост.'''
+    fields = selected_fields(request, POST_FIELDS)
+    if fields is None:
+        return fields_error(POST_FIELDS)
+    row = (
+        Post.objects.filter(pk=post_id)
+        .values(*{POST_FIELDS[name] for name in fields})
+        .first()
+    )
+    if row is None:
+        return not_found()
+    return JsonResponse(serialize(row, fields, POST_FIELDS))
+
+
+@require_safe
+@condition(etag_func=comment_list_etag)
+def comment_list(request, post_id):
+    '''Комментарии поста от новых к старым.'''
+    if not Post.objects.filter(pk=post_id).exists():
+        return not_found()
+    return page_response(
+        request,
+        Comment.objects.filter(post_id=post_id),
+        COMMENT_FIELDS,
+        COMMENT_KEY,
+        settings.NUMBER_OF_COMMENTS,
+    )
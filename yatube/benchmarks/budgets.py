@@ -0,0 +1,47 @@
+'''Предельное число запросов к базе на страницу, по имени адреса.
+
+Бюджет — число запросов одной страницы при холодном кеше, поэтому он
+не зависит от того, сколько постов, авторов и комментариев на ней
+показано. Тест benchmarks.tests.test_budgets открывает каждую
+страницу на засеянных данных, отправляет формы записи и падает, если
+бюджет превышен.
+'''
+
+# Под входом любая страница читает сессию и пользователя: два запроса.
+# Списки постов с картинками ищут готовые миниатюры одним запросом.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:index_rss': 1,
+    'posts:index_atom': 1,
+    'posts:group_list': 5,
+    'posts:group_rss': 3,
+    'posts:group_atom': 3,
+    'posts:profile': 5,
+    'posts:profile_rss': 3,
+    'posts:profile_atom': 3,
+    'posts:post_detail': 5,
+    'posts:post_create': 3,
+    'posts:post_edit': 4,
+    'posts:add_comment': 2,
+    'posts:post_comments': 2,
+    'posts:follow_index': 5,
+    'posts:export': 4,
+    'posts:search': 2,
+    'posts:autocomplete': 2,
+    'posts:profile_follow': 15,
+    'posts:profile_unfollow': 9,
+    'users:logout': 4,
+    'users:login': 0,
+    'users:signup': 0,
+    'about:author': 0,
+    'about:tech': 0,
+}
+
+# POST с верной формой: сигналы счётчиков, версий лент, раскладки по
+# лентам подписчиков, картинок и поиска тоже входят в бюджет. В тестах
+# транзакция save() — это SAVEPOINT и RELEASE, они тоже считаются.
+WRITE_BUDGETS = {
+    'posts:post_create': 25,
+    'posts:post_edit': 12,
+    'posts:add_comment': 9,
+}
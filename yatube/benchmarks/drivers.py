@@ -0,0 +1,168 @@
+import threading
+from http.client import HTTPConnection, HTTPException
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer,
+    WSGIRequestHandler,
+)
+from django.db import connection
+
+HOST = '127.0.0.1'
+QUERIES_HEADER = 'X-Benchmark-Queries'
+FORM = 'application/x-www-form-urlencoded'
+
+
+def counting(app):
+    '''WSGI-обёртка, которая отдаёт число запросов к базе в заголовке.
+
+    Считаются запросы потока, обработавшего запрос, поэтому оба
+    драйвера получают число одинаково.
+    '''
+
+    def wrapped(environ, start_response):
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        def start(status, headers, exc_info=None):
+            headers = [*headers, (QUERIES_HEADER, str(queries))]
+            return start_response(status, headers, exc_info)
+
+        with connection.execute_wrapper(count):
+            return app(environ, start)
+
+    return wrapped
+
+
+def encode(request):
+    if request.data is None:
+        return b''
+    return urlencode(request.data).encode()
+
+
+class InProcessDriver:
+    '''Вызывает WSGI-приложение напрямую, без сокетов.'''
+
+    name = 'inprocess'
+
+    def __init__(self):
+        self.app = counting(WSGIHandler())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def send(self, request):
+        body = encode(request)
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'PATH_INFO': request.path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': HOST,
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': HOST,
+            'CONTENT_TYPE': FORM,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+            'wsgi.errors': BytesIO(),
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if request.session is not None:
+            environ['HTTP_COOKIE'] = request.session.cookie
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split()[0])
+            started['headers'] = dict(headers)
+
+        response = self.app(environ, start_response)
+        try:
+            # Тело читается целиком, как его читал бы сервер.
+            for _ in response:
+                pass
+        finally:
+            response.close()
+        return started['status'], int(started['headers'][QUERIES_HEADER])
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class HttpDriver:
+    '''Поднимает многопоточный WSGI-сервер на локальном порту.
+
+    У каждого потока нагрузки своё keep-alive соединение.
+    '''
+
+    name = 'http'
+
+    def __init__(self):
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.server = ThreadedWSGIServer(
+            (HOST, 0), QuietRequestHandler, allow_reuse_address=False
+        )
+        self.server.set_app(counting(WSGIHandler()))
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for http in self.connections:
+            http.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def connection(self):
+        http = getattr(self.local, 'http', None)
+        if http is None:
+            http = HTTPConnection(HOST, self.server.server_port)
+            self.local.http = http
+            with self.lock:
+                self.connections.append(http)
+        return http
+
+    def send(self, request):
+        http = self.connection()
+        headers = {}
+        if request.data is not None:
+            headers['Content-Type'] = FORM
+        if request.session is not None:
+            headers['Cookie'] = request.session.cookie
+        try:
+            http.request(
+                request.method,
+                request.path,
+                encode(request) or None,
+                headers,
+            )
+            response = http.getresponse()
+            response.read()
+        except (OSError, HTTPException):
+            http.close()
+            return None, 0
+        return response.status, int(response.getheader(QUERIES_HEADER, 0))
+
+
+DRIVERS = {driver.name: driver for driver in (InProcessDriver, HttpDriver)}
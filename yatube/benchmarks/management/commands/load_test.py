@@ -0,0 +1,195 @@
+import json
+import os
+import platform
+import random
+import subprocess
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from benchmarks import report, runner
+from benchmarks.drivers import DRIVERS
+from benchmarks.scenarios import (
+    DEFAULT_MIX,
+    VIEWS,
+    Targets,
+    open_sessions,
+    plan,
+)
+from posts.models import Post, User
+
+
+def parse_mix(value):
+    '''Разбирает смесь вида index=30,post_detail=25.'''
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in VIEWS:
+            raise CommandError(f'Неизвестная вью {name!r}.')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Неверный вес {part!r}.')
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон вью ленты, группы, профиля, поста, ленты '
+        'подписок, создания поста и комментария. Запросы идут в '
+        'WSGI-приложение напрямую или через локальный HTTP-сервер, '
+        'отчёт — p50/p95/p99, rps и запросы к базе на вью, сохраняется '
+        'в JSON. Пишущие вью создают в базе настоящие посты и '
+        'комментарии.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--driver', choices=sorted(DRIVERS), default='inprocess'
+        )
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=50,
+            help='Запросы перед замером, в отчёт не входят.',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--logged-in',
+            type=float,
+            default=0.3,
+            help='Доля запросов от вошедших пользователей.',
+        )
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            default=50,
+            help='Сколько читателей с подписками входит на время прогона.',
+        )
+        parser.add_argument(
+            '--mix',
+            type=parse_mix,
+            default=DEFAULT_MIX,
+            help='Веса вью, например index=30,post_detail=25.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--output',
+            help='Файл результата; по умолчанию новый файл в '
+            'BENCHMARK_ROOT.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON прошлого прогона для сравнения p95 и запросов.',
+        )
+        parser.add_argument(
+            '--debug',
+            action='store_true',
+            help='Не отключать DEBUG: с ним работает debug toolbar и '
+            'копится журнал SQL, задержки не похожи на боевые.',
+        )
+
+    def handle(self, *args, debug, **options):
+        if debug:
+            return self.benchmark(**options)
+        with override_settings(DEBUG=False):
+            return self.benchmark(**options)
+
+    def benchmark(
+        self,
+        driver,
+        requests,
+        warmup,
+        concurrency,
+        logged_in,
+        sessions,
+        mix,
+        seed,
+        output,
+        compare,
+        **options,
+    ):
+        if concurrency < 1 or requests < 1:
+            raise CommandError('Нужны хотя бы один поток и один запрос.')
+        if not mix:
+            raise CommandError('В смеси нет ни одной вью.')
+        if not any(not VIEWS[name][1] for name in mix) and logged_in < 1:
+            raise CommandError('Анонимам нечего запрашивать в этой смеси.')
+        rng = random.Random(seed)
+        targets = Targets(rng)
+        if not targets.posts:
+            raise CommandError('В базе нет постов, сначала запустите seed.')
+        opened = open_sessions(targets, sessions) if logged_in > 0 else []
+        if logged_in > 0 and not opened:
+            raise CommandError('В базе нет подписок, войти некому.')
+        requests_plan = list(
+            plan(targets, opened, mix, logged_in, warmup + requests, seed)
+        )
+        started = timezone.now()
+        try:
+            with DRIVERS[driver]() as client:
+                runner.run(client, requests_plan[:warmup], concurrency)
+                rows, seconds = runner.run(
+                    client, requests_plan[warmup:], concurrency
+                )
+        finally:
+            for session in opened:
+                session.close()
+        views, total = report.summarize(rows, seconds)
+        result = {
+            'meta': {
+                'started': started.isoformat(),
+                'seconds': round(seconds, 3),
+                'driver': driver,
+                'requests': requests,
+                'warmup': warmup,
+                'concurrency': concurrency,
+                'logged_in': logged_in,
+                'sessions': len(opened),
+                'mix': mix,
+                'seed': seed,
+                'commit': commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+            },
+            'views': views,
+            'total': total,
+        }
+        path = output or os.path.join(
+            settings.BENCHMARK_ROOT,
+            f'{started:%Y%m%d-%H%M%S}-{driver}.json',
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        for line in report.table(views, total):
+            self.stdout.write(line)
+        if compare:
+            with open(compare, encoding='utf-8') as file:
+                previous = json.load(file)
+            self.stdout.write('')
+            for line in report.compare(previous, views, total):
+                self.stdout.write(line)
+        self.stdout.write(f'Результат: {path}')
@@ -0,0 +1,87 @@
+from collections import Counter, defaultdict
+
+TOTAL = 'total'
+SHARES = {'p50_ms': 0.5, 'p95_ms': 0.95, 'p99_ms': 0.99}
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def is_error(status):
+    return status is None or status >= 400
+
+
+def stats(rows, seconds):
+    '''Задержки, пропускная способность и запросы к базе для строк.'''
+    latencies = [elapsed for _, _, elapsed, _ in rows]
+    queries = [count for _, _, _, count in rows]
+    statuses = Counter(str(status) for _, status, _, _ in rows)
+    result = {
+        'requests': len(rows),
+        'errors': sum(is_error(status) for _, status, _, _ in rows),
+        'statuses': dict(sorted(statuses.items())),
+        'rps': round(len(rows) / seconds, 2) if seconds else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(max(latencies), 2),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+    }
+    for name, share in SHARES.items():
+        result[name] = round(percentile(latencies, share), 2)
+    return result
+
+
+def summarize(rows, seconds):
+    '''Сводка по каждой вью и по всему прогону.
+
+    rows — (вью, статус, мс, запросов к базе); rps вью считается от
+    времени всего прогона, поэтому rps вью в сумме дают общий.
+    '''
+    by_view = defaultdict(list)
+    for row in rows:
+        by_view[row[0]].append(row)
+    views = {
+        view: stats(view_rows, seconds)
+        for view, view_rows in sorted(by_view.items())
+    }
+    return views, stats(rows, seconds)
+
+
+def table(views, total):
+    yield (
+        f'{"вью":<14}{"запр.":>7}{"ошиб.":>7}{"rps":>9}'
+        f'{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>7}'
+    )
+    for view, row in [*views.items(), (TOTAL, total)]:
+        yield (
+            f'{view:<14}{row["requests"]:>7}{row["errors"]:>7}'
+            f'{row["rps"] or 0:>9.1f}{row["p50_ms"]:>9.2f}'
+            f'{row["p95_ms"]:>9.2f}{row["p99_ms"]:>9.2f}'
+            f'{row["queries_mean"]:>7.1f}'
+        )
+
+
+def change(old, new):
+    if not old:
+        return ''
+    return f'{(new - old) / old:+.0%}'
+
+
+def compare(previous, views, total):
+    '''Строки сравнения p95 и запросов к базе с прошлым прогоном.'''
+    before = {**previous['views'], TOTAL: previous['total']}
+    yield (
+        f'{"вью":<14}{"p95 было":>10}{"стало":>9}{"":>7}'
+        f'{"SQL было":>10}{"стало":>7}'
+    )
+    for view, row in [*views.items(), (TOTAL, total)]:
+        old = before.get(view)
+        if old is None:
+            continue
+        yield (
+            f'{view:<14}{old["p95_ms"]:>10.2f}{row["p95_ms"]:>9.2f}'
+            f'{change(old["p95_ms"], row["p95_ms"]):>7}'
+            f'{old["queries_mean"]:>10.1f}{row["queries_mean"]:>7.1f}'
+        )
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from django.db import connections
+
+
+def run(driver, requests, concurrency):
+    '''Шлёт запросы из concurrency потоков, пока они не кончатся.
+
+    Возвращает строки (вью, статус, мс, запросов к базе) и длительность
+    прогона в секундах. При одном потоке запросы идут из текущего.
+    '''
+    rows = []
+    pending = iter(requests)
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            with lock:
+                request = next(pending, None)
+            if request is None:
+                return
+            started = time.perf_counter()
+            status, queries = driver.send(request)
+            elapsed = (time.perf_counter() - started) * 1000
+            rows.append((request.view, status, elapsed, queries))
+
+    def work_in_thread():
+        try:
+            work()
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        work()
+    else:
+        threads = [
+            threading.Thread(target=work_in_thread)
+            for _ in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return rows, time.perf_counter() - started
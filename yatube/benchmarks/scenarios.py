@@ -0,0 +1,182 @@
+import random
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY,
+    HASH_SESSION_KEY,
+    SESSION_KEY,
+)
+from django.db.models import Max, Min
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.urls import reverse
+
+from posts.models import Follow, Post, User
+
+GET = 'GET'
+POST = 'POST'
+# Сколько постов и читателей берётся из базы в выборку адресов.
+TARGETS = 1000
+SHARE_WITH_GROUP = 0.7
+
+
+class Targets:
+    '''Случайная выборка постов, авторов, групп и читателей из базы.
+
+    Строки выбираются по случайным id из диапазона, поэтому выборка
+    не сканирует таблицы даже на миллионах постов.
+    '''
+
+    def __init__(self, rng, size=TARGETS):
+        rows = Post.objects.filter(
+            pk__in=sample_pks(Post, size, rng)
+        ).values_list('pk', 'author__username', 'group_id', 'group__slug')
+        self.posts = []
+        authors, groups = set(), set()
+        for pk, username, group_id, slug in rows.order_by('pk'):
+            self.posts.append(pk)
+            authors.add(username)
+            if group_id is not None:
+                groups.add((group_id, slug))
+        self.authors = sorted(authors)
+        self.groups = sorted(groups)
+        readers = Follow.objects.filter(
+            pk__in=sample_pks(Follow, size, rng)
+        ).values_list('user_id', flat=True)
+        self.readers = sorted(set(readers))
+
+
+def sample_pks(model, count, rng):
+    bounds = model.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    ids = range(bounds['low'], bounds['high'] + 1)
+    return rng.sample(ids, min(count, len(ids)))
+
+
+def text(rng):
+    return f'Нагрузочный тест {rng.getrandbits(32):08x}'
+
+
+def index(targets, rng):
+    return GET, reverse('posts:index'), None
+
+
+def group_posts(targets, rng):
+    _, slug = rng.choice(targets.groups)
+    return GET, reverse('posts:group_list', args=[slug]), None
+
+
+def profile(targets, rng):
+    username = rng.choice(targets.authors)
+    return GET, reverse('posts:profile', args=[username]), None
+
+
+def post_detail(targets, rng):
+    post_id = rng.choice(targets.posts)
+    return GET, reverse('posts:post_detail', args=[post_id]), None
+
+
+def follow_index(targets, rng):
+    return GET, reverse('posts:follow_index'), None
+
+
+def post_create(targets, rng):
+    data = {'text': text(rng)}
+    if targets.groups and rng.random() < SHARE_WITH_GROUP:
+        group_id, _ = rng.choice(targets.groups)
+        data['group'] = str(group_id)
+    return POST, reverse('posts:post_create'), data
+
+
+def add_comment(targets, rng):
+    post_id = rng.choice(targets.posts)
+    data = {'text': text(rng)}
+    return POST, reverse('posts:add_comment', args=[post_id]), data
+
+
+# Имя вью: (построитель запроса, нужен ли вход).
+VIEWS = {
+    'index': (index, False),
+    'group_posts': (group_posts, False),
+    'profile': (profile, False),
+    'post_detail': (post_detail, False),
+    'follow_index': (follow_index, True),
+    'post_create': (post_create, True),
+    'add_comment': (add_comment, True),
+}
+DEFAULT_MIX = {
+    'index': 30,
+    'group_posts': 15,
+    'profile': 15,
+    'post_detail': 25,
+    'follow_index': 10,
+    'post_create': 2,
+    'add_comment': 3,
+}
+
+
+class Session:
+    '''Вошедший пользователь: сессия в базе и пара токенов CSRF.'''
+
+    def __init__(self, user):
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store[SESSION_KEY] = user._meta.pk.value_to_string(user)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        self.store = store
+        request = HttpRequest()
+        self.token = get_token(request)
+        self.cookie = (
+            f'{settings.SESSION_COOKIE_NAME}={store.session_key}; '
+            f'{settings.CSRF_COOKIE_NAME}={request.META["CSRF_COOKIE"]}'
+        )
+
+    def close(self):
+        self.store.delete()
+
+
+def open_sessions(targets, count):
+    return [
+        Session(user)
+        for user in User.objects.filter(pk__in=targets.readers[:count])
+    ]
+
+
+class Request:
+    def __init__(self, view, method, path, data, session):
+        self.view = view
+        self.method = method
+        self.path = path
+        self.data = data
+        self.session = session
+        if data is not None and session is not None:
+            data['csrfmiddlewaretoken'] = session.token
+
+
+def plan(targets, sessions, mix, logged_in, total, seed):
+    '''Детерминированная последовательность запросов смеси mix.
+
+    Доля logged_in запросов идёт от вошедших пользователей, остальные
+    анонимны и выбирают только вью, не требующие входа.
+    '''
+    rng = random.Random(seed)
+    if not targets.groups:
+        mix = {
+            name: weight
+            for name, weight in mix.items()
+            if name != 'group_posts'
+        }
+    public = {
+        name: weight for name, weight in mix.items() if not VIEWS[name][1]
+    }
+    for _ in range(total):
+        session = None
+        if sessions and rng.random() < logged_in:
+            session = rng.choice(sessions)
+        choices = mix if session else public
+        name = rng.choices(list(choices), list(choices.values()))[0]
+        method, path, data = VIEWS[name][0](targets, rng)
+        yield Request(name, method, path, data, session)
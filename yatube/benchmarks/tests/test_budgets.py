@@ -0,0 +1,278 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from about import urls as about_urls
+from benchmarks.budgets import QUERY_BUDGETS, WRITE_BUDGETS
+from posts import urls as posts_urls
+from posts.models import Group, Post, User
+from users import urls as users_urls
+
+URLCONFS = (posts_urls, users_urls, about_urls)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def url_names():
+    return {
+        f'{urlconf.app_name}:{pattern.name}'
+        for urlconf in URLCONFS
+        for pattern in urlconf.urlpatterns
+        if isinstance(pattern, URLPattern) and pattern.name
+    }
+
+
+# Порог ниже, чем у самых популярных засеянных авторов, чтобы лента
+# подписок читала и разложенные записи, и посты авторов напрямую.
+@override_settings(TIMELINE_PUSH_FOLLOWER_LIMIT=8, MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed',
+            users=40,
+            groups=4,
+            posts=300,
+            comments=3,
+            follows=8,
+            seed=3,
+            chunk_size=100,
+            stdout=StringIO(),
+        )
+        cls.reader = (
+            User.objects.annotate(total=Count('follower'))
+            .order_by('-total', 'pk')
+            .first()
+        )
+        cls.author = (
+            User.objects.annotate(total=Count('posts'))
+            .order_by('-total', 'pk')
+            .first()
+        )
+        cls.stranger = (
+            User.objects.exclude(pk=cls.reader.pk)
+            .exclude(following__user=cls.reader)
+            .order_by('pk')
+            .first()
+        )
+        cls.group = (
+            Group.objects.annotate(total=Count('posts'))
+            .order_by('-total', 'pk')
+            .first()
+        )
+        # Автор с подписчиками ниже порога: его новый пост раскладывается
+        # по лентам подписчиков при записи.
+        cls.writer = (
+            User.objects.annotate(total=Count('following'))
+            .filter(total__gt=0, total__lt=8)
+            .order_by('-total', 'pk')
+            .first()
+        )
+        cls.post = Post.objects.order_by('-comments_count', 'pk').first()
+        cls.own_post = cls.author.posts.first()
+        # Засев картинок не делает: без них поиск миниатюр карточек
+        # не попал бы в бюджет страниц со списками постов.
+        illustrated = {
+            *Post.objects.all()[:3],
+            *cls.author.posts.all()[:3],
+            *cls.group.posts.all()[:3],
+            cls.post,
+        }
+        for post in illustrated:
+            post.image = ContentFile(SMALL_GIF, name=f'{post.pk}.gif')
+            post.save()
+        call_command(
+            'thumbnail_worker', processes=1, once=True, stdout=StringIO()
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def pages(self):
+        '''(имя адреса, адрес, пользователь) для каждой страницы.'''
+        author, reader, stranger = self.author, self.reader, self.stranger
+        word = self.post.text.split()[0]
+        return [
+            ('posts:index', reverse('posts:index'), reader),
+            ('posts:index_rss', reverse('posts:index_rss'), None),
+            ('posts:index_atom', reverse('posts:index_atom'), None),
+            (
+                'posts:group_list',
+                reverse('posts:group_list', args=[self.group.slug]),
+                reader,
+            ),
+            (
+                'posts:group_rss',
+                reverse('posts:group_rss', args=[self.group.slug]),
+                None,
+            ),
+            (
+                'posts:group_atom',
+                reverse('posts:group_atom', args=[self.group.slug]),
+                None,
+            ),
+            (
+                'posts:profile',
+                reverse('posts:profile', args=[author.username]),
+                reader,
+            ),
+            (
+                'posts:profile_rss',
+                reverse('posts:profile_rss', args=[author.username]),
+                None,
+            ),
+            (
+                'posts:profile_atom',
+                reverse('posts:profile_atom', args=[author.username]),
+                None,
+            ),
+            (
+                'posts:post_detail',
+                reverse('posts:post_detail', args=[self.post.pk]),
+                reader,
+            ),
+            ('posts:post_create', reverse('posts:post_create'), author),
+            (
+                'posts:post_edit',
+                reverse('posts:post_edit', args=[self.own_post.pk]),
+                author,
+            ),
+            (
+                'posts:add_comment',
+                reverse('posts:add_comment', args=[self.post.pk]),
+                reader,
+            ),
+            (
+                'posts:post_comments',
+                reverse('posts:post_comments', args=[self.post.pk]),
+                None,
+            ),
+            ('posts:follow_index', reverse('posts:follow_index'), reader),
+            ('posts:export', reverse('posts:export'), author),
+            ('posts:search', reverse('posts:search') + f'?q={word}', None),
+            (
+                'posts:autocomplete',
+                reverse('posts:autocomplete') + f'?q={author.username[:5]}',
+                None,
+            ),
+            (
+                'posts:profile_follow',
+                reverse('posts:profile_follow', args=[stranger.username]),
+                reader,
+            ),
+            (
+                'posts:profile_unfollow',
+                reverse('posts:profile_unfollow', args=[stranger.username]),
+                reader,
+            ),
+            ('users:login', reverse('users:login'), None),
+            ('users:signup', reverse('users:signup'), None),
+            ('users:logout', reverse('users:logout'), reader),
+            ('about:author', reverse('about:author'), None),
+            ('about:tech', reverse('about:tech'), None),
+        ]
+
+    def writes(self):
+        '''(имя адреса, адрес, пользователь, данные формы) для POST.'''
+        group = Group.objects.exclude(pk=self.own_post.group_id).first()
+        return [
+            (
+                'posts:post_create',
+                reverse('posts:post_create'),
+                self.writer,
+                {
+                    'text': 'Новый пост',
+                    'group': self.group.pk,
+                    'image': SimpleUploadedFile(
+                        'new.gif', SMALL_GIF, content_type='image/gif'
+                    ),
+                },
+            ),
+            (
+                'posts:post_edit',
+                reverse('posts:post_edit', args=[self.own_post.pk]),
+                self.author,
+                {'text': 'Правка', 'group': group.pk},
+            ),
+            (
+                'posts:add_comment',
+                reverse('posts:add_comment', args=[self.post.pk]),
+                self.reader,
+                {'text': 'Новый комментарий'},
+            ),
+        ]
+
+    def check_budget(self, name, budget, user, request):
+        cache.clear()
+        if user is None:
+            self.client.logout()
+        else:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        if len(queries) > budget:
+            sql = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(queries, start=1)
+            )
+            self.fail(
+                f'{name}: {len(queries)} запросов при бюджете '
+                f'{budget}:\n{sql}'
+            )
+        return response
+
+    def test_every_page_has_budget(self):
+        """У каждого адреса posts, users и about есть бюджет и страница"""
+        names = url_names()
+        self.assertEqual(set(QUERY_BUDGETS), names)
+        self.assertEqual({name for name, _, _ in self.pages()}, names)
+
+    def test_pages_within_budget(self):
+        """Страницы укладываются в бюджет запросов при холодном кеше"""
+        for name, url, user in self.pages():
+            with self.subTest(name=name):
+                self.check_budget(
+                    name,
+                    QUERY_BUDGETS[name],
+                    user,
+                    lambda: self.client.get(url),
+                )
+
+    def test_writes_within_budget(self):
+        """Отправка форм со всеми сигналами укладывается в бюджет"""
+        self.assertEqual(
+            {name for name, *_ in self.writes()}, set(WRITE_BUDGETS)
+        )
+        for name, url, user, data in self.writes():
+            with self.subTest(name=name):
+                response = self.check_budget(
+                    name,
+                    WRITE_BUDGETS[name],
+                    user,
+                    lambda: self.client.post(url, data),
+                )
+                # Неверная форма отрисовалась бы заново с кодом 200.
+                self.assertEqual(response.status_code, 302)
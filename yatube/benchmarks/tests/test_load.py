@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+
+from benchmarks.report import percentile
+from benchmarks.scenarios import VIEWS
+from posts.models import Comment, Follow, Group, Post, User
+
+
+def populate():
+    author = User.objects.create_user(username='author')
+    reader = User.objects.create_user(username='reader')
+    group = Group.objects.create(
+        title='Группа', slug='group', description='Описание'
+    )
+    Follow.objects.create(user=reader, author=author)
+    for number in range(15):
+        Post.objects.create(
+            author=author,
+            group=group if number % 2 else None,
+            text=f'Пост {number}',
+        )
+
+
+class LoadTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def load_test(self, **options):
+        path = os.path.join(self.root, 'result.json')
+        call_command(
+            'load_test',
+            requests=60,
+            warmup=5,
+            logged_in=0.5,
+            output=path,
+            stdout=StringIO(),
+            **options,
+        )
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+
+    def assert_result(self, result, views=VIEWS):
+        self.assertEqual(set(result['views']), set(views))
+        self.assertEqual(result['total']['requests'], 60)
+        self.assertEqual(result['total']['errors'], 0)
+        for row in result['views'].values():
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+            self.assertLessEqual(row['p95_ms'], row['p99_ms'])
+            self.assertGreater(row['queries_mean'], 0)
+
+
+class InProcessLoadTest(LoadTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        populate()
+
+    def test_report(self):
+        """Прогон в процессе покрывает все вью без ошибок"""
+        posts = Post.objects.count()
+        result = self.load_test(
+            concurrency=1,
+            mix={name: 1 for name in VIEWS},
+        )
+        self.assert_result(result)
+        views = result['views']
+        self.assertEqual(
+            Post.objects.count() - posts, views['post_create']['requests']
+        )
+        self.assertEqual(
+            Comment.objects.count(), views['add_comment']['requests']
+        )
+
+    def test_compare(self):
+        """Отчёт сравнивается с сохранённым прошлым прогоном"""
+        previous = os.path.join(self.root, 'previous.json')
+        call_command(
+            'load_test',
+            requests=10,
+            warmup=0,
+            concurrency=1,
+            output=previous,
+            stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command(
+            'load_test',
+            requests=10,
+            warmup=0,
+            concurrency=1,
+            output=os.path.join(self.root, 'current.json'),
+            compare=previous,
+            stdout=out,
+        )
+        self.assertIn('p95 было', out.getvalue())
+
+    def test_unknown_view(self):
+        """Неизвестная вью в смеси отклоняется"""
+        with self.assertRaises(CommandError):
+            call_command('load_test', '--mix', 'nope=1', stdout=StringIO())
+
+    def test_percentile(self):
+        """Процентиль берётся по рангу"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 51)
+        self.assertEqual(percentile(values, 0.99), 100)
+
+
+class HttpLoadTest(LoadTestMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        populate()
+
+    def test_report(self):
+        """Прогон через HTTP-сервер в несколько потоков без ошибок"""
+        # Общая тестовая база в памяти блокирует таблицу целиком при
+        # записи из соседнего потока, поэтому здесь только чтение.
+        mix = {'index': 1, 'post_detail': 1, 'follow_index': 1}
+        result = self.load_test(driver='http', concurrency=3, mix=mix)
+        self.assert_result(result, mix)
+        self.assertEqual(result['meta']['driver'], 'http')
@@ -0,0 +1,244 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_meta (id, total) VALUES (0, 0);
+'''
+# SQLite ограничивает число параметров в одном запросе.
+MAX_VARIABLES = 500
+
+
+class SQLiteCache(BaseCache):
+    '''Кеш в файле SQLite в режиме WAL, общий для всех процессов хоста.
+
+    Когда суммарный объём значений превышает MAX_SIZE байт, вытесняются
+    давно не читавшиеся записи (LRU), пока объём не опустится до
+    CULL_TARGET от предела. Время чтения обновляется не чаще раза в
+    ACCESS_RESOLUTION секунд, чтобы чтения почти не порождали записей.
+    '''
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self.cull_target = float(options.get('CULL_TARGET', 0.9))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 60))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        # После fork соединение родителя использовать нельзя.
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            local.pid, local.connection = os.getpid(), connection
+        return local.connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, keys):
+        '''Читает живые записи и освежает у них время последнего чтения.'''
+        now = time.time()
+        found, stale = {}, []
+        connection = self._connection()
+        for start in range(0, len(keys), MAX_VARIABLES):
+            chunk = keys[start: start + MAX_VARIABLES]
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                chunk,
+            )
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = value
+                if now - accessed > self.access_resolution:
+                    stale.append((now, key))
+        if stale:
+            with self._write() as connection:
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?', stale
+                )
+        metrics.count_cache(len(found), len(keys) - len(found))
+        return found
+
+    def _grow(self, connection, delta):
+        connection.execute(
+            'UPDATE cache_meta SET total = total + ? WHERE id = 0', (delta,)
+        )
+        if delta <= 0:
+            return
+        (total,) = connection.execute(
+            'SELECT total FROM cache_meta WHERE id = 0'
+        ).fetchone()
+        if total > self.max_size:
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (time.time(),),
+        )
+        (total,) = connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        excess = total - self.max_size * self.cull_target
+        victims = []
+        if excess > 0:
+            rows = connection.execute(
+                'SELECT key, size FROM cache ORDER BY accessed'
+            )
+            for key, size in rows:
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+        connection.executemany('DELETE FROM cache WHERE key = ?', victims)
+        connection.execute(
+            'UPDATE cache_meta SET total = '
+            '(SELECT COALESCE(SUM(size), 0) FROM cache) WHERE id = 0'
+        )
+
+    def _store(self, connection, key, value, timeout, only_new=False):
+        now = time.time()
+        row = connection.execute(
+            'SELECT size, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row and only_new and (row[1] is None or row[1] > now):
+            return False
+        blob = pickle.dumps(value, self.pickle_protocol)
+        connection.execute(
+            'INSERT OR REPLACE INTO cache '
+            '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            (key, blob, self.get_backend_timeout(timeout), now, len(blob)),
+        )
+        self._grow(connection, len(blob) - (row[0] if row else 0))
+        return True
+
+    def _remove(self, connection, key):
+        row = connection.execute(
+            'SELECT size FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return False
+        connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+        self._grow(connection, -row[0])
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            return self._store(connection, key, value, timeout, only_new=True)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._fetch([key])
+        return pickle.loads(found[key]) if key in found else default
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(keys))
+        return {keys[key]: pickle.loads(value) for key, value in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._fetch([key])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            self._store(connection, key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as connection:
+            for key, value in data.items():
+                key = self._key(key, version)
+                self._store(connection, key, value, timeout)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            updated = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            ).rowcount
+        return bool(updated)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            blob = pickle.dumps(value, self.pickle_protocol)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                (blob, len(blob), key),
+            )
+            self._grow(connection, len(blob) - len(row[0]))
+        return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._write() as connection:
+            return self._remove(connection, key)
+
+    def delete_many(self, keys, version=None):
+        with self._write() as connection:
+            for key in keys:
+                self._remove(connection, self._key(key, version))
+
+    def clear(self):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache')
+            connection.execute('UPDATE cache_meta SET total = 0 WHERE id = 0')
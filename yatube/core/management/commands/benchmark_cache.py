@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import SQLiteCache
+
+BACKENDS = {
+    'locmem': lambda directory: LocMemCache('benchmark', {}),
+    'filebased': lambda directory: FileBasedCache(
+        os.path.join(directory, 'files'), {'OPTIONS': {'MAX_ENTRIES': 10**6}}
+    ),
+    'sqlite': lambda directory: SQLiteCache(
+        os.path.join(directory, 'cache.sqlite3'), {}
+    ),
+}
+
+
+def run_worker(name, directory, worker, operations, value):
+    '''Замеряет set и затем get одного процесса, возвращает секунды.'''
+    cache = BACKENDS[name](directory)
+    keys = [f'{worker}:{number}' for number in range(operations)]
+    started = time.perf_counter()
+    for key in keys:
+        cache.set(key, value)
+    set_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    return set_time, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность get/set у SQLiteCache, '
+        'LocMemCache и FileBasedCache.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Сколько процессов пишут в кеш одновременно.',
+        )
+
+    def handle(self, *args, operations, value_size, processes, **options):
+        value = 'x' * value_size
+        self.stdout.write(f'{"бэкенд":<12}{"set/с":>12}{"get/с":>12}')
+        for name in BACKENDS:
+            directory = tempfile.mkdtemp()
+            try:
+                set_time, get_time = self.measure(
+                    name, directory, operations, value, processes
+                )
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            total = operations * processes
+            self.stdout.write(
+                f'{name:<12}{total / set_time:>12.0f}{total / get_time:>12.0f}'
+            )
+        if processes > 1:
+            self.stdout.write(
+                'LocMemCache у каждого процесса свой, записи других '
+                'процессов он не видит.'
+            )
+
+    def measure(self, name, directory, operations, value, processes):
+        arguments = [
+            (name, directory, worker, operations, value)
+            for worker in range(processes)
+        ]
+        if processes == 1:
+            results = [run_worker(*arguments[0])]
+        else:
+            with get_context('fork').Pool(processes) as pool:
+                results = pool.starmap(run_worker, arguments)
+        # Процессы работают параллельно: время — по самому медленному.
+        return tuple(max(times) for times in zip(*results))
@@ -0,0 +1,67 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import profiling
+
+SORTS = ('cumulative', 'tottime', 'calls')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводит профили cProfile из PROFILE_ROOT: число и длительность '
+        'профилей по вью и самые дорогие функции объединённого профиля.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', help='Только профили вью, например posts:post_detail.'
+        )
+        parser.add_argument(
+            '--slowest',
+            type=int,
+            help='Свести только столько самых долгих профилей.',
+        )
+        parser.add_argument('--sort', choices=SORTS, default='cumulative')
+        parser.add_argument('--top', type=int, default=30)
+        parser.add_argument(
+            '--output', help='Сохранить объединённый профиль в файл .pstats.'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Удалить накопленные профили и выйти.',
+        )
+
+    def handle(self, *args, view, slowest, sort, top, output, reset, **opts):
+        found = profiling.profiles(view=view)
+        if reset:
+            for path, *_ in found:
+                os.remove(path)
+            self.stdout.write(f'Удалено профилей: {len(found)}.')
+            return
+        if slowest:
+            found = sorted(found, key=lambda item: item[2])[-slowest:]
+        if not found:
+            self.stdout.write(f'Профилей нет в {settings.PROFILE_ROOT}.')
+            return
+        durations = {}
+        for _, name, ms in found:
+            durations.setdefault(name, []).append(ms)
+        for name, values in sorted(durations.items()):
+            self.stdout.write(
+                f'{name}: профилей {len(values)}, '
+                f'среднее {sum(values) / len(values):.0f} мс, '
+                f'макс. {max(values)} мс'
+            )
+        # pstats пишет строку кусками, а OutputWrapper добавляет перевод
+        # строки к каждому write(), поэтому отчёт собирается в буфер.
+        report = io.StringIO()
+        stats = profiling.merge([path for path, *_ in found], stream=report)
+        if output:
+            stats.dump_stats(output)
+            self.stdout.write(f'Объединённый профиль: {output}')
+        stats.strip_dirs().sort_stats(sort).print_stats(top)
+        self.stdout.write(report.getvalue(), ending='')
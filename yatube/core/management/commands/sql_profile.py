@@ -0,0 +1,70 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import snapshots, sqlprofile
+
+# Список колонок ORM длинный и ничего не говорит о стоимости запроса.
+COLUMNS = re.compile(r'^SELECT (?:DISTINCT )?.+? FROM ')
+ORDERS = {
+    'time': lambda entry: entry['seconds'],
+    'calls': lambda entry: entry['calls'],
+    'rows': lambda entry: entry['rows'],
+    'max': lambda entry: entry['max_seconds'],
+    'mean': lambda entry: entry['seconds'] / entry['calls'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает самые дорогие запросы из профиля SQL: вызовы, '
+        'время и строки по отпечатку и вью, планы медленных запросов. '
+        'Профиль собирается при YATUBE_SQL_PROFILE=1.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--sort', choices=sorted(ORDERS), default='time')
+        parser.add_argument(
+            '--view', help='Только запросы вью, например posts:profile.'
+        )
+        parser.add_argument(
+            '--width',
+            type=int,
+            default=300,
+            help='Сколько символов текста запроса показывать.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Удалить накопленные снимки и выйти.',
+        )
+
+    def handle(self, *args, top, sort, view, width, reset, **options):
+        if reset:
+            snapshots.clear(settings.SQL_PROFILE_ROOT)
+            self.stdout.write('Профиль очищен.')
+            return
+        entries = sqlprofile.collect()
+        if view:
+            entries = [entry for entry in entries if entry['view'] == view]
+        if not entries:
+            self.stdout.write('Профиль пуст.')
+            return
+        entries.sort(key=ORDERS[sort], reverse=True)
+        for place, entry in enumerate(entries[:top], start=1):
+            self.stdout.write(
+                f'#{place} {entry["fingerprint"]} {entry["view"]}: '
+                f'вызовов {entry["calls"]}, '
+                f'всего {entry["seconds"] * 1000:.1f} мс, '
+                f'среднее {entry["seconds"] * 1000 / entry["calls"]:.2f} мс, '
+                f'макс. {entry["max_seconds"] * 1000:.1f} мс, '
+                f'строк {entry["rows"]}, медленных {entry["slow"]}'
+            )
+            sql = COLUMNS.sub('SELECT … FROM ', entry['sql'], count=1)
+            if len(sql) > width:
+                sql = sql[:width] + '…'
+            self.stdout.write(f'  {sql}')
+            for line in entry['plan'] or ():
+                self.stdout.write(f'    {line}')
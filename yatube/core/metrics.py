@@ -0,0 +1,232 @@
+import atexit
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from . import snapshots
+
+PREFIX = 'yatube_'
+# Границы корзин гистограммы задержки, секунды.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNRESOLVED = 'unresolved'
+HISTOGRAM = 'histogram'
+COUNTER = 'counter'
+FAMILIES = {
+    'requests_total': (COUNTER, 'Запросы по вью, методу и статусу.'),
+    'request_duration_seconds': (HISTOGRAM, 'Время ответа вью.'),
+    'db_queries_total': (COUNTER, 'Запросы к базе.'),
+    'db_query_seconds_total': (COUNTER, 'Время запросов к базе.'),
+    'template_render_seconds_total': (COUNTER, 'Время рендера шаблонов.'),
+    'response_bytes_total': (COUNTER, 'Размер тел ответов без потоковых.'),
+    'cache_hits_total': (COUNTER, 'Найденные в кеше ключи.'),
+    'cache_misses_total': (COUNTER, 'Не найденные в кеше ключи.'),
+}
+HISTOGRAMS = {
+    name for name, (kind, _) in FAMILIES.items() if kind == HISTOGRAM
+}
+HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+
+class Process:
+    '''Буферы потоков одного процесса.
+
+    Каждый поток пишет только в свой словарь, поэтому запись идёт без
+    блокировок; снимок складывает словари всех потоков.
+    '''
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.name = snapshots.process_name()
+        self.buffers = []
+        self.flushed = time.monotonic()
+
+
+_process = Process()
+_local = threading.local()
+
+
+def process():
+    global _process
+    # После fork буферы родителя достаются детям копией: начинаем заново.
+    if _process.pid != os.getpid():
+        _process = Process()
+    return _process
+
+
+def buffer():
+    current = process()
+    if getattr(_local, 'pid', None) != current.pid:
+        _local.pid, _local.buffer = current.pid, {}
+        current.buffers.append(_local.buffer)
+    return _local.buffer
+
+
+class RequestStats:
+    '''База, шаблоны и кеш одного запроса.'''
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+def begin():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def end():
+    _local.stats = None
+
+
+def current():
+    return getattr(_local, 'stats', None)
+
+
+def count_cache(hits, misses):
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def render_started():
+    stats = current()
+    if stats is not None:
+        stats.template_depth += 1
+    return time.perf_counter()
+
+
+def render_finished(started):
+    '''Учитывает только внешний рендер: вложенные входят в его время.'''
+    stats = current()
+    if stats is None:
+        return
+    stats.template_depth -= 1
+    if stats.template_depth == 0:
+        stats.template_seconds += time.perf_counter() - started
+
+
+def escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def sample(name, **labels):
+    pairs = ','.join(
+        f'{label}="{escape(value)}"' for label, value in labels.items()
+    )
+    return f'{PREFIX}{name}{{{pairs}}}'
+
+
+def observe(view, method, status, seconds, stats, size):
+    '''Записывает завершённый запрос в буфер текущего потока.'''
+    data = buffer()
+    keys = [
+        sample('requests_total', view=view, method=method, status=status)
+    ]
+    # Корзины гистограммы накопительные: запрос попадает во все
+    # корзины с границей не меньше его времени.
+    bounds = [bound for bound in BUCKETS if seconds <= bound]
+    for bound in [*bounds, '+Inf']:
+        keys.append(
+            sample('request_duration_seconds_bucket', view=view, le=bound)
+        )
+    for key in keys:
+        data[key] = data.get(key, 0) + 1
+    totals = {
+        'request_duration_seconds_sum': seconds,
+        'request_duration_seconds_count': 1,
+        'db_queries_total': stats.queries,
+        'db_query_seconds_total': stats.query_seconds,
+        'template_render_seconds_total': stats.template_seconds,
+        'response_bytes_total': size,
+        'cache_hits_total': stats.cache_hits,
+        'cache_misses_total': stats.cache_misses,
+    }
+    for name, value in totals.items():
+        key = sample(name, view=view)
+        data[key] = data.get(key, 0) + value
+
+
+def snapshot():
+    '''Сумма буферов всех потоков процесса.
+
+    dict.copy() выполняется целиком под GIL, поэтому копия буфера
+    согласована, даже если его поток в это время пишет.
+    '''
+    total = {}
+    for data in list(process().buffers):
+        for key, value in data.copy().items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def flush():
+    '''Пишет снимок процесса в METRICS_ROOT, подменяя прошлый.'''
+    current = process()
+    current.flushed = time.monotonic()
+    snapshots.write(settings.METRICS_ROOT, current.name, snapshot())
+
+
+@atexit.register
+def flush_at_exit():
+    # Последние секунды работы процесса не теряются до следующего сброса.
+    if _process.pid == os.getpid() and _process.buffers:
+        flush()
+
+
+def flush_if_due():
+    elapsed = time.monotonic() - process().flushed
+    if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def collect():
+    '''Складывает снимки всех процессов хоста.'''
+    total = {}
+    for data in snapshots.read(settings.METRICS_ROOT):
+        for key, value in data.items():
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def family(key):
+    name = key[len(PREFIX): key.index('{')]
+    for suffix in HISTOGRAM_SUFFIXES:
+        base = name[: -len(suffix)]
+        if name.endswith(suffix) and base in HISTOGRAMS:
+            return base
+    return name
+
+
+def exposition(samples):
+    '''Текстовый формат Prometheus 0.0.4.'''
+    grouped = {}
+    for key, value in samples.items():
+        grouped.setdefault(family(key), []).append((key, value))
+    lines = []
+    for name in sorted(grouped):
+        kind, help_text = FAMILIES.get(name, ('untyped', ''))
+        lines.append(f'# HELP {PREFIX}{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}{name} {kind}')
+        for key, value in sorted(grouped[name]):
+            lines.append(f'{key} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,115 @@
+import cProfile
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.urls import Resolver404, resolve
+from django.utils.crypto import constant_time_compare
+
+from . import metrics, profiling, sqlprofile
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_FILE_HEADER = 'X-Profile-File'
+
+
+class MetricsMiddleware:
+    '''Собирает метрики запроса по имени адреса вью.
+
+    Стоит первым в MIDDLEWARE, чтобы время ответа и запросы к базе
+    включали работу остальных middleware.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = metrics.begin()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats.execute):
+                response = self.get_response(request)
+        finally:
+            metrics.end()
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        metrics.observe(
+            match.view_name if match else metrics.UNRESOLVED,
+            request.method,
+            response.status_code,
+            seconds,
+            stats,
+            0 if response.streaming else len(response.content),
+        )
+        metrics.flush_if_due()
+        return response
+
+
+class QueryProfileMiddleware:
+    '''Профиль SQL по отпечаткам для каждой вью, если включён SQL_PROFILE.
+
+    Выключенный отказывается загружаться и ничего не стоит.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.SQL_PROFILE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Вью нужна до её вызова, чтобы подписать запросы middleware.
+        try:
+            view = resolve(request.path_info).view_name
+        except Resolver404:
+            view = sqlprofile.UNRESOLVED
+        with sqlprofile.profiling(view):
+            response = self.get_response(request)
+        sqlprofile.flush_if_due()
+        return response
+
+
+class RequestProfileMiddleware:
+    '''Профилирует запрос cProfile и пишет .pstats в PROFILE_ROOT.
+
+    Профилируются запросы с заголовком X-Profile, равным PROFILE_TOKEN,
+    запросы сотрудников с ?profile=1 и случайная доля
+    PROFILE_SAMPLE_RATE остальных. Стоит после AuthenticationMiddleware,
+    чтобы видеть пользователя; тело потоковых ответов не профилируется.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def requested(self, request):
+        token = settings.PROFILE_TOKEN
+        header = request.META.get(PROFILE_HEADER)
+        if token and header and constant_time_compare(header, token):
+            return True
+        return (
+            request.GET.get(PROFILE_PARAM) == '1' and request.user.is_staff
+        )
+
+    def __call__(self, request):
+        requested = self.requested(request)
+        if not requested and random.random() >= settings.PROFILE_SAMPLE_RATE:
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        seconds = time.perf_counter() - started
+        match = request.resolver_match
+        name = profiling.save(
+            profiler,
+            match.view_name if match else metrics.UNRESOLVED,
+            seconds,
+        )
+        # Имя файла получает только тот, кто сам попросил профиль.
+        if requested:
+            response[PROFILE_FILE_HEADER] = name
+        return response
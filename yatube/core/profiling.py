@@ -0,0 +1,59 @@
+import os
+import pstats
+import re
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+SUFFIX = '.pstats'
+NAME = re.compile(
+    r'^(?P<started>\d{8}-\d{6}\.\d{6})-(?P<view>.+)-(?P<ms>\d+)ms'
+    rf'-(?P<pid>\d+){re.escape(SUFFIX)}$'
+)
+
+
+def file_name(view, seconds):
+    '''Имя профиля: время, вью и длительность, чтобы отбирать по имени.'''
+    started = timezone.now().strftime('%Y%m%d-%H%M%S.%f')
+    # Двоеточие из имени адреса недопустимо в именах файлов Windows.
+    view = view.replace(':', '.')
+    return f'{started}-{view}-{round(seconds * 1000)}ms-{os.getpid()}{SUFFIX}'
+
+
+def save(profiler, view, seconds, root=None):
+    root = root or settings.PROFILE_ROOT
+    os.makedirs(root, exist_ok=True)
+    name = file_name(view, seconds)
+    descriptor, temp = tempfile.mkstemp(dir=root, suffix='.tmp')
+    os.close(descriptor)
+    profiler.dump_stats(temp)
+    os.replace(temp, os.path.join(root, name))
+    return name
+
+
+def parse(name):
+    '''(вью, мс) из имени профиля или None для чужих файлов.'''
+    match = NAME.match(name)
+    if match is None:
+        return None
+    return match['view'].replace('.', ':', 1), int(match['ms'])
+
+
+def profiles(root=None, view=None):
+    '''[(путь, вью, мс)] профилей каталога, по желанию одной вью.'''
+    root = root or settings.PROFILE_ROOT
+    found = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else ():
+        parsed = parse(name)
+        if parsed is None or (view and parsed[0] != view):
+            continue
+        found.append((os.path.join(root, name), *parsed))
+    return found
+
+
+def merge(paths, stream=None):
+    stats = pstats.Stats(paths[0], stream=stream)
+    for path in paths[1:]:
+        stats.add(path)
+    return stats
@@ -0,0 +1,41 @@
+import json
+import os
+import tempfile
+import time
+
+
+def process_name():
+    '''pid и время: файл не совпадёт с файлом прошлого процесса.'''
+    return f'{os.getpid()}-{time.time_ns()}.json'
+
+
+def write(root, name, data):
+    '''Пишет снимок рядом и подменяет: читатель не увидит половину.'''
+    os.makedirs(root, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        'w', dir=root, suffix='.tmp', delete=False, encoding='utf-8'
+    ) as temp:
+        json.dump(data, temp)
+    os.replace(temp.name, os.path.join(root, name))
+
+
+def read(root):
+    '''Снимки всех процессов в каталоге; битые и чужие файлы пропускаются.'''
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(root, name), encoding='utf-8') as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            continue
+
+
+def clear(root):
+    for name in os.listdir(root) if os.path.isdir(root) else ():
+        if name.endswith('.json'):
+            os.remove(os.path.join(root, name))
@@ -0,0 +1,234 @@
+import atexit
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from . import snapshots
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = r'(?:%s|\?)'
+IN_LIST = re.compile(
+    rf'\bIN \(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)', re.IGNORECASE
+)
+ROWS = re.compile(
+    rf'(\({PLACEHOLDER}(?:, {PLACEHOLDER})*\))(?:, \1)+'
+)
+SAVEPOINT = re.compile(r'\bSAVEPOINT "[^"]*"', re.IGNORECASE)
+SPACE = re.compile(r'\s+')
+UNION = ' UNION ALL '
+FETCH = ('fetchone', 'fetchmany', 'fetchall')
+EXPLAIN = {
+    'sqlite': 'EXPLAIN QUERY PLAN',
+    'postgresql': 'EXPLAIN',
+    'mysql': 'EXPLAIN',
+}
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+UNRESOLVED = 'unresolved'
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    '''(отпечаток, нормализованный текст) запроса.
+
+    Литералы, списки IN, строки VALUES, имена точек сохранения и
+    одинаковые части UNION ALL сворачиваются, поэтому запросы одной
+    формы с разными значениями дают один отпечаток. ORM повторяет
+    текст запроса, меняя только параметры, поэтому кеш почти всегда
+    попадает.
+    '''
+    text = SPACE.sub(' ', sql).strip()
+    text = STRING.sub('?', text)
+    text = NUMBER.sub('?', text)
+    text = SAVEPOINT.sub('SAVEPOINT ?', text)
+    text = IN_LIST.sub('IN (...)', text)
+    text = ROWS.sub(r'\1', text)
+    parts = text.split(UNION)
+    unique = [
+        part
+        for number, part in enumerate(parts)
+        if number == 0 or part != parts[number - 1]
+    ]
+    if len(unique) < len(parts):
+        unique.append('...')
+    text = UNION.join(unique)
+    return hashlib.md5(text.encode()).hexdigest()[:12], text
+
+
+class Profile:
+    '''Статистика запросов процесса по паре (вью, отпечаток).'''
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.name = snapshots.process_name()
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.flushed = time.monotonic()
+
+    def entry(self, view, sql):
+        key, text = fingerprint(sql)
+        entry = self.entries.get((view, key))
+        if entry is None:
+            entry = self.entries.setdefault(
+                (view, key),
+                {
+                    'view': view,
+                    'fingerprint': key,
+                    'sql': text,
+                    'calls': 0,
+                    'seconds': 0.0,
+                    'max_seconds': 0.0,
+                    'rows': 0,
+                    'slow': 0,
+                    'plan': None,
+                },
+            )
+        return entry
+
+
+_profile = Profile()
+_local = threading.local()
+
+
+def profile():
+    global _profile
+    if _profile.pid != os.getpid():
+        _profile = Profile()
+    return _profile
+
+
+def explain(db, sql, params):
+    '''План медленного запроса или None, если его не получить.'''
+    prefix = EXPLAIN.get(db.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    _local.explaining = True
+    try:
+        # Точка сохранения: ошибка EXPLAIN не ломает транзакцию запроса.
+        with transaction.atomic(using=db.alias), db.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    finally:
+        _local.explaining = False
+    if db.vendor != 'sqlite':
+        return [str(row[0]) for row in rows]
+    # Строки SQLite: (id, родитель, -, описание) — дерево по родителю.
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+def count_fetched(cursor, entry, lock):
+    '''Подменяет fetch* курсора, чтобы прочитанные строки попали в entry.
+
+    Число строк SELECT становится известно только при чтении, уже
+    после execute_wrapper.
+    '''
+
+    def counted(name, fetch):
+        def wrapped(*args):
+            rows = fetch(*args)
+            if rows is None:
+                return rows
+            with lock:
+                entry['rows'] += 1 if name == 'fetchone' else len(rows)
+            return rows
+
+        return wrapped
+
+    for name in FETCH:
+        # Исходный метод берётся мимо подмены прошлого запроса.
+        fetch = type(cursor).__getattr__(cursor, name)
+        setattr(cursor, name, counted(name, fetch))
+
+
+class Recorder:
+    '''execute_wrapper: время, вызовы и строки по отпечаткам запросов.'''
+
+    def __init__(self, view):
+        self.view = view
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, 'explaining', False):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        seconds = time.perf_counter() - started
+        current = profile()
+        entry = current.entry(self.view, sql)
+        cursor = context['cursor']
+        with current.lock:
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            if cursor.rowcount > 0:
+                entry['rows'] += cursor.rowcount
+        if cursor.rowcount < 0:
+            count_fetched(cursor, entry, current.lock)
+        if not many and seconds * 1000 >= settings.SQL_PROFILE_EXPLAIN_MS:
+            with current.lock:
+                entry['slow'] += 1
+            if entry['plan'] is None:
+                entry['plan'] = explain(context['connection'], sql, params)
+        return result
+
+
+@contextmanager
+def profiling(view=UNRESOLVED):
+    with connection.execute_wrapper(Recorder(view)):
+        yield
+
+
+def snapshot():
+    current = profile()
+    with current.lock:
+        return [dict(entry) for entry in current.entries.values()]
+
+
+def flush():
+    current = profile()
+    current.flushed = time.monotonic()
+    snapshots.write(settings.SQL_PROFILE_ROOT, current.name, snapshot())
+
+
+def flush_if_due():
+    elapsed = time.monotonic() - profile().flushed
+    if elapsed >= settings.SQL_PROFILE_FLUSH_INTERVAL:
+        flush()
+
+
+@atexit.register
+def flush_at_exit():
+    if _profile.pid == os.getpid() and _profile.entries:
+        flush()
+
+
+def collect():
+    '''Складывает снимки процессов по паре (вью, отпечаток).'''
+    merged = {}
+    for entries in snapshots.read(settings.SQL_PROFILE_ROOT):
+        for entry in entries:
+            key = entry['view'], entry['fingerprint']
+            total = merged.get(key)
+            if total is None:
+                merged[key] = dict(entry)
+                continue
+            for field in ('calls', 'seconds', 'rows', 'slow'):
+                total[field] += entry[field]
+            total['max_seconds'] = max(
+                total['max_seconds'], entry['max_seconds']
+            )
+            total['plan'] = total['plan'] or entry['plan']
+    return list(merged.values())
@@ -0,0 +1,28 @@
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from . import metrics
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = metrics.render_started()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.render_finished(started)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    '''Шаблоны Django, время рендера которых попадает в метрики.'''
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
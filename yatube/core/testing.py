@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def isolate_files():
+    '''Переводит кеш, метрики и профили во временные каталоги.
+
+    Так прогон тестов не видит фрагментов прошлого прогона и не пишет
+    в рабочие каталоги. Подмена не снимается до конца процесса: снимки
+    метрик и SQL-профиля сбрасываются ещё и при выходе, через atexit.
+    '''
+    cache_path = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+    override_settings(
+        CACHE_PATH=cache_path,
+        CACHES={
+            **settings.CACHES,
+            'default': {**settings.CACHES['default'], 'LOCATION': cache_path},
+        },
+        METRICS_ROOT=tempfile.mkdtemp(),
+        SQL_PROFILE_ROOT=tempfile.mkdtemp(),
+        PROFILE_ROOT=tempfile.mkdtemp(),
+    ).enable()
+
+
+class TestRunner(DiscoverRunner):
+    '''Обычный раннер Django с временными каталогами из isolate_files.'''
+
+    def setup_test_environment(self, **kwargs):
+        isolate_files()
+        super().setup_test_environment(**kwargs)
@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import get_context
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import SQLiteCache
+
+
+def set_in_child(path):
+    SQLiteCache(path, {}).set('shared', 'из другого процесса')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_basic_operations(self):
+        """Чтение, запись, добавление, удаление и счётчики"""
+        cache = self.cache
+        cache.set('key', {'a': 1})
+        self.assertEqual(cache.get('key'), {'a': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        self.assertEqual(cache.get_many(['key', 'new', 'missing']), {
+            'key': {'a': 1}, 'new': 'value'
+        })
+        cache.set('counter', 1)
+        self.assertEqual(cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        cache.delete('key')
+        self.assertIsNone(cache.get('key'))
+        cache.clear()
+        self.assertIsNone(cache.get('new'))
+
+    def test_expiry(self):
+        """Просроченные записи не читаются и не мешают add"""
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'fresh'))
+        self.assertEqual(self.cache.get('key'), 'fresh')
+
+    def test_lru_eviction(self):
+        """При превышении объёма вытесняются давно не читавшиеся записи"""
+        cache = SQLiteCache(
+            self.path,
+            {'OPTIONS': {'MAX_SIZE': 3000, 'ACCESS_RESOLUTION': 0}},
+        )
+        for key in ('old', 'hot', 'new'):
+            cache.set(key, 'x' * 1000)
+            time.sleep(0.01)
+        self.assertIsNone(cache.get('old'))
+        cache.get('hot')
+        time.sleep(0.01)
+        cache.set('newest', 'x' * 1000)
+        self.assertIsNone(cache.get('new'))
+        self.assertIsNotNone(cache.get('hot'))
+        self.assertIsNotNone(cache.get('newest'))
+
+    def test_shared_between_processes(self):
+        """Запись из другого процесса видна всем"""
+        self.cache.get('warm-up')
+        process = get_context('fork').Process(
+            target=set_in_child, args=(self.path,)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('shared'), 'из другого процесса')
@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from posts.models import Post, User
+
+TOKEN = 'metrics-token'
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        settings_override = override_settings(
+            METRICS_ROOT=root, METRICS_TOKEN=TOKEN
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.root = root
+        # Буферы процесса копятся между тестами, поэтому сравниваются
+        # приросты относительно снимка до запроса.
+        self.before = metrics.snapshot()
+        cache.clear()
+
+    def get_metrics(self, token=TOKEN):
+        return self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+
+    def scrape(self):
+        response = self.get_metrics()
+        self.assertEqual(response.status_code, 200)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                key, value = line.rsplit(' ', 1)
+                samples[key] = float(value)
+        return samples
+
+    def grown(self, samples, name, **labels):
+        key = metrics.sample(name, **labels)
+        return samples.get(key, 0) - self.before.get(key, 0)
+
+    def test_request_recorded(self):
+        """Запрос попадает в счётчики и гистограмму своей вью"""
+        self.client.get(reverse('posts:index'))
+        samples = self.scrape()
+        view = 'posts:index'
+        self.assertEqual(
+            self.grown(
+                samples, 'requests_total', view=view, method='GET', status=200
+            ),
+            1,
+        )
+        self.assertEqual(
+            self.grown(
+                samples,
+                'request_duration_seconds_bucket',
+                view=view,
+                le='+Inf',
+            ),
+            1,
+        )
+        for name in (
+            'db_queries_total',
+            'template_render_seconds_total',
+            'response_bytes_total',
+            'cache_misses_total',
+        ):
+            with self.subTest(name=name):
+                self.assertGreater(self.grown(samples, name, view=view), 0)
+
+    def test_cache_hits_counted(self):
+        """Повторный запрос берёт фрагменты из кеша"""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.before = metrics.snapshot()
+        self.client.get(url)
+        samples = self.scrape()
+        self.assertGreater(
+            self.grown(samples, 'cache_hits_total', view='posts:index'), 0
+        )
+
+    def test_unresolved_path(self):
+        """Неизвестный адрес учитывается под одной меткой"""
+        self.client.get('/no-such-page/')
+        samples = self.scrape()
+        self.assertEqual(
+            self.grown(
+                samples,
+                'requests_total',
+                view=metrics.UNRESOLVED,
+                method='GET',
+                status=404,
+            ),
+            1,
+        )
+
+    def test_processes_summed(self):
+        """Снимки других процессов складываются с текущим"""
+        key = metrics.sample('db_queries_total', view='posts:index')
+        with open(os.path.join(self.root, '1-1.json'), 'w') as file:
+            json.dump({key: 1000}, file)
+        samples = self.scrape()
+        self.assertEqual(samples[key], 1000 + metrics.snapshot().get(key, 0))
+
+    def test_format(self):
+        """Каждое семейство описано строками HELP и TYPE"""
+        self.client.get(reverse('posts:index'))
+        content = self.get_metrics().content.decode()
+        self.assertIn(
+            '# TYPE yatube_request_duration_seconds histogram', content
+        )
+        self.assertIn('# TYPE yatube_db_queries_total counter', content)
+
+    def test_hidden_from_others(self):
+        """Без токена или входа сотрудника /metrics не отдаётся"""
+        self.assertEqual(
+            self.client.get(reverse('metrics')).status_code, 404
+        )
+        self.assertEqual(self.get_metrics('wrong').status_code, 404)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.get_metrics('').status_code, 404)
+        with override_settings(METRICS_ALLOWED_IPS=[]):
+            self.assertEqual(self.get_metrics().status_code, 404)
+
+    def test_staff_session(self):
+        """Сотрудник видит /metrics без токена"""
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import profiling
+from core.middleware import PROFILE_FILE_HEADER
+from posts.models import Post, User
+
+TOKEN = 'secret-token'
+
+
+@override_settings(PROFILE_TOKEN=TOKEN, PROFILE_SAMPLE_RATE=0.0)
+class RequestProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.url = reverse('posts:post_detail', args=[cls.post.pk])
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        settings = override_settings(PROFILE_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def saved(self):
+        return profiling.profiles(self.root)
+
+    def test_token_header_profiles_request(self):
+        """Запрос с верным токеном пишет профиль с вью и временем в имени"""
+        response = self.client.get(self.url, HTTP_X_PROFILE=TOKEN)
+        self.assertEqual(response.status_code, 200)
+        [(path, view, ms)] = self.saved()
+        self.assertEqual(view, 'posts:post_detail')
+        self.assertEqual(os.path.basename(path), response[PROFILE_FILE_HEADER])
+        self.assertIn(f'-posts.post_detail-{ms}ms-', path)
+        self.assertTrue(path.endswith('.pstats'))
+
+    def test_wrong_token_ignored(self):
+        """Неверный токен и простой запрос профиль не пишут"""
+        self.client.get(self.url, HTTP_X_PROFILE='wrong')
+        self.client.get(self.url)
+        self.assertEqual(self.saved(), [])
+
+    @override_settings(PROFILE_TOKEN='')
+    def test_empty_token_disables_header(self):
+        """Пустой PROFILE_TOKEN не пускает пустой заголовок"""
+        self.client.get(self.url, HTTP_X_PROFILE='')
+        self.assertEqual(self.saved(), [])
+
+    def test_query_flag_for_staff_only(self):
+        """?profile=1 профилирует только сотрудника"""
+        self.client.force_login(self.author)
+        response = self.client.get(self.url, {'profile': '1'})
+        self.assertNotIn(PROFILE_FILE_HEADER, response)
+        self.assertEqual(self.saved(), [])
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, {'profile': '1'})
+        self.assertIn(PROFILE_FILE_HEADER, response)
+        self.assertEqual(len(self.saved()), 1)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_without_file_header(self):
+        """Случайная выборка пишет профиль, но не раскрывает имя файла"""
+        response = self.client.get(self.url)
+        self.assertNotIn(PROFILE_FILE_HEADER, response)
+        self.assertEqual(len(self.saved()), 1)
+
+    def test_summary_merges_profiles(self):
+        """profile_summary сводит профили вью и показывает её функции"""
+        for _ in range(2):
+            self.client.get(self.url, HTTP_X_PROFILE=TOKEN)
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE=TOKEN)
+        merged = os.path.join(self.root, 'merged.out')
+        out = StringIO()
+        call_command(
+            'profile_summary',
+            view='posts:post_detail',
+            output=merged,
+            stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn('posts:post_detail: профилей 2', output)
+        self.assertNotIn('posts:index', output)
+        self.assertIn('post_detail', output)
+        self.assertTrue(os.path.exists(merged))
+        call_command('profile_summary', reset=True, stdout=StringIO())
+        self.assertEqual(self.saved(), [])
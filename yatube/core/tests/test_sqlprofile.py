@@ -0,0 +1,105 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import snapshots, sqlprofile
+from posts.models import Post, User
+
+
+class FingerprintTests(TestCase):
+    def test_literals_and_lists_folded(self):
+        """Запросы одной формы с разными значениями дают один отпечаток"""
+        pairs = (
+            (
+                "SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s) LIMIT 10",
+                "SELECT *  FROM t WHERE a = 'it''s' AND b IN (%s) LIMIT 3",
+            ),
+            (
+                'INSERT INTO t (a, b) VALUES (%s, %s), (%s, %s)',
+                'INSERT INTO t (a, b) VALUES (%s, %s)',
+            ),
+            ('SAVEPOINT "s1_x1"', 'SAVEPOINT "s2_x7"'),
+            (
+                'SELECT id FROM t WHERE a = 1 UNION ALL '
+                'SELECT id FROM t WHERE a = 2',
+                'SELECT id FROM t WHERE a = 3 UNION ALL '
+                'SELECT id FROM t WHERE a = 4 UNION ALL '
+                'SELECT id FROM t WHERE a = 5',
+            ),
+        )
+        for first, second in pairs:
+            with self.subTest(sql=first):
+                self.assertEqual(
+                    sqlprofile.fingerprint(first),
+                    sqlprofile.fingerprint(second),
+                )
+
+    def test_identifiers_kept(self):
+        """Цифры в именах таблиц и колонок не сворачиваются"""
+        self.assertNotEqual(
+            sqlprofile.fingerprint('SELECT a1 FROM t'),
+            sqlprofile.fingerprint('SELECT a2 FROM t'),
+        )
+
+
+class ProfileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        for number in range(3):
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+
+    def setUp(self):
+        call_command('sql_profile', reset=True, stdout=StringIO())
+        sqlprofile.profile().entries.clear()
+
+    def dump(self, *args):
+        sqlprofile.flush()
+        out = StringIO()
+        call_command('sql_profile', *args, stdout=out)
+        return out.getvalue()
+
+    def test_calls_and_rows(self):
+        """Вызовы и прочитанные строки копятся по отпечатку"""
+        with sqlprofile.profiling('test'):
+            for _ in range(2):
+                list(Post.objects.filter(author=self.author))
+        (entry,) = sqlprofile.profile().entries.values()
+        self.assertEqual(entry['calls'], 2)
+        self.assertEqual(entry['rows'], 6)
+        self.assertIn(entry['fingerprint'], self.dump())
+
+    @override_settings(SQL_PROFILE_EXPLAIN_MS=0)
+    def test_slow_query_explained(self):
+        """Для медленного запроса сохраняется план"""
+        with sqlprofile.profiling('test'):
+            Post.objects.filter(author=self.author).count()
+        plans = [
+            entry['plan']
+            for entry in sqlprofile.profile().entries.values()
+            if entry['plan']
+        ]
+        self.assertTrue(plans)
+        self.assertIn('posts_post', ' '.join(plans[0]))
+
+    @override_settings(SQL_PROFILE=True)
+    def test_middleware_labels_view(self):
+        """Middleware подписывает запросы именем вью"""
+        self.client.get(reverse('posts:index'))
+        out = self.dump('--view', 'posts:index')
+        self.assertIn('posts:index', out)
+        self.assertNotIn('posts:profile', out)
+
+    def test_processes_merged(self):
+        """Снимки разных процессов складываются"""
+        with sqlprofile.profiling('test'):
+            Post.objects.count()
+        sqlprofile.flush()
+        snapshots.write(
+            settings.SQL_PROFILE_ROOT, 'other.json', sqlprofile.snapshot()
+        )
+        (entry,) = sqlprofile.collect()
+        self.assertEqual(entry['calls'], 2)
@@ -1,4 +1,12 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from . import metrics
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+BEARER = 'Bearer '
 
 
 def page_not_found(request, exception):
@@ -10,3 +18,29 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_allowed(request):
+    '''Токен METRICS_TOKEN в Authorization: Bearer или вход сотрудника.
+
+    Адрес из METRICS_ALLOWED_IPS — лишь дополнительная проверка: за
+    прокси адрес любого клиента локальный.
+    '''
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return False
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and header.startswith(BEARER):
+        return constant_time_compare(header[len(BEARER):], token)
+    return request.user.is_staff
+
+
+def prometheus_metrics(request):
+    '''Метрики всех процессов хоста в текстовом формате Prometheus.'''
+    if not metrics_allowed(request):
+        raise Http404
+    metrics.flush()
+    return HttpResponse(
+        metrics.exposition(metrics.collect()),
+        content_type=PROMETHEUS_CONTENT_TYPE,
+    )
@@ -1,6 +1,40 @@
 from django.contrib import admin
+from django.db.models import Q
 
-from .models import Comment, Follow, Group, Post
+from . import lookup
+from .models import (
+    AuthorStats,
+    Comment,
+    Follow,
+    Group,
+    LookupTerm,
+    Post,
+    ThumbnailJob,
+)
+
+
+class TrigramSearchMixin:
+    '''Добавляет к поиску админки нечёткие совпадения по триграммам.'''
+
+    trigram_kind = None
+    trigram_fields = ('pk',)
+
+    def get_search_results(self, request, queryset, search_term):
+        found, use_distinct = super().get_search_results(
+            request, queryset, search_term
+        )
+        if not search_term:
+            return found, use_distinct
+        ids = [
+            term.object_id
+            for term in lookup.similar(
+                search_term, kinds=[self.trigram_kind], limit=100
+            )
+        ]
+        fuzzy = Q()
+        for field in self.trigram_fields:
+            fuzzy |= Q(**{f'{field}__in': ids})
+        return found | queryset.filter(fuzzy), use_distinct
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -17,13 +51,14 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(TrigramSearchMixin, admin.ModelAdmin):
     list_display = (
         'title',
         'slug',
         'description',
     )
-    search_fields = ('text',)
+    search_fields = ('title', 'slug')
+    trigram_kind = LookupTerm.GROUP
     empty_value_display = '-пусто-'
 
 
@@ -37,16 +72,42 @@ class CommentAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(TrigramSearchMixin, admin.ModelAdmin):
     list_display = (
         'user',
         'author',
     )
-    search_fields = ('user',)
+    search_fields = ('user__username', 'author__username')
+    trigram_kind = LookupTerm.USER
+    trigram_fields = ('user_id', 'author_id')
     empty_value_display = '-пусто-'
 
 
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'followers_count',
+        'following_count',
+    )
+    search_fields = ('user__username',)
+
+
+class ThumbnailJobAdmin(admin.ModelAdmin):
+    list_display = (
+        'post',
+        'image',
+        'created',
+        'taken',
+        'attempts',
+        'error',
+    )
+    list_filter = ('attempts',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
+admin.site.register(AuthorStats, AuthorStatsAdmin)
+admin.site.register(ThumbnailJob, ThumbnailJobAdmin)
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import listings, thumbnails
+
+CARD_TEMPLATE = 'includes/general.html'
+
+
+def card_namespaces(post):
+    namespaces = [listings.author_entity_namespace(post.author_id)]
+    if post.group_id is not None:
+        namespaces.append(listings.group_entity_namespace(post.group_id))
+    return namespaces
+
+
+def card_key(post, versions, variant):
+    '''Ключ карточки: пост, время его изменения и версии автора и группы.
+
+    Версии автора и группы сдвигаются только при изменении их самих, а
+    не лент, поэтому новый пост автора не сбрасывает его старые
+    карточки, а переименование автора или группы — сбрасывает.
+    '''
+    parts = [str(versions[namespace]) for namespace in card_namespaces(post)]
+    return 'post-card:{}:{}:{}:{}'.format(
+        post.pk, post.updated.timestamp(), '.'.join(parts), variant
+    )
+
+
+def render_cards(posts, hide_author_links=False, hide_group_link=False):
+    '''Возвращает HTML карточек постов, забирая из кеша все разом.'''
+    posts = list(posts)
+    namespaces = {
+        namespace for post in posts for namespace in card_namespaces(post)
+    }
+    versions = listings.versions(*namespaces)
+    variant = f'{int(hide_author_links)}{int(hide_group_link)}'
+    keys = [card_key(post, versions, variant) for post in posts]
+    cards = cache.get_many(keys)
+    # Миниатюры нужны только карточкам, которых нет в кеше.
+    thumbnails.prefetch(
+        post for post, key in zip(posts, keys) if key not in cards
+    )
+    rendered = {}
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            cards[key] = rendered[key] = render_to_string(
+                CARD_TEMPLATE,
+                {
+                    'post': post,
+                    'hide_author_links': hide_author_links,
+                    'hide_group_link': hide_group_link,
+                },
+            )
+    if rendered:
+        cache.set_many(rendered, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
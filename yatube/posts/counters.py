@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+CHUNK_SIZE = 1000
+
+
+def shift(queryset, field, delta):
+    '''Атомарно сдвигает счётчик на delta, не опускаясь ниже нуля.'''
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def shift_author(user_id, field, delta):
+    shift(AuthorStats.objects.filter(user_id=user_id), field, delta)
+
+
+def shift_group(group_id, delta):
+    if group_id is not None:
+        shift(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def shift_post(post_id, delta):
+    shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def count_of(model, field, outer='pk'):
+    '''Подзапрос «сколько строк model ссылается на внешнюю строку».'''
+    counted = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def id_ranges(queryset, chunk_size=CHUNK_SIZE):
+    '''Полуоткрытые диапазоны первичных ключей размером chunk_size.'''
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    first, last = ids.first(), ids.last()
+    if first is None:
+        return
+    for start in range(first, last + 1, chunk_size):
+        yield start, start + chunk_size
+
+
+def recount_chunked(queryset, chunk_size=CHUNK_SIZE, **counters):
+    '''Пересчитывает счётчики по частям, каждая часть — в своей транзакции.
+
+    Возвращает число обновлённых строк.
+    '''
+    updated = 0
+    for start, end in id_ranges(queryset, chunk_size):
+        with transaction.atomic():
+            updated += queryset.filter(pk__gte=start, pk__lt=end).update(
+                **counters
+            )
+    return updated
+
+
+def recount_authors(chunk_size=CHUNK_SIZE, users=None):
+    users = User.objects.all() if users is None else users
+    for start, end in id_ranges(users, chunk_size):
+        missing = users.filter(
+            pk__gte=start, pk__lt=end, stats__isnull=True
+        ).values_list('pk', flat=True)
+        AuthorStats.objects.bulk_create(
+            [AuthorStats(user_id=pk) for pk in missing],
+            ignore_conflicts=True,
+        )
+    return recount_chunked(
+        AuthorStats.objects.filter(user__in=users),
+        chunk_size,
+        posts_count=count_of(Post, 'author', 'user'),
+        followers_count=count_of(Follow, 'author', 'user'),
+        following_count=count_of(Follow, 'user', 'user'),
+    )
+
+
+def recount_groups(chunk_size=CHUNK_SIZE, groups=None):
+    groups = Group.objects.all() if groups is None else groups
+    return recount_chunked(
+        groups, chunk_size, posts_count=count_of(Post, 'group')
+    )
+
+
+def recount_posts(chunk_size=CHUNK_SIZE, posts=None):
+    posts = Post.objects.all() if posts is None else posts
+    return recount_chunked(
+        posts, chunk_size, comments_count=count_of(Comment, 'post')
+    )
@@ -0,0 +1,141 @@
+import time
+import zipfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .counters import CHUNK_SIZE
+from .models import Comment, Post
+
+JSONL = 'jsonl'
+ZIP = 'zip'
+FORMATS = (JSONL, ZIP)
+CONTENT_TYPES = {JSONL: 'application/x-ndjson', ZIP: 'application/zip'}
+RECORDS_NAME = 'posts.jsonl'
+IMAGES_DIR = 'images'
+# Сколько байт копить перед отдачей: строка на write() слишком мелко.
+BUFFER_SIZE = 64 * 1024
+
+
+def filename(user, fmt):
+    return f'{user.username}.{fmt}'
+
+
+def records(user, chunk_size=CHUNK_SIZE):
+    '''Посты и комментарии автора строками values(), без моделей.'''
+    posts = (
+        Post.objects.filter(author=user)
+        .order_by('pk')
+        .values('id', 'pub_date', 'group__slug', 'text', 'image')
+    )
+    for row in posts.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'post',
+            'id': row['id'],
+            'pub_date': row['pub_date'],
+            'group': row['group__slug'],
+            'text': row['text'],
+            'image': row['image'] or None,
+        }
+    comments = (
+        Comment.objects.filter(author=user)
+        .order_by('pk')
+        .values('id', 'post_id', 'created', 'text')
+    )
+    for row in comments.iterator(chunk_size=chunk_size):
+        yield {
+            'type': 'comment',
+            'id': row['id'],
+            'post': row['post_id'],
+            'created': row['created'],
+            'text': row['text'],
+        }
+
+
+def jsonl_lines(user, chunk_size=CHUNK_SIZE):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for record in records(user, chunk_size):
+        yield (encoder.encode(record) + '\n').encode()
+
+
+def image_names(user, chunk_size=CHUNK_SIZE):
+    '''Имена картинок автора; одинаковые файлы — один раз.'''
+    return (
+        Post.objects.filter(author=user)
+        .exclude(image='')
+        .exclude(image=None)
+        .order_by('image')
+        .values_list('image', flat=True)
+        .distinct()
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class Pipe:
+    '''Файл только для записи, из которого архив забирается по частям.'''
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_chunks(user, chunk_size=CHUNK_SIZE):
+    '''Zip с posts.jsonl и картинками, собираемый на лету.
+
+    Архив пишется в Pipe, который опустошается после каждой записи,
+    поэтому в памяти держится только текущий кусок файла.
+    '''
+    pipe = Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(RECORDS_NAME, 'w', force_zip64=True) as entry:
+            for line in jsonl_lines(user, chunk_size):
+                entry.write(line)
+                yield pipe.drain()
+        storage = Post._meta.get_field('image').storage
+        for name in image_names(user, chunk_size):
+            try:
+                source = storage.open(name)
+            except (OSError, SuspiciousFileOperation):
+                continue
+            # Картинки уже сжаты, поэтому кладутся как есть.
+            info = zipfile.ZipInfo(
+                f'{IMAGES_DIR}/{name}', time.localtime()[:6]
+            )
+            info.compress_type = zipfile.ZIP_STORED
+            with source, archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in source.chunks():
+                    entry.write(chunk)
+                    yield pipe.drain()
+    yield pipe.drain()
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    '''Склеивает мелкие куски в блоки около size байт.'''
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer.clear()
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def stream(user, fmt=JSONL, chunk_size=CHUNK_SIZE):
+    '''Выгрузка автора блоками байт, память не растёт с её размером.'''
+    chunks = zip_chunks if fmt == ZIP else jsonl_lines
+    return buffered(chunks(user, chunk_size))
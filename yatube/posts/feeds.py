@@ -0,0 +1,205 @@
+import hashlib
+from calendar import timegm
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date, quote_etag
+
+from . import listings
+from .models import Group, Post, User
+
+GROUP = 'group'
+PROFILE = 'profile'
+
+
+class PostsFeed(Feed):
+    '''Последние посты сайта.'''
+
+    title = 'Yatube: последние записи'
+    link = reverse_lazy('posts:index')
+    description = 'Новые записи всех авторов.'
+
+    def items(self):
+        return Post.objects.select_related('author', 'group')[
+            : settings.FEED_LENGTH
+        ]
+
+    def item_title(self, post):
+        return str(post)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=[post.pk])
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+
+class GroupPostsFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def link(self, group):
+        return reverse('posts:group_list', args=[group.slug])
+
+    def description(self, group):
+        return group.description
+
+    def items(self, group):
+        return group.posts.select_related('author', 'group')[
+            : settings.FEED_LENGTH
+        ]
+
+
+class ProfilePostsFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+    def description(self, author):
+        return f'Новые записи автора {author.username}.'
+
+    def items(self, author):
+        return author.posts.select_related('author', 'group')[
+            : settings.FEED_LENGTH
+        ]
+
+
+class AtomMixin:
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+
+class PostsAtomFeed(AtomMixin, PostsFeed):
+    pass
+
+
+class GroupPostsAtomFeed(AtomMixin, GroupPostsFeed):
+    pass
+
+
+class ProfilePostsAtomFeed(AtomMixin, ProfilePostsFeed):
+    pass
+
+
+def target_key(kind, value):
+    return f'feed-target:{kind}:{value}'
+
+
+def forget(kind, value):
+    '''Стирает соответствие имени: его мог занять другой объект.'''
+    cache.delete(target_key(kind, value))
+
+
+def namespace_of(kind, value):
+    '''Пространство версий ленты по слагу группы или имени автора.
+
+    Соответствие кешируется, чтобы опрос ленты не ходил в базу.
+    Переименование сдвигает версию, лента перестраивается и под
+    старым именем отвечает 404, а соответствие стирается. Сохранение
+    группы или автора стирает соответствие его нового имени, чтобы
+    занявший старое имя не попал в пространство прежнего владельца.
+    '''
+    if kind is None:
+        return listings.INDEX
+    key = target_key(kind, value)
+    namespace = cache.get(key)
+    if namespace is not None:
+        return namespace
+    if kind == GROUP:
+        pk = Group.objects.filter(slug=value).values_list('pk', flat=True)
+        namespace_for = listings.group_namespace
+    else:
+        pk = User.objects.filter(username=value).values_list('pk', flat=True)
+        namespace_for = listings.profile_namespace
+    pk = pk.first()
+    if pk is None:
+        raise Http404
+    namespace = namespace_for(pk)
+    cache.set(key, namespace, settings.FEED_CACHE_TIMEOUT)
+    return namespace
+
+
+def render(feed, request, kwargs):
+    '''Готовая лента: тело, тип и время самого нового поста.'''
+    obj = feed.get_object(request, **kwargs)
+    generator = feed.get_feed(obj, request)
+    latest = generator.latest_post_date()
+    return {
+        'content': generator.writeString('utf-8').encode(),
+        'content_type': generator.content_type,
+        'last_modified': timegm(latest.utctimetuple()),
+    }
+
+
+def cached_feed(feed_class, kind=None):
+    '''Вью ленты с кешем под версией ленты и условными ответами.
+
+    Версия и готовая лента берутся из кеша, поэтому и повторный
+    опрос, и ответ 304 по If-None-Match или If-Modified-Since обходятся
+    без базы. ETag несёт версию и дату самого нового поста,
+    Last-Modified — только дату.
+    '''
+    feed = feed_class()
+    name = feed_class.__name__
+
+    def view(request, **kwargs):
+        value = next(iter(kwargs.values()), None)
+        namespace = namespace_of(kind, value)
+        version = listings.version(namespace)
+        # Ссылки в ленте абсолютные, поэтому хост входит в ключ.
+        key = f'feed:{name}:{request.get_host()}:{namespace}:{version}'
+        cached = cache.get(key)
+        if cached is None:
+            try:
+                cached = render(feed, request, kwargs)
+            except Http404:
+                forget(kind, value)
+                raise
+            cache.set(key, cached, settings.FEED_CACHE_TIMEOUT)
+        raw = f'{key}:{cached["last_modified"]}'
+        etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=cached['last_modified']
+        )
+        if response is None:
+            response = HttpResponse(
+                cached['content'], content_type=cached['content_type']
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(cached['last_modified'])
+        return response
+
+    return view
+
+
+index_rss = cached_feed(PostsFeed)
+index_atom = cached_feed(PostsAtomFeed)
+group_rss = cached_feed(GroupPostsFeed, GROUP)
+group_atom = cached_feed(GroupPostsAtomFeed, GROUP)
+profile_rss = cached_feed(ProfilePostsFeed, PROFILE)
+profile_atom = cached_feed(ProfilePostsAtomFeed, PROFILE)
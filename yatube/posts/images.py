@@ -0,0 +1,154 @@
+import os
+import tempfile
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files import File
+from django.db import transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+from sorl.thumbnail import delete as delete_with_thumbnails
+
+from . import counters, thumbnails
+from .models import Post, StoredImage
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def ingest(upload):
+    '''Приводит загруженную картинку к виду, в котором она хранится.
+
+    Сторона уменьшается до POST_IMAGE_MAX_SIDE, поворот из EXIF
+    применяется к пикселям, а сами метаданные отбрасываются. Картинка
+    с прозрачностью сохраняется в PNG, остальные — в JPEG. JPEG
+    декодируется сразу в уменьшенном масштабе, а результат пишется во
+    временный файл, поэтому память не растёт вместе с оригиналом.
+    '''
+    limit = settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as original:
+        width, height = original.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Слишком большая картинка: не больше %(pixels)s пикселей.',
+                code='too_many_pixels',
+                params={'pixels': settings.POST_IMAGE_MAX_PIXELS},
+            )
+        original.draft('RGB', (limit, limit))
+        image = ImageOps.exif_transpose(original)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    if has_alpha(image):
+        image, extension = image.convert('RGBA'), '.png'
+        options = {'format': 'PNG', 'optimize': True}
+    else:
+        image, extension = image.convert('RGB'), '.jpg'
+        options = {
+            'format': 'JPEG',
+            'quality': settings.POST_IMAGE_JPEG_QUALITY,
+            'optimize': True,
+            'progressive': True,
+        }
+    output = tempfile.TemporaryFile()
+    image.save(output, **options)
+    output.seek(0)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=stem + extension)
+
+
+def pin(name):
+    '''Держит строку файла до конца транзакции, которая его сохраняет.
+
+    Пустой UPDATE берёт блокировку записи, поэтому collect() не удалит
+    файл между проверкой его наличия в хранилище и retain() поста, а
+    уже начатый collect() сначала закончит удаление файла.
+    '''
+    StoredImage.objects.filter(name=name).update(references=F('references'))
+
+
+def retain(name):
+    '''Отмечает, что ещё один пост ссылается на файл name.'''
+    if not name:
+        return
+    StoredImage.objects.bulk_create(
+        [StoredImage(name=name)], ignore_conflicts=True
+    )
+    counters.shift(StoredImage.objects.filter(name=name), 'references', 1)
+
+
+def release(name):
+    '''Снимает ссылку поста на файл; файл без ссылок удаляется.'''
+    if not name:
+        return
+    counters.shift(StoredImage.objects.filter(name=name), 'references', -1)
+    # Файл удаляется только после коммита: откат вернёт ссылку.
+    transaction.on_commit(lambda: collect(name))
+
+
+def stored_names(directory):
+    '''Имена всех файлов хранилища Post.image в каталоге directory.'''
+    storage = Post._meta.get_field('image').storage
+    directories, files = storage.listdir(directory)
+    for file_name in files:
+        yield os.path.join(directory, file_name)
+    for subdirectory in directories:
+        yield from stored_names(os.path.join(directory, subdirectory))
+
+
+def sweep(chunk_size=500):
+    '''Удаляет файлы картинок постов, на которые нет строки StoredImage.
+
+    Такие файлы остаются, когда откатывается транзакция, которая их
+    записала. Каждый удаляется под pin(), как в collect(): сохранение
+    того же файла либо дождётся удаления и запишет его заново, либо
+    успеет создать строку, и файл останется. Возвращает число файлов.
+    '''
+    directory = Post._meta.get_field('image').upload_to
+    if not Post._meta.get_field('image').storage.exists(directory):
+        return 0
+    names = stored_names(directory)
+    deleted = 0
+    while True:
+        chunk = list(islice(names, chunk_size))
+        if not chunk:
+            return deleted
+        known = set(
+            StoredImage.objects.filter(name__in=chunk).values_list(
+                'name', flat=True
+            )
+        )
+        for name in chunk:
+            if name not in known and sweep_file(name):
+                deleted += 1
+
+
+def sweep_file(name):
+    with transaction.atomic():
+        pin(name)
+        if StoredImage.objects.filter(name=name).exists():
+            return False
+        delete_with_thumbnails(thumbnails.source_file(name))
+        return True
+
+
+def collect(name):
+    '''Удаляет файл и его миниатюры, если на него больше не ссылаются.
+
+    Файл удаляется до коммита удаления строки: pin() сохраняющего
+    этот файл поста дождётся коммита и увидит, что файла уже нет.
+    '''
+    with transaction.atomic():
+        deleted, _ = StoredImage.objects.filter(
+            name=name, references=0
+        ).delete()
+        if not deleted:
+            return
+        try:
+            delete_with_thumbnails(thumbnails.source_file(name))
+        except SuspiciousFileOperation:
+            # Имя указывает за пределы MEDIA_ROOT: такой файл не наш.
+            pass
@@ -0,0 +1,266 @@
+import csv
+import json
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, listings, search, timeline
+from .models import Comment, Group, Post, User
+from .utils import assign_ids
+
+JSONL = 'jsonl'
+CSV = 'csv'
+FORMATS = (JSONL, CSV)
+RECORD_FIELDS = ('author', 'group', 'text', 'pub_date')
+COMMENT_FIELDS = ('author', 'text', 'created')
+
+
+class RecordError(ValueError):
+    '''Строка входного файла, которую нельзя разобрать.'''
+
+    def __init__(self, line, message):
+        super().__init__(f'Строка {line}: {message}')
+        self.line = line
+
+
+def read_records(lines, fmt, skipped=None):
+    '''Потоково разбирает вход в пары (номер строки, запись).
+
+    JSONL: объект на строку, комментарии — списком в поле comments.
+    CSV: заголовок author,group,text,pub_date, без комментариев.
+    Номера неразобранных строк JSONL добавляются в skipped, а без
+    него такая строка поднимает RecordError.
+    '''
+    if fmt == CSV:
+        reader = csv.DictReader(lines)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('ожидается объект JSON')
+        except ValueError as error:
+            if skipped is None:
+                raise RecordError(number, error)
+            skipped.append(number)
+            continue
+        yield number, record
+
+
+def parse_date(value, line):
+    if not value:
+        return timezone.now()
+    try:
+        # Дата верного вида, но несуществующая, вроде 30 февраля,
+        # приходит из parse_datetime исключением, а не None.
+        date = parse_datetime(value)
+    except (ValueError, TypeError):
+        date = None
+    if date is None:
+        raise RecordError(line, f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def keep_dates(*fields):
+    '''Отключает auto_now_add, чтобы bulk_create сохранил даты из файла.'''
+    saved = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add in zip(fields, saved):
+            field.auto_now_add = auto_now_add
+
+
+def record_comments(record, line):
+    comments = record.get('comments') or []
+    if not isinstance(comments, list) or not all(
+        isinstance(comment, dict) for comment in comments
+    ):
+        raise RecordError(line, 'comments — не список объектов')
+    return comments
+
+
+def check_strings(record, fields, line):
+    for field in fields:
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            raise RecordError(line, f'{field} — не строка')
+
+
+def check_record(record, line):
+    '''Проверяет типы полей до того, как имена попадут в словари.'''
+    check_strings(record, RECORD_FIELDS, line)
+    for comment in record_comments(record, line):
+        check_strings(comment, COMMENT_FIELDS, line)
+
+
+class Importer:
+    '''Вставляет посты и комментарии пачками в обход сигналов.
+
+    Авторы и группы ищутся по словарям в памяти, которые дополняются
+    одним запросом на пачку. Счётчики, полнотекстовый индекс и ленты
+    подписок обновляются для всей пачки сразу, версии лент сдвигаются
+    в конце импорта. Неверные строки пропускаются и собираются в
+    skipped, а при strict первая из них обрывает импорт.
+    '''
+
+    def __init__(self, create_missing=False, strict=False):
+        self.create_missing = create_missing
+        self.strict = strict
+        self.authors = {}
+        self.groups = {}
+        self.namespaces = {listings.INDEX}
+        self.skipped = []
+
+    def resolve(self, cache, model, field, names, create):
+        missing = set(names) - cache.keys() - {''}
+        if not missing:
+            return
+        found = dict(
+            model.objects.filter(**{f'{field}__in': missing}).values_list(
+                field, 'pk'
+            )
+        )
+        for name in missing - found.keys():
+            # Новые авторы и группы редки, поэтому создаются обычным
+            # save(): сигналы заведут им статистику и поиск по имени.
+            found[name] = create(name).pk if self.create_missing else None
+        cache.update(found)
+
+    def resolve_chunk(self, records):
+        usernames, slugs = set(), set()
+        for _, record in records:
+            usernames.add(record.get('author') or '')
+            slugs.add(record.get('group') or '')
+            for comment in record.get('comments') or ():
+                usernames.add(comment.get('author') or '')
+        self.resolve(
+            self.authors,
+            User,
+            'username',
+            usernames,
+            lambda name: User.objects.create_user(username=name),
+        )
+        self.resolve(
+            self.groups,
+            Group,
+            'slug',
+            slugs,
+            lambda slug: Group.objects.create(
+                title=slug, slug=slug, description=''
+            ),
+        )
+
+    def build(self, line, record):
+        '''Пост и его комментарии или None, если запись пропущена.
+
+        Неверные дата или комментарии поднимают RecordError: запись
+        пропускается, а не обрывает импорт.
+        '''
+        author_id = self.authors.get(record.get('author') or '')
+        slug = record.get('group') or ''
+        group_id = self.groups.get(slug) if slug else None
+        text = record.get('text') or ''
+        if author_id is None or (slug and group_id is None) or not text:
+            self.skipped.append(line)
+            return None
+        comments = []
+        for comment in record_comments(record, line):
+            commenter_id = self.authors.get(comment.get('author') or '')
+            if commenter_id is None or not comment.get('text'):
+                self.skipped.append(line)
+                return None
+            comments.append(
+                Comment(
+                    author_id=commenter_id,
+                    text=comment['text'],
+                    created=parse_date(comment.get('created'), line),
+                )
+            )
+        post = Post(
+            author_id=author_id,
+            group_id=group_id,
+            text=text,
+            pub_date=parse_date(record.get('pub_date'), line),
+            comments_count=len(comments),
+        )
+        return post, comments
+
+    def read(self, lines, fmt):
+        return read_records(lines, fmt, None if self.strict else self.skipped)
+
+    def reject(self, error):
+        '''Пропускает неверную запись, а в строгом режиме обрывает импорт.'''
+        if self.strict:
+            raise error
+        self.skipped.append(error.line)
+
+    def checked(self, records):
+        valid = []
+        for line, record in records:
+            try:
+                check_record(record, line)
+            except RecordError as error:
+                self.reject(error)
+            else:
+                valid.append((line, record))
+        return valid
+
+    def import_chunk(self, records):
+        '''Вставляет пачку в одной транзакции, возвращает (постов, комм.).'''
+        records = self.checked(records)
+        with transaction.atomic():
+            self.resolve_chunk(records)
+            built = []
+            for line, record in records:
+                try:
+                    item = self.build(line, record)
+                except RecordError as error:
+                    self.reject(error)
+                    continue
+                if item is not None:
+                    built.append(item)
+            posts = [post for post, _ in built]
+            assign_ids(Post, posts)
+            with keep_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created'),
+            ):
+                Post.objects.bulk_create(posts)
+                comments = []
+                for post, post_comments in built:
+                    for comment in post_comments:
+                        comment.post_id = post.pk
+                        comments.append(comment)
+                Comment.objects.bulk_create(comments)
+            self.update_derived(posts)
+        return len(posts), len(comments)
+
+    def update_derived(self, posts):
+        by_author = Counter(post.author_id for post in posts)
+        for author_id, delta in by_author.items():
+            counters.shift_author(author_id, 'posts_count', delta)
+            self.namespaces.add(listings.profile_namespace(author_id))
+        by_group = Counter(post.group_id for post in posts)
+        by_group.pop(None, None)
+        for group_id, delta in by_group.items():
+            counters.shift_group(group_id, delta)
+            self.namespaces.add(listings.group_namespace(group_id))
+        search.index_posts([post.pk for post in posts], comments=True)
+        timeline.fan_out_many(posts)
+
+    def finish(self):
+        '''Сдвигает версии затронутых лент.'''
+        listings.bump(*self.namespaces)
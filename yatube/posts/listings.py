@@ -0,0 +1,102 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+INDEX = 'index'
+
+
+def group_namespace(group_id):
+    return f'group:{group_id}'
+
+
+def profile_namespace(author_id):
+    return f'profile:{author_id}'
+
+
+def author_entity_namespace(author_id):
+    '''Версия самого автора: имя и ссылка в карточках, не его лента.'''
+    return f'author:{author_id}'
+
+
+def group_entity_namespace(group_id):
+    return f'group-entity:{group_id}'
+
+
+def comments_namespace(post_id):
+    return f'comments:{post_id}'
+
+
+def version_key(namespace):
+    return f'listing-version:{namespace}'
+
+
+def fresh_version():
+    '''Начальная версия — время в миллисекундах.
+
+    Если ключ версии вытеснен из кеша, новая версия окажется больше
+    прежних, и старые фрагменты не всплывут снова.
+    '''
+    return int(time.time() * 1000)
+
+
+def versions(*namespaces):
+    keys = {version_key(namespace): namespace for namespace in namespaces}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, fresh_version(), timeout=None)
+        found[key] = cache.get(key)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def version(namespace):
+    return versions(namespace)[namespace]
+
+
+def shift_versions(namespaces):
+    for namespace in namespaces:
+        key = version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, fresh_version(), timeout=None)
+
+
+def bump(*namespaces):
+    '''Сдвигает версии, после чего старые фрагменты больше не читаются.
+
+    Версии сдвигаются сразу и ещё раз после коммита: фрагмент, который
+    другой запрос успел закешировать до коммита, тоже станет старым.
+    '''
+    namespaces = set(namespaces)
+    shift_versions(namespaces)
+    transaction.on_commit(lambda: shift_versions(namespaces))
+
+
+def listing_context(namespace):
+    return {
+        'listing_version': version(namespace),
+        'listing_timeout': settings.LISTING_CACHE_TIMEOUT,
+    }
+
+
+def bump_post(post, old_author_id=None, old_group_id=None):
+    author_ids = {post.author_id, old_author_id} - {None}
+    group_ids = {post.group_id, old_group_id} - {None}
+    bump(
+        INDEX,
+        *map(profile_namespace, author_ids),
+        *map(group_namespace, group_ids),
+    )
+
+
+def bump_posts(posts):
+    '''Сдвигает версии всех лент, где встречаются посты из posts.'''
+    pairs = posts.order_by().values_list('author_id', 'group_id').distinct()
+    namespaces = [INDEX]
+    for author_id, group_id in pairs:
+        namespaces.append(profile_namespace(author_id))
+        if group_id is not None:
+            namespaces.append(group_namespace(group_id))
+    bump(*namespaces)
@@ -0,0 +1,141 @@
+import re
+
+from django.db import transaction
+
+from .models import LookupTerm, LookupTrigram
+from .utils import assign_ids
+
+# Доля общих триграмм, начиная с которой строки считаются похожими.
+SIMILARITY_THRESHOLD = 0.3
+# Сколько лучших строк-кандидатов оценивается на один запрос.
+CANDIDATES = 50
+
+
+def words(text):
+    '''Слова строки в нижнем регистре; «_» и дефис их разделяют.'''
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def trigrams(text):
+    '''Триграммы как в pg_trgm: слова с отступами по краям.
+
+    «анна» даёт «  а», « ан», «анн», «нна», «на ». Опечатка меняет
+    лишь несколько триграмм, поэтому похожие строки делят большинство.
+    '''
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        grams.update(padded[i: i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def user_terms(user):
+    full_name = user.get_full_name()
+    label = f'{full_name} ({user.username})' if full_name else user.username
+    return [value for value in (user.username, full_name) if value], label
+
+
+def group_terms(group):
+    return [group.title, group.slug], group.title
+
+
+def index_object(kind, object_id, values, label):
+    '''Заменяет строки объекта, если они изменились.
+
+    Каждое слово индексируется отдельно: так «кошкы» похоже на «кошки»
+    из «Кошки и собаки» не меньше, чем на одно слово «кошки».
+    '''
+    terms = LookupTerm.objects.filter(kind=kind, object_id=object_id)
+    current = set(terms.values_list('value', 'label'))
+    wanted = {(word, label) for value in values for word in words(value)}
+    if current == wanted:
+        return
+    with transaction.atomic():
+        terms.delete()
+        for value, label in wanted:
+            grams = trigrams(value)
+            term = LookupTerm.objects.create(
+                kind=kind,
+                object_id=object_id,
+                value=value,
+                label=label,
+                trigrams_count=len(grams),
+            )
+            LookupTrigram.objects.bulk_create(
+                LookupTrigram(term=term, trigram=gram) for gram in grams
+            )
+
+
+def index_many(kind, entries):
+    '''Индексирует пачку новых объектов: (id, строки, подпись).
+
+    Для массовой загрузки, когда строк у объектов ещё нет: строки и
+    их триграммы вставляются двумя bulk_create на всю пачку.
+    '''
+    terms = [
+        LookupTerm(
+            kind=kind,
+            object_id=object_id,
+            value=word,
+            label=label,
+            trigrams_count=len(trigrams(word)),
+        )
+        for object_id, values, label in entries
+        for word in {word for value in values for word in words(value)}
+    ]
+    with transaction.atomic():
+        assign_ids(LookupTerm, terms)
+        LookupTerm.objects.bulk_create(terms)
+        LookupTrigram.objects.bulk_create(
+            LookupTrigram(term=term, trigram=gram)
+            for term in terms
+            for gram in trigrams(term.value)
+        )
+
+
+def index_user(user):
+    index_object(LookupTerm.USER, user.pk, *user_terms(user))
+
+
+def index_group(group):
+    index_object(LookupTerm.GROUP, group.pk, *group_terms(group))
+
+
+def unindex(kind, object_id):
+    LookupTerm.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def similar(query, kinds=None, limit=10):
+    '''Строки, похожие на query, от самой похожей; по одной на объект.
+
+    Похожесть — как similarity() в pg_trgm: общие триграммы, делённые
+    на число триграмм в объединении обеих строк. Общие триграммы
+    считаются по покрывающему индексу (trigram, term) без обращения к
+    самим строкам, строки читаются только для совпавших id.
+    '''
+    grams = sorted(trigrams(query))
+    if not grams:
+        return []
+    kinds = kinds or [kind for kind, _ in LookupTerm.KINDS]
+    sql = f'''
+        SELECT term.*,
+            matched.shared * 1.0 / (%s + term.trigrams_count - matched.shared)
+            AS similarity
+        FROM (
+            SELECT term_id, COUNT(*) AS shared FROM posts_lookuptrigram
+            WHERE trigram IN ({", ".join(["%s"] * len(grams))})
+            GROUP BY term_id
+        ) AS matched
+        JOIN posts_lookupterm AS term ON term.id = matched.term_id
+        WHERE term.kind IN ({", ".join(["%s"] * len(kinds))})
+            AND similarity >= %s
+        ORDER BY similarity DESC, term.label
+        LIMIT %s
+    '''
+    params = [len(grams), *grams, *kinds, SIMILARITY_THRESHOLD, CANDIDATES]
+    found = {}
+    for term in LookupTerm.objects.raw(sql, params):
+        found.setdefault((term.kind, term.object_id), term)
+        if len(found) == limit:
+            break
+    return list(found.values())
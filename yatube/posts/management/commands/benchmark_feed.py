@@ -0,0 +1,89 @@
+import sys
+import time
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from benchmarks.report import percentile
+from posts import counters, timeline
+from posts.models import AuthorStats, Follow, Post, TimelineEntry, User
+from posts.utils import MergedCursorPaginator
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок «всё раскладываем» и гибридную ленту: '
+        'число записанных строк на пост и задержку чтения. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--followers', type=int, default=2000)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--reads', type=int, default=200)
+        parser.add_argument(
+            '--threshold',
+            type=int,
+            default=settings.TIMELINE_PUSH_FOLLOWER_LIMIT,
+            help='Порог подписчиков для гибридного режима.',
+        )
+
+    def handle(self, *args, followers, posts, reads, threshold, **options):
+        self.stdout.write(
+            f'{"режим":<8}{"строк/пост":>12}{"мс/пост":>10}'
+            f'{"чтение p50":>13}{"чтение p95":>13}'
+        )
+        for label, limit in (('push', sys.maxsize), ('hybrid', threshold)):
+            with override_settings(TIMELINE_PUSH_FOLLOWER_LIMIT=limit):
+                rows, write_ms, read_ms = self.run_scenario(
+                    followers, posts, reads
+                )
+            self.stdout.write(
+                f'{label:<8}{rows / posts:>12.1f}{write_ms / posts:>10.2f}'
+                f'{percentile(read_ms, 0.5):>13.2f}'
+                f'{percentile(read_ms, 0.95):>13.2f}'
+            )
+
+    def run_scenario(self, followers, posts, reads):
+        with transaction.atomic():
+            author, readers = self.populate(followers)
+            written = TimelineEntry.objects.count()
+            started = time.perf_counter()
+            for number in range(posts):
+                Post.objects.create(author=author, text=f'Пост {number}')
+            write_ms = (time.perf_counter() - started) * 1000
+            rows = TimelineEntry.objects.count() - written
+            read_ms = [
+                self.read_feed(reader)
+                for reader in islice(cycle(readers), reads)
+            ]
+            transaction.set_rollback(True)
+        return rows, write_ms, read_ms
+
+    def populate(self, followers):
+        prefix = f'bench-{time.monotonic_ns()}'
+        User.objects.bulk_create(
+            User(username=f'{prefix}-{number}')
+            for number in range(followers + 1)
+        )
+        users = User.objects.filter(username__startswith=prefix)
+        author, *readers = users.order_by('pk')
+        AuthorStats.objects.bulk_create(
+            AuthorStats(user=user) for user in users
+        )
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author) for reader in readers
+        )
+        counters.recount_authors(users=users)
+        return author, readers
+
+    def read_feed(self, reader):
+        started = time.perf_counter()
+        paginator = MergedCursorPaginator(
+            timeline.feed_sources(reader), settings.NUMBER_OF_POSTS
+        )
+        list(paginator.get_page(None))
+        return (time.perf_counter() - started) * 1000
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sitemaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит карту сайта статическими файлами: индекс и шарды '
+        'постов и профилей по диапазонам id. Переписываются только '
+        'шарды, изменившиеся с прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=settings.SITEMAP_ROOT,
+            help='Каталог, который веб-сервер отдаёт как SITEMAP_URL.',
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=settings.SITEMAP_SHARD_SIZE,
+            help=(
+                'Ширина диапазона id в шарде, '
+                f'не больше {sitemaps.MAX_SHARD_SIZE} адресов.'
+            ),
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Переписать все шарды, не сверяясь с manifest.json.',
+        )
+
+    def handle(self, *args, output, shard_size, full, **options):
+        if not 1 <= shard_size <= sitemaps.MAX_SHARD_SIZE:
+            raise CommandError(
+                f'--shard-size должен быть от 1 до {sitemaps.MAX_SHARD_SIZE}.'
+            )
+        written, kept = sitemaps.build(output, shard_size, full)
+        self.stdout.write(f'Шардов записано: {written}, без изменений: {kept}')
@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters, export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты и комментарии пользователя в JSONL '
+        'или zip с картинками, не держа выгрузку в памяти.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format',
+            dest='fmt',
+            choices=export.FORMATS,
+            default=export.JSONL,
+        )
+        parser.add_argument(
+            '--output',
+            help='Куда писать, «-» — stdout; по умолчанию <username>.<fmt>.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=counters.CHUNK_SIZE,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, username, fmt, output, chunk_size, **options):
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f'Пользователь {username} не найден.')
+        output = output or export.filename(user, fmt)
+        chunks = export.stream(user, fmt, chunk_size)
+        if output == '-':
+            self.write(chunks, sys.stdout.buffer)
+            return
+        with open(output, 'wb') as target:
+            written = self.write(chunks, target)
+        self.stdout.write(f'Записано {written} байт в {output}')
+
+    def write(self, chunks, target):
+        written = 0
+        for chunk in chunks:
+            target.write(chunk)
+            written += len(chunk)
+        return written
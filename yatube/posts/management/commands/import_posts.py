@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters, importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты и комментарии из JSONL или CSV пачками '
+        'через bulk_create, обновляя счётчики, поиск и ленты разом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с записями, «-» — stdin.')
+        parser.add_argument(
+            '--format',
+            dest='fmt',
+            choices=importer.FORMATS,
+            help='Формат входа; по умолчанию — по расширению файла.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=counters.CHUNK_SIZE,
+            help='Сколько записей вставлять в одной транзакции.',
+        )
+        parser.add_argument(
+            '--create-missing',
+            action='store_true',
+            help='Создавать неизвестных авторов и группы, а не пропускать.',
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Останавливаться на первой неверной строке.',
+        )
+
+    def handle(
+        self, *args, path, fmt, chunk_size, create_missing, strict, **options
+    ):
+        fmt = fmt or self.guess_format(path)
+        posts_importer = importer.Importer(create_missing, strict)
+        if path == '-':
+            self.run(posts_importer, sys.stdin, fmt, chunk_size)
+        else:
+            with open(path, encoding='utf-8', newline='') as lines:
+                self.run(posts_importer, lines, fmt, chunk_size)
+        for line in sorted(posts_importer.skipped):
+            self.stderr.write(f'Пропущена строка {line}')
+
+    def guess_format(self, path):
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension not in importer.FORMATS:
+            raise CommandError('Укажите --format: jsonl или csv.')
+        return extension
+
+    def run(self, posts_importer, lines, fmt, chunk_size):
+        records = posts_importer.read(lines, fmt)
+        started = time.perf_counter()
+        posts = comments = 0
+        try:
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                added_posts, added_comments = posts_importer.import_chunk(
+                    chunk
+                )
+                posts += added_posts
+                comments += added_comments
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Постов: {posts}, комментариев: {comments}, '
+                    f'{posts / elapsed:.0f} постов/с'
+                )
+        except importer.RecordError as error:
+            raise CommandError(
+                f'{error}. Импортировано постов до ошибки: {posts}.'
+            )
+        finally:
+            posts_importer.finish()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters, search
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=counters.CHUNK_SIZE,
+            help='Сколько id строк индексировать в одной транзакции.',
+        )
+
+    def handle(self, *args, chunk_size, **options):
+        indexed = search.rebuild(chunk_size)
+        self.stdout.write(f'Проиндексировано постов: {indexed}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов, групп и авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=counters.CHUNK_SIZE,
+            help='Сколько строк пересчитывать в одной транзакции.',
+        )
+
+    def handle(self, *args, chunk_size, **options):
+        for name, recount in (
+            ('авторов', counters.recount_authors),
+            ('групп', counters.recount_groups),
+            ('постов', counters.recount_posts),
+        ):
+            updated = recount(chunk_size)
+            self.stdout.write(f'Пересчитано {name}: {updated}')
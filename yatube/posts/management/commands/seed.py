@@ -0,0 +1,83 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import counters
+from posts.models import User
+from posts.seeding import Seeder
+
+
+def aware_date(value):
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, '
+        'подписками, постами и комментариями. Распределения степенные, '
+        'результат определяется --seed, вставка идёт пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument(
+            '--comments',
+            type=float,
+            default=2,
+            help='Среднее число комментариев на пост.',
+        )
+        parser.add_argument(
+            '--follows',
+            type=float,
+            default=20,
+            help='Среднее число подписок на пользователя.',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--until',
+            type=aware_date,
+            default=aware_date('2024-01-01'),
+            help='Дата самого позднего поста, ГГГГ-ММ-ДД.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько дней до --until распределены посты.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=counters.CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        seed = options['seed']
+        if User.objects.filter(username__endswith=f'-{seed}-0').exists():
+            raise CommandError(
+                f'Данные с --seed {seed} уже загружены, выберите другой.'
+            )
+        seeder = Seeder(
+            seed, options['until'], options['days'], options['chunk_size']
+        )
+        started = time.perf_counter()
+        seeder.seed_users(options['users'])
+        seeder.seed_groups(options['groups'])
+        self.report('Пользователи и группы', started)
+        seeder.seed_follows(options['follows'])
+        self.report('Подписки', started)
+        step = max(options['posts'] // 20, 1)
+        for seeded in seeder.seed_posts(options['posts'], options['comments']):
+            if seeded % step < options['chunk_size']:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'Постов: {seeded}, {elapsed:.0f} с')
+        seeder.finish()
+        self.report('Счётчики и ленты', started)
+
+    def report(self, stage, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{stage}: готово, {elapsed:.0f} с')
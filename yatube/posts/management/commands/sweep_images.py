@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import images
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок постов, на которые не ссылается ни одна '
+        'строка StoredImage: их оставляют откаченные сохранения постов.'
+    )
+
+    def handle(self, *args, **options):
+        deleted = images.sweep()
+        self.stdout.write(f'Удалено файлов: {deleted}')
@@ -0,0 +1,92 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+
+
+class InlineExecutor:
+    '''Выполняет задачи в текущем процессе: для --processes 1 и тестов.'''
+
+    def map(self, function, arguments):
+        return map(function, arguments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def run(image):
+    '''Возвращает исключение, а не бросает его: оно уйдёт в задачу.'''
+    try:
+        thumbnails.generate(image)
+    except Exception as error:
+        return error
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит миниатюры картинок из очереди ThumbnailJob '
+        'пулом процессов по числу ядер.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count(),
+            help='Размер пула; 1 — без пула, в текущем процессе.',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=50,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Пауза в секундах, когда очередь пуста.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Разобрать очередь и выйти.',
+        )
+
+    def handle(self, *args, processes, batch, interval, once, **options):
+        done = failed = 0
+        with self.executor(processes) as executor:
+            while True:
+                jobs = thumbnails.claim(batch)
+                if not jobs:
+                    if once:
+                        break
+                    time.sleep(interval)
+                    continue
+                images = [job.image for job in jobs]
+                if processes > 1:
+                    # Процессы пула форкаются от этого процесса и не должны
+                    # унаследовать его соединение с базой.
+                    connections.close_all()
+                for job, error in zip(jobs, executor.map(run, images)):
+                    if error is None:
+                        thumbnails.finish(job)
+                        done += 1
+                    else:
+                        thumbnails.fail(job, error)
+                        failed += 1
+        self.stdout.write(f'Готово: {done}, с ошибкой: {failed}')
+
+    def executor(self, processes):
+        if processes <= 1:
+            return InlineExecutor()
+        return ProcessPoolExecutor(processes, mp_context=get_context('fork'))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрезает материализованные ленты подписок до заданной длины. '
+        'Запись в ленты сама держит их в пределах TIMELINE_MAX_LENGTH, '
+        'команда нужна после уменьшения этого предела.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-length',
+            type=int,
+            default=settings.TIMELINE_MAX_LENGTH,
+            help='Сколько свежих записей оставить в каждой ленте.',
+        )
+
+    def handle(self, *args, max_length, **options):
+        deleted = timeline.trim_all(max_length)
+        self.stdout.write(f'Удалено записей ленты: {deleted}')
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_stored_images'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                'text, comments, '
+                'tokenize = "unicode61 remove_diacritics 2")',
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'SELECT post.id, post.text, COALESCE('
+                '(SELECT group_concat(comment.text, \' \') '
+                'FROM posts_comment AS comment '
+                'WHERE comment.post_id = post.id), \'\') '
+                'FROM posts_post AS post',
+            ],
+            'DROP TABLE posts_search',
+        ),
+    ]
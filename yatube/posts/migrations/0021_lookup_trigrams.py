@@ -0,0 +1,96 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:24
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def words(text):
+    return re.findall(r'[^\W_]+', text.lower())
+
+
+def trigrams(text):
+    grams = set()
+    for word in words(text):
+        padded = f'  {word} '
+        grams.update(padded[i: i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def fill_lookup(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Group = apps.get_model('posts', 'Group')
+    LookupTerm = apps.get_model('posts', 'LookupTerm')
+    LookupTrigram = apps.get_model('posts', 'LookupTrigram')
+    objects = []
+    for user in User.objects.iterator():
+        full_name = f'{user.first_name} {user.last_name}'.strip()
+        label = user.username
+        if full_name:
+            label = f'{full_name} ({user.username})'
+        objects.append(('user', user.pk, (user.username, full_name), label))
+    for group in Group.objects.iterator():
+        values = (group.title, group.slug)
+        objects.append(('group', group.pk, values, group.title))
+    for kind, object_id, values, label in objects:
+        for value in {word for value in values for word in words(value)}:
+            grams = trigrams(value)
+            term = LookupTerm.objects.create(
+                kind=kind,
+                object_id=object_id,
+                value=value,
+                label=label,
+                trigrams_count=len(grams),
+            )
+            LookupTrigram.objects.bulk_create(
+                LookupTrigram(term=term, trigram=gram) for gram in grams
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0020_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LookupTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('group', 'Группа')], max_length=5, verbose_name='Тип')),
+                ('object_id', models.PositiveIntegerField(verbose_name='Id объекта')),
+                ('value', models.CharField(max_length=300, verbose_name='Строка')),
+                ('label', models.CharField(max_length=300, verbose_name='Подпись')),
+                ('trigrams_count', models.PositiveSmallIntegerField(verbose_name='Число триграмм')),
+            ],
+            options={
+                'verbose_name': 'Строка поиска',
+                'verbose_name_plural': 'Строки поиска',
+            },
+        ),
+        migrations.CreateModel(
+            name='LookupTrigram',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='posts.LookupTerm', verbose_name='Строка')),
+            ],
+            options={
+                'verbose_name': 'Триграмма',
+                'verbose_name_plural': 'Триграммы',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lookupterm',
+            index=models.Index(fields=['kind', 'object_id'], name='lookup_term_object_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lookuptrigram',
+            constraint=models.UniqueConstraint(fields=('trigram', 'term'), name='unique_lookup_trigram'),
+        ),
+        migrations.RunPython(fill_lookup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_comment_feed_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                'DROP TABLE posts_search',
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                'text, comments, post_id UNINDEXED, '
+                'tokenize = "unicode61 remove_diacritics 2")',
+                'INSERT INTO posts_search (rowid, text, comments, post_id) '
+                'SELECT id, text, \'\', id FROM posts_post',
+                'INSERT INTO posts_search (rowid, text, comments, post_id) '
+                'SELECT -id, \'\', text, post_id FROM posts_comment',
+            ],
+            [
+                'DROP TABLE posts_search',
+                'CREATE VIRTUAL TABLE posts_search USING fts5('
+                'text, comments, '
+                'tokenize = "unicode61 remove_diacritics 2")',
+                'INSERT INTO posts_search (rowid, text, comments) '
+                'SELECT post.id, post.text, COALESCE('
+                '(SELECT group_concat(comment.text, \' \') '
+                'FROM posts_comment AS comment '
+                'WHERE comment.post_id = post.id), \'\') '
+                'FROM posts_post AS post',
+            ],
+        ),
+    ]
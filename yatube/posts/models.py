@@ -1,8 +1,10 @@
 from django.contrib.auth import get_user_model
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.db.models import CheckConstraint, F, Q, UniqueConstraint
 
+from .storage import content_storage
+
 
 User = get_user_model()
 
@@ -11,6 +13,9 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name="Заголовок")
     slug = models.SlugField(unique=True, verbose_name="Тег")
     description = models.TextField(verbose_name="Описание")
+    posts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество постов"
+    )
 
     class Meta:
         verbose_name = "Группа"
@@ -25,6 +30,7 @@ class Post(models.Model):
         help_text="Текст нового поста", verbose_name="Текст поста"
     )
     pub_date = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated = models.DateTimeField(auto_now=True, verbose_name="Изменён")
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -41,17 +47,51 @@ class Post(models.Model):
         verbose_name="Группа",
     )
     image = models.ImageField(
-        verbose_name="Картинка", upload_to='posts/', blank=True, null=True
+        verbose_name="Картинка",
+        upload_to='posts/',
+        storage=content_storage,
+        blank=True,
+        null=True,
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Количество комментариев"
     )
 
     class Meta:
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[: settings.SLICE_LETTERS]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        '''Запоминаем загруженные связи, чтобы сигналы видели изменения.'''
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = {
+            name: value
+            for name, value in zip(field_names, values)
+            if name in ('author_id', 'group_id', 'image')
+        }
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Счётчики обновляются в сигналах внутри той же транзакции.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -75,10 +115,20 @@ class Comment(models.Model):
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
         ordering = ('-created',)
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_feed_idx',
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -101,3 +151,175 @@ class Follow(models.Model):
             UniqueConstraint(fields=['user', 'author'], name='unique_follow'),
             CheckConstraint(check=~Q(user=F('author')), name='no_self_follow'),
         ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class AuthorStats(models.Model):
+    '''Денормализованные счётчики пользователя.'''
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name="Пользователь",
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество постов"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество подписчиков"
+    )
+    following_count = models.PositiveIntegerField(
+        default=0, verbose_name="Количество подписок"
+    )
+
+    class Meta:
+        verbose_name = "Счётчики пользователя"
+        verbose_name_plural = "Счётчики пользователей"
+
+    def __str__(self) -> str:
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    '''Запись материализованной ленты подписок пользователя.'''
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name="Читатель",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name="Пост",
+    )
+    pub_date = models.DateTimeField(verbose_name="Дата публикации поста")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        ordering = ('-pub_date', '-post')
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_feed_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} ← {self.post_id}'
+
+
+class ThumbnailJob(models.Model):
+    '''Задача подготовить миниатюры картинки поста.'''
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnail_job',
+        verbose_name="Пост",
+    )
+    image = models.CharField(max_length=100, verbose_name="Картинка")
+    created = models.DateTimeField(
+        auto_now_add=True, verbose_name="Поставлена"
+    )
+    taken = models.DateTimeField(
+        blank=True, null=True, verbose_name="Взята воркером"
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0, verbose_name="Попыток"
+    )
+    error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+
+    class Meta:
+        verbose_name = "Задача миниатюр"
+        verbose_name_plural = "Задачи миниатюр"
+        ordering = ('created',)
+
+    def __str__(self) -> str:
+        return self.image
+
+
+class StoredImage(models.Model):
+    '''Файл картинки и число постов, которые на него ссылаются.'''
+
+    name = models.CharField(
+        max_length=100, primary_key=True, verbose_name="Файл"
+    )
+    references = models.PositiveIntegerField(
+        default=0, verbose_name="Ссылок"
+    )
+
+    class Meta:
+        verbose_name = "Файл картинки"
+        verbose_name_plural = "Файлы картинок"
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class LookupTerm(models.Model):
+    '''Строка, по которой нечётко находится пользователь или группа.'''
+
+    USER = 'user'
+    GROUP = 'group'
+    KINDS = (
+        (USER, "Пользователь"),
+        (GROUP, "Группа"),
+    )
+
+    kind = models.CharField(max_length=5, choices=KINDS, verbose_name="Тип")
+    object_id = models.PositiveIntegerField(verbose_name="Id объекта")
+    value = models.CharField(max_length=300, verbose_name="Строка")
+    label = models.CharField(max_length=300, verbose_name="Подпись")
+    trigrams_count = models.PositiveSmallIntegerField(
+        verbose_name="Число триграмм"
+    )
+
+    class Meta:
+        verbose_name = "Строка поиска"
+        verbose_name_plural = "Строки поиска"
+        indexes = [
+            models.Index(
+                fields=['kind', 'object_id'], name='lookup_term_object_idx'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class LookupTrigram(models.Model):
+    '''Триграмма строки поиска: по ним и ищутся похожие строки.'''
+
+    trigram = models.CharField(max_length=3, verbose_name="Триграмма")
+    term = models.ForeignKey(
+        LookupTerm,
+        on_delete=models.CASCADE,
+        related_name='trigrams',
+        verbose_name="Строка",
+    )
+
+    class Meta:
+        verbose_name = "Триграмма"
+        verbose_name_plural = "Триграммы"
+        constraints = [
+            UniqueConstraint(
+                fields=['trigram', 'term'], name='unique_lookup_trigram'
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.trigram
@@ -0,0 +1,190 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .counters import CHUNK_SIZE, id_ranges
+from .models import Comment, Post
+from .utils import CURSOR_PARAM, CursorPaginator
+
+TABLE = 'posts_search'
+# Вес совпадения в тексте поста, в комментарии и в служебной колонке.
+WEIGHTS = (1.0, 0.4, 0.0)
+RANK = f'bm25({", ".join(map(str, WEIGHTS))})'
+SEARCH_KEY = ('search_rank', 'id')
+# SQLite ограничивает число параметров в одном запросе.
+MAX_VARIABLES = 500
+
+# Пост и каждый его комментарий — отдельные строки индекса: rowid поста
+# — его id, rowid комментария — минус id комментария. Поэтому запись
+# комментария трогает только его строку, а не все комментарии поста.
+INSERT_POSTS = f'''
+INSERT INTO {TABLE} (rowid, text, comments, post_id)
+SELECT id, text, '', id FROM posts_post
+'''
+INSERT_COMMENTS = f'''
+INSERT INTO {TABLE} (rowid, text, comments, post_id)
+SELECT -id, '', text, post_id FROM posts_comment
+'''
+
+
+def match_expression(query):
+    '''Превращает ввод пользователя в запрос FTS5.
+
+    Каждое слово ищется по префиксу, все слова должны встретиться.
+    Кавычки и операторы FTS5 из ввода не попадают в запрос.
+    '''
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def in_chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), MAX_VARIABLES):
+        yield ids[start: start + MAX_VARIABLES]
+
+
+def placeholders(chunk):
+    return ', '.join(['%s'] * len(chunk))
+
+
+def delete_rows(cursor, rowids):
+    for chunk in in_chunks(rowids):
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders(chunk)})',
+            chunk,
+        )
+
+
+def index_posts(post_ids, comments=False):
+    '''Перестраивает строки постов, с comments — и их комментариев.
+
+    Правке поста комментарии не нужны; новым постам из импорта они
+    нужны, потому что комментарии пришли вместе с ними.
+    '''
+    with connection.cursor() as cursor:
+        for chunk in in_chunks(post_ids):
+            delete_rows(cursor, chunk)
+            cursor.execute(
+                f'{INSERT_POSTS} WHERE id IN ({placeholders(chunk)})', chunk
+            )
+            if not comments:
+                continue
+            cursor.execute(
+                'SELECT id FROM posts_comment '
+                f'WHERE post_id IN ({placeholders(chunk)})',
+                chunk,
+            )
+            delete_rows(cursor, [-pk for pk, in cursor.fetchall()])
+            cursor.execute(
+                f'{INSERT_COMMENTS} WHERE post_id IN ({placeholders(chunk)})',
+                chunk,
+            )
+
+
+def unindex_posts(post_ids):
+    '''Комментарии удалённого поста уходят из индекса своим сигналом.'''
+    with connection.cursor() as cursor:
+        delete_rows(cursor, post_ids)
+
+
+def index_comments(comment_ids):
+    with connection.cursor() as cursor:
+        delete_rows(cursor, [-pk for pk in comment_ids])
+        for chunk in in_chunks(comment_ids):
+            cursor.execute(
+                f'{INSERT_COMMENTS} WHERE id IN ({placeholders(chunk)})',
+                chunk,
+            )
+
+
+def unindex_comments(comment_ids):
+    with connection.cursor() as cursor:
+        delete_rows(cursor, [-pk for pk in comment_ids])
+
+
+def rebuild(chunk_size=CHUNK_SIZE):
+    '''Строит индекс заново по диапазонам id, возвращает число постов.'''
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    indexed = 0
+    for model, insert in (
+        (Post, INSERT_POSTS),
+        (Comment, INSERT_COMMENTS),
+    ):
+        for start, end in id_ranges(model.objects.all(), chunk_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(
+                    f'{insert} WHERE id >= %s AND id < %s', [start, end]
+                )
+                if model is Post:
+                    indexed += cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return indexed
+
+
+def find(expression, values=None, forward=True, limit=None):
+    '''Пары (id поста, оценка) по убыванию релевантности.
+
+    bm25 в SQLite тем меньше, чем документ релевантнее, поэтому
+    «вперёд» — это по возрастанию (оценка, id), а values задают
+    ключ, строго после которого начинается выборка. Оценка поста —
+    лучшая из его строк: текста и комментариев, поэтому все слова
+    запроса должны встретиться в тексте поста или в одном комментарии.
+    '''
+    sql = (
+        f'SELECT post_id, MIN(rank) AS score FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s AND rank MATCH %s GROUP BY post_id'
+    )
+    params = [expression, RANK]
+    if values is not None:
+        lookup = '>' if forward else '<'
+        sql += (
+            f' HAVING score {lookup} %s OR '
+            f'(score = %s AND post_id {lookup} %s)'
+        )
+        score, pk = values
+        params += [score, score, pk]
+    order = 'ASC' if forward else 'DESC'
+    sql += f' ORDER BY score {order}, post_id {order} LIMIT %s'
+    params.append(limit or -1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+class SearchPaginator(CursorPaginator):
+    '''Keyset-пагинатор по результатам полнотекстового поиска.
+
+    Ключ — (оценка bm25, id): следующая страница продолжает выдачу
+    после последней пары, без OFFSET и подсчёта всех совпадений.
+    '''
+
+    key_types = (int, float)
+
+    def __init__(self, expression, posts, per_page):
+        super().__init__(posts, per_page, key=SEARCH_KEY)
+        self.expression = expression
+
+    def fetch(self, values, descending, limit):
+        # Для лент «вперёд» — это по убыванию даты, здесь — по оценке.
+        found = find(self.expression, values, descending, limit)
+        posts = self.object_list.in_bulk([pk for pk, _ in found])
+        rows = []
+        for pk, score in found:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_rank = score
+                rows.append(post)
+        return rows
+
+
+def make_search_page(request, query):
+    '''Страница результатов поиска или None для пустого запроса.'''
+    expression = match_expression(query)
+    if not expression:
+        return None
+    posts = Post.objects.select_related('author', 'group')
+    paginator = SearchPaginator(expression, posts, settings.NUMBER_OF_POSTS)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
@@ -0,0 +1,254 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db import transaction
+from faker import Faker
+
+from . import counters, listings, lookup, search, timeline
+from .importer import keep_dates
+from .models import (
+    AuthorStats,
+    Comment,
+    Follow,
+    Group,
+    LookupTerm,
+    Post,
+    User,
+)
+from .utils import assign_ids
+
+# Показатель степенного закона: доля автора с рангом r — 1 / r ** s.
+ZIPF_EXPONENT = 1.1
+# Показатель Парето для числа подписок и комментариев на строку.
+PARETO_ALPHA = 1.5
+MAX_COMMENTS_PER_POST = 500
+SENTENCES = 1000
+SHARE_WITH_GROUP = 0.7
+TIMELINES_PER_COMMIT = 100
+
+
+def zipf_weights(count, exponent=ZIPF_EXPONENT):
+    '''Накопленные веса рангов 1..count для random.choices.'''
+    ranks = range(1, count + 1)
+    return list(accumulate(1 / rank ** exponent for rank in ranks))
+
+
+class Seeder:
+    '''Детерминированно заполняет базу данными промышленного масштаба.
+
+    Всё случайное берётся из одного генератора с заданным seed, поэтому
+    один и тот же seed даёт те же строки. Популярность авторов по
+    подписчикам и по числу постов подчиняется закону Ципфа, число
+    подписок у пользователя и комментариев у поста — Парето.
+    '''
+
+    def __init__(self, seed, until, days, chunk_size=counters.CHUNK_SIZE):
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.until = until
+        self.days = days
+        self.chunk_size = chunk_size
+        self.sentences = [self.fake.sentence() for _ in range(SENTENCES)]
+        self.user_ids = []
+        self.group_ids = []
+
+    def pareto(self, mean, cap):
+        '''Целое с тяжёлым хвостом и заданным средним.'''
+        value = (self.random.paretovariate(PARETO_ALPHA) - 1) * (
+            mean * (PARETO_ALPHA - 1)
+        )
+        return min(cap, int(value + self.random.random()))
+
+    def ranked(self, ids):
+        '''Перемешанные ids с накопленными весами Ципфа.'''
+        ids = list(ids)
+        self.random.shuffle(ids)
+        return ids, zipf_weights(len(ids))
+
+    def text(self, sentences):
+        return ' '.join(self.random.choices(self.sentences, k=sentences))
+
+    def chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield start, min(self.chunk_size, total - start)
+
+    def seed_users(self, total):
+        for start, size in self.chunks(total):
+            users = []
+            for number in range(start, start + size):
+                profile = self.fake.simple_profile()
+                first_name, _, last_name = profile['name'].partition(' ')
+                users.append(
+                    User(
+                        username=f'{profile["username"]}-{self.seed}-{number}',
+                        first_name=first_name[:30],
+                        last_name=last_name[:150],
+                        password=UNUSABLE_PASSWORD_PREFIX,
+                    )
+                )
+            with transaction.atomic():
+                assign_ids(User, users)
+                User.objects.bulk_create(users)
+                AuthorStats.objects.bulk_create(
+                    AuthorStats(user_id=user.pk) for user in users
+                )
+                lookup.index_many(
+                    LookupTerm.USER,
+                    [
+                        (
+                            user.pk,
+                            [user.username, user.get_full_name()],
+                            f'{user.get_full_name()} ({user.username})',
+                        )
+                        for user in users
+                    ],
+                )
+            self.user_ids.extend(user.pk for user in users)
+
+    def seed_groups(self, total):
+        groups = []
+        for number in range(total):
+            title = ' '.join(self.fake.words(2)).capitalize()
+            groups.append(
+                Group(
+                    title=title,
+                    slug=f'group-{self.seed}-{number}',
+                    description=self.text(2),
+                )
+            )
+        with transaction.atomic():
+            assign_ids(Group, groups)
+            Group.objects.bulk_create(groups)
+            lookup.index_many(
+                LookupTerm.GROUP,
+                [
+                    (group.pk, [group.title, group.slug], group.title)
+                    for group in groups
+                ],
+            )
+        self.group_ids = [group.pk for group in groups]
+
+    def seed_follows(self, mean):
+        '''Подписки: их число у читателя — Парето, автор — по Ципфу.'''
+        authors, weights = self.ranked(self.user_ids)
+        cap = len(authors) - 1
+        follows = []
+        for user_id in self.user_ids:
+            count = self.pareto(mean, cap)
+            chosen = set(
+                self.random.choices(authors, cum_weights=weights, k=count)
+            )
+            chosen.discard(user_id)
+            follows.extend(
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in sorted(chosen)
+            )
+            if len(follows) >= self.chunk_size:
+                self.save_follows(follows)
+                follows = []
+        self.save_follows(follows)
+
+    def save_follows(self, follows):
+        with transaction.atomic():
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+
+    def seed_posts(self, total, comments_mean):
+        '''Посты по возрастанию даты, автор и группа — по Ципфу.'''
+        authors, author_weights = self.ranked(self.user_ids)
+        groups, group_weights = self.ranked(self.group_ids)
+        commenters, commenter_weights = self.ranked(self.user_ids)
+        span = timedelta(days=self.days).total_seconds()
+        since = self.until - timedelta(days=self.days)
+        offsets = sorted(self.random.random() * span for _ in range(total))
+        seeded = 0
+        for start, size in self.chunks(total):
+            posts = []
+            author_ids = self.random.choices(
+                authors, cum_weights=author_weights, k=size
+            )
+            for offset, author_id in zip(
+                offsets[start: start + size], author_ids
+            ):
+                group_id = None
+                if groups and self.random.random() < SHARE_WITH_GROUP:
+                    group_id = self.random.choices(
+                        groups, cum_weights=group_weights
+                    )[0]
+                pub_date = since + timedelta(seconds=offset)
+                post = Post(
+                    author_id=author_id,
+                    group_id=group_id,
+                    text=self.text(self.random.randint(1, 6)),
+                    pub_date=pub_date,
+                )
+                comments = self.build_comments(
+                    pub_date, commenters, commenter_weights, comments_mean
+                )
+                post.comments_count = len(comments)
+                posts.append((post, comments))
+            self.save_posts(posts)
+            seeded += len(posts)
+            yield seeded
+
+    def build_comments(self, pub_date, commenters, weights, mean):
+        count = self.pareto(mean, MAX_COMMENTS_PER_POST)
+        comments = []
+        for author_id in self.random.choices(
+            commenters, cum_weights=weights, k=count
+        ):
+            # Комментарии приходят в среднем через час после поста.
+            delay = timedelta(seconds=self.random.expovariate(1 / 3600))
+            comments.append(
+                Comment(
+                    author_id=author_id,
+                    text=self.text(1),
+                    created=min(self.until, pub_date + delay),
+                )
+            )
+        return comments
+
+    def save_posts(self, built):
+        posts = [post for post, _ in built]
+        with transaction.atomic(), keep_dates(
+            Post._meta.get_field('pub_date'),
+            Comment._meta.get_field('created'),
+        ):
+            assign_ids(Post, posts)
+            Post.objects.bulk_create(posts)
+            comments = []
+            for post, post_comments in built:
+                for comment in post_comments:
+                    comment.post_id = post.pk
+                    comments.append(comment)
+            Comment.objects.bulk_create(comments)
+            search.index_posts([post.pk for post in posts], comments=True)
+
+    def finish(self):
+        '''Счётчики и ленты подписок за один проход после загрузки.'''
+        # id созданных строк идут подряд, поэтому хватает диапазона.
+        if self.user_ids:
+            counters.recount_authors(
+                self.chunk_size,
+                User.objects.filter(
+                    pk__gte=self.user_ids[0], pk__lte=self.user_ids[-1]
+                ),
+            )
+        if self.group_ids:
+            counters.recount_groups(
+                self.chunk_size,
+                Group.objects.filter(
+                    pk__gte=self.group_ids[0], pk__lte=self.group_ids[-1]
+                ),
+            )
+        # Коммит на каждого пользователя стоил бы fsync, а не вставки.
+        for start in range(0, len(self.user_ids), TIMELINES_PER_COMMIT):
+            with transaction.atomic():
+                for user_id in self.user_ids[
+                    start: start + TIMELINES_PER_COMMIT
+                ]:
+                    timeline.fill(user_id)
+        listings.bump(listings.INDEX)
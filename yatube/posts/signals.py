@@ -0,0 +1,198 @@
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from . import (
+    counters,
+    feeds,
+    images,
+    listings,
+    lookup,
+    search,
+    thumbnails,
+    timeline,
+)
+from .models import (
+    AuthorStats,
+    Comment,
+    Follow,
+    Group,
+    LookupTerm,
+    Post,
+    User,
+)
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, raw, update_fields, **kwargs):
+    # Вход в систему обновляет только last_login — ленты от него не зависят.
+    if raw or instance.pk is None or update_fields == frozenset(
+        ['last_login']
+    ):
+        return
+    instance._saved_names = (
+        User.objects.filter(pk=instance.pk)
+        .values_list('username', 'first_name', 'last_name')
+        .first()
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw, update_fields, **kwargs):
+    '''Сдвигает ленты, только если имя, которое они показывают, сменилось.
+
+    Смена пароля или прав не трогает кеш; списки комментариев
+    показывают только логин, поэтому их версии — по одной на каждый
+    пост с комментарием автора — сдвигаются лишь при его смене.
+    '''
+    if raw or created or update_fields == frozenset(['last_login']):
+        return
+    old = getattr(instance, '_saved_names', None)
+    names = (instance.username, instance.first_name, instance.last_name)
+    if old == names:
+        return
+    listings.bump(
+        listings.profile_namespace(instance.pk),
+        listings.author_entity_namespace(instance.pk),
+    )
+    listings.bump_posts(instance.posts.all())
+    if old is not None and old[0] == instance.username:
+        return
+    commented = instance.comments.order_by().values_list('post_id', flat=True)
+    listings.bump(*map(listings.comments_namespace, commented.distinct()))
+
+
+@receiver(post_save, sender=User)
+def user_lookup_saved(sender, instance, raw, update_fields, **kwargs):
+    if raw or update_fields == frozenset(['last_login']):
+        return
+    lookup.index_user(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_lookup_deleted(sender, instance, **kwargs):
+    lookup.unindex(LookupTerm.USER, instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_feed_changed(sender, instance, raw=False, **kwargs):
+    if raw or kwargs.get('update_fields') == frozenset(['last_login']):
+        return
+    feeds.forget(feeds.PROFILE, instance.username)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_feed_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feeds.forget(feeds.GROUP, instance.slug)
+
+
+@receiver(post_save, sender=Group)
+def group_lookup_saved(sender, instance, raw, **kwargs):
+    if not raw:
+        lookup.index_group(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_lookup_deleted(sender, instance, **kwargs):
+    lookup.unindex(LookupTerm.GROUP, instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    listings.bump(
+        listings.group_namespace(instance.pk),
+        listings.group_entity_namespace(instance.pk),
+    )
+    listings.bump_posts(instance.posts.all())
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded', {})
+    if created:
+        counters.shift_author(instance.author_id, 'posts_count', 1)
+        counters.shift_group(instance.group_id, 1)
+        timeline.fan_out(instance)
+    else:
+        old_author_id = loaded.get('author_id', instance.author_id)
+        if old_author_id != instance.author_id:
+            counters.shift_author(old_author_id, 'posts_count', -1)
+            counters.shift_author(instance.author_id, 'posts_count', 1)
+        old_group_id = loaded.get('group_id', instance.group_id)
+        if old_group_id != instance.group_id:
+            counters.shift_group(old_group_id, -1)
+            counters.shift_group(instance.group_id, 1)
+    image = instance.image.name or None
+    old_image = None if created else loaded.get('image', image)
+    if (old_image or None) != image:
+        images.release(old_image)
+        images.retain(image)
+        thumbnails.enqueue(instance)
+    search.index_posts([instance.pk])
+    listings.bump_post(
+        instance, loaded.get('author_id'), loaded.get('group_id')
+    )
+    instance._loaded = {
+        'author_id': instance.author_id,
+        'group_id': instance.group_id,
+        'image': image,
+    }
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.shift_author(instance.author_id, 'posts_count', -1)
+    counters.shift_group(instance.group_id, -1)
+    images.release(instance.image.name)
+    search.unindex_posts([instance.pk])
+    listings.bump_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.shift_post(instance.post_id, 1)
+    search.index_comments([instance.pk])
+    listings.bump(listings.comments_namespace(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.shift_post(instance.post_id, -1)
+    search.unindex_comments([instance.pk])
+    listings.bump(listings.comments_namespace(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        counters.shift_author(instance.author_id, 'followers_count', 1)
+        counters.shift_author(instance.user_id, 'following_count', 1)
+        timeline.followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.shift_author(instance.author_id, 'followers_count', -1)
+    counters.shift_author(instance.user_id, 'following_count', -1)
+    timeline.unfollowed(instance.user_id, instance.author_id)
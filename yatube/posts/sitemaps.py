@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import tempfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import (
+    Count,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    Max,
+    OuterRef,
+    Subquery,
+)
+from django.urls import reverse
+
+from .models import Post, User
+
+POSTS = 'posts'
+PROFILES = 'profiles'
+INDEX_NAME = 'sitemap.xml'
+MANIFEST_NAME = 'manifest.json'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+# Протокол sitemaps допускает не больше 50 000 адресов в файле.
+MAX_SHARD_SIZE = 50_000
+
+
+def shard_name(kind, shard):
+    return f'{kind}-{shard}.xml'
+
+
+def shard_range(shard, size):
+    return shard * size, (shard + 1) * size
+
+
+def latest_post_date():
+    return Subquery(
+        Post.objects.filter(author=OuterRef('pk'))
+        .order_by('-pub_date')
+        .values('pub_date')[:1]
+    )
+
+
+def post_shards(size):
+    '''Отпечатки шардов постов одним GROUP BY по id // size.
+
+    Число постов ловит удаления, последнее изменение — новые посты и
+    правки, поэтому шард без изменений даёт тот же отпечаток.
+    '''
+    rows = (
+        Post.objects.order_by()
+        .annotate(
+            shard=ExpressionWrapper(
+                F('id') / size, output_field=IntegerField()
+            )
+        )
+        .values('shard')
+        .annotate(total=Count('id'), lastmod=Max('updated'))
+    )
+    return {
+        (POSTS, row['shard']): (
+            f'{row["total"]}:{row["lastmod"].isoformat()}',
+            row['lastmod'],
+        )
+        for row in rows
+    }
+
+
+def profiles(start=None, end=None):
+    '''(id, имя, дата последнего поста) авторов с постами по порядку id.'''
+    users = User.objects.annotate(lastmod=latest_post_date()).filter(
+        lastmod__isnull=False
+    )
+    if start is not None:
+        users = users.filter(pk__gte=start, pk__lt=end)
+    return users.order_by('pk').values_list('pk', 'username', 'lastmod')
+
+
+def profile_shards(size):
+    '''Отпечатки шардов профилей: хеш id, имён и дат последних постов.
+
+    Адрес профиля зависит от имени, поэтому переименование тоже
+    меняет отпечаток шарда.
+    '''
+    shards = {}
+    for pk, username, lastmod in profiles().iterator():
+        shard = PROFILES, pk // size
+        digest, newest = shards.get(shard, (hashlib.md5(), lastmod))
+        digest.update(f'{pk}:{username}:{lastmod.isoformat()};'.encode())
+        shards[shard] = digest, max(newest, lastmod)
+    return {
+        shard: (digest.hexdigest(), lastmod)
+        for shard, (digest, lastmod) in shards.items()
+    }
+
+
+def post_urls(shard, size):
+    start, end = shard_range(shard, size)
+    posts = (
+        Post.objects.filter(pk__gte=start, pk__lt=end)
+        .order_by('pk')
+        .values_list('pk', 'updated')
+    )
+    for pk, updated in posts.iterator():
+        yield reverse('posts:post_detail', args=[pk]), updated
+
+
+def profile_urls(shard, size):
+    for _, username, lastmod in profiles(*shard_range(shard, size)):
+        yield reverse('posts:profile', args=[username]), lastmod
+
+
+URLS = {POSTS: post_urls, PROFILES: profile_urls}
+
+
+def write_atomically(path, lines):
+    '''Пишет файл рядом и подменяет: краулер не увидит половину файла.'''
+    directory = os.path.dirname(path)
+    with tempfile.NamedTemporaryFile(
+        'w', dir=directory, delete=False, encoding='utf-8'
+    ) as temp:
+        temp.writelines(lines)
+    os.chmod(temp.name, 0o644)
+    os.replace(temp.name, path)
+
+
+def urlset(urls, site_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<urlset xmlns="{XMLNS}">\n'
+    for path, lastmod in urls:
+        yield (
+            f'<url><loc>{escape(site_url + path)}</loc>'
+            f'<lastmod>{lastmod.isoformat()}</lastmod></url>\n'
+        )
+    yield '</urlset>\n'
+
+
+def sitemap_index(shards, sitemap_url):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield f'<sitemapindex xmlns="{XMLNS}">\n'
+    for (kind, shard), (_, lastmod) in sorted(shards.items()):
+        location = sitemap_url + shard_name(kind, shard)
+        yield (
+            f'<sitemap><loc>{escape(location)}</loc>'
+            f'<lastmod>{lastmod.isoformat()}</lastmod></sitemap>\n'
+        )
+    yield '</sitemapindex>\n'
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def build(root=None, size=None, full=False):
+    '''Перестраивает изменившиеся шарды, возвращает (записано, оставлено).
+
+    Отпечатки шардов с прошлого запуска лежат в manifest.json. Шард
+    переписывается, только если его отпечаток изменился или файла
+    нет; шарды опустевших диапазонов удаляются. Индекс карты
+    переписывается всегда — он короткий.
+    '''
+    root = root or settings.SITEMAP_ROOT
+    size = size or settings.SITEMAP_SHARD_SIZE
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)
+    existing = manifest.get('shards', {})
+    previous = existing
+    if full or manifest.get('shard_size') != size:
+        previous = {}
+    shards = {**post_shards(size), **profile_shards(size)}
+    fingerprints = {
+        shard_name(kind, shard): fingerprint
+        for (kind, shard), (fingerprint, _) in shards.items()
+    }
+    written = 0
+    for kind, shard in shards:
+        name = shard_name(kind, shard)
+        path = os.path.join(root, name)
+        if previous.get(name) == fingerprints[name] and os.path.exists(path):
+            continue
+        write_atomically(
+            path, urlset(URLS[kind](shard, size), settings.SITE_URL)
+        )
+        written += 1
+    for name in existing.keys() - fingerprints.keys():
+        try:
+            os.remove(os.path.join(root, name))
+        except FileNotFoundError:
+            pass
+    write_atomically(
+        os.path.join(root, INDEX_NAME),
+        sitemap_index(shards, settings.SITEMAP_URL),
+    )
+    write_atomically(
+        os.path.join(root, MANIFEST_NAME),
+        [json.dumps({'shard_size': size, 'shards': fingerprints})],
+    )
+    return written, len(shards) - written
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    '''Хранит файл под именем из SHA-256 его содержимого.
+
+    upload_to поля задаёт каталог, расширение берётся из имени загрузки:
+    posts/ab/ab12…ef.jpg. Одинаковые байты пишутся один раз, поэтому
+    и миниатюры sorl, ключ которых строится по имени, строятся один раз.
+    Сколько постов ссылается на файл, считает StoredImage.
+
+    Сохраняется файл внутри транзакции Post.save(), которая затем
+    вызывает retain(): до проверки наличия файла его строка
+    блокируется, чтобы параллельный collect() не удалил файл, на
+    который вот-вот сошлётся пост. Если транзакция откатится, файл
+    останется без строки, такие файлы удаляет images.sweep().
+    '''
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_available_name(
+            self.content_name(name, content), max_length=max_length
+        )
+        return self._save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        '''Имя по содержимому не меняется, даже если файл уже есть.
+
+        Занятое имя значит те же байты. Укоротить имя нельзя — это
+        адрес, поэтому слишком длинное имя — ошибка.
+        '''
+        if max_length and len(name) > max_length:
+            raise SuspiciousFileOperation(
+                f'Имя {name!r} длиннее {max_length} символов: '
+                f'увеличьте max_length поля или укоротите upload_to.'
+            )
+        return name
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def _save(self, name, content):
+        # models импортирует это хранилище, поэтому images — здесь.
+        from .images import pin
+
+        pin(name)
+        if self.exists(name):
+            return name
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Пишем рядом и переименовываем: при гонке двух одинаковых
+        # загрузок второй rename заменит файл теми же байтами.
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            for chunk in content.chunks():
+                temp.write(chunk)
+        os.chmod(temp.name, self.file_permissions_mode or 0o644)
+        os.replace(temp.name, full_path)
+        return name
+
+
+content_storage = ContentAddressedStorage()
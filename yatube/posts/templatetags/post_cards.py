@@ -0,0 +1,11 @@
+from django import template
+
+from posts.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, hide_author_links=False, hide_group_link=False):
+    '''Карточки постов страницы одним обращением к кешу.'''
+    return render_cards(posts, hide_author_links, hide_group_link)
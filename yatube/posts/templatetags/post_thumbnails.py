@@ -0,0 +1,11 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def ready_thumbnail(post, preset):
+    '''Готовая миниатюра или None, пока воркер её не создал.'''
+    return thumbnails.post_thumbnail(post, preset)
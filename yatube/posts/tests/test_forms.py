@@ -1,17 +1,24 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Comment, Group, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def content_name(extension):
+    '''Шаблон имени файла, названного по SHA-256 содержимого.'''
+    return rf'^posts/([0-9a-f]{{2}})/\1[0-9a-f]{{62}}\{extension}$'
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTests(TestCase):
     @classmethod
@@ -92,10 +99,38 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(
                 group=form_data['group'],
                 text=form_data['text'],
-                image=f"posts/{form_data['image'].name}",
+                image__regex=content_name('.jpg'),
             ).exists()
         )
 
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_create_post_image_ingest(self):
+        '''Картинка уменьшается, поворачивается по EXIF и теряет EXIF'''
+        photo = BytesIO()
+        exif = Image.Exif()
+        # 6 — снимок повёрнут на 90°: при показе он станет портретным.
+        exif[0x0112] = 6
+        Image.new('RGB', (400, 200), 'red').save(photo, 'JPEG', exif=exif)
+        sticker = BytesIO()
+        Image.new('RGBA', (50, 50), (0, 0, 0, 0)).save(sticker, 'PNG')
+        cases = (
+            ('photo.jpeg', photo, '.jpg', (50, 100), 'JPEG'),
+            ('sticker.png', sticker, '.png', (50, 50), 'PNG'),
+        )
+        for name, content, extension, size, image_format in cases:
+            with self.subTest(name=name):
+                uploaded = SimpleUploadedFile(name, content.getvalue())
+                self.author_client.post(
+                    reverse('posts:post_create'),
+                    data={'text': name, 'image': uploaded},
+                )
+                post = Post.objects.get(text=name)
+                self.assertRegex(post.image.name, content_name(extension))
+                with Image.open(post.image) as image:
+                    self.assertEqual(image.size, size)
+                    self.assertEqual(image.format, image_format)
+                    self.assertNotIn('exif', image.info)
+
     def test_create_post_guest_client(self):
         """Проверка создания поста гостем"""
         uploaded = SimpleUploadedFile(
@@ -242,11 +277,11 @@ class PostEditFormTests(TestCase):
             (response.status_code, HTTPStatus.OK),
             (self.post.text, self.form_data['text']),
             (self.post.group.id, self.form_data['group']),
-            (self.post.image.name, f"posts/{self.form_data['image'].name}"),
         )
         for value, expected in data_for_equal:
             with self.subTest(expected=expected):
                 self.assertEqual(value, expected)
+        self.assertRegex(self.post.image.name, content_name('.jpg'))
         self.assertRedirects(
             response,
             reverse(
@@ -1,7 +1,29 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
 from django.conf import settings
-from django.test import TestCase
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from .. import images, search, sitemaps
+from ..models import (
+    AuthorStats,
+    Comment,
+    Follow,
+    Group,
+    Post,
+    StoredImage,
+    TimelineEntry,
+    User,
+)
 
-from ..models import Comment, Group, Post, User
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class PostModelTest(TestCase):
@@ -62,3 +84,435 @@ class PostModelTest(TestCase):
                     field.verbose_name, expected_data['verbose_name']
                 )
                 self.assertEqual(field.help_text, expected_data['help_text'])
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, obj, **expected):
+        obj.refresh_from_db()
+        for field, value in expected.items():
+            with self.subTest(obj=obj, field=field):
+                self.assertEqual(getattr(obj, field), value)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев следуют за записями"""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        self.assertCounters(self.author.stats, posts_count=1)
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(post, comments_count=1)
+        post.group = self.other_group
+        post.save()
+        self.assertCounters(self.group, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=1)
+        post.delete()
+        self.assertCounters(self.author.stats, posts_count=0)
+        self.assertCounters(self.other_group, posts_count=0)
+
+    def test_follow_counters(self):
+        """Счётчики подписок и подписчиков следуют за подписками"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCounters(self.author.stats, followers_count=1)
+        self.assertCounters(self.reader.stats, following_count=1)
+        follow.delete()
+        self.assertCounters(self.author.stats, followers_count=0)
+        self.assertCounters(self.reader.stats, following_count=0)
+
+    def test_recount_command_repairs_drift(self):
+        """Команда recount_counters восстанавливает счётчики"""
+        post = Post.objects.create(
+            author=self.author, text='Текст', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='1')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(user=self.author).delete()
+        Group.objects.update(posts_count=7)
+        Post.objects.update(comments_count=0)
+        call_command('recount_counters', chunk_size=1, stdout=StringIO())
+        self.assertCounters(
+            AuthorStats.objects.get(user=self.author),
+            posts_count=1,
+            followers_count=1,
+        )
+        self.assertCounters(self.group, posts_count=1)
+        self.assertCounters(self.other_group, posts_count=0)
+        self.assertCounters(post, comments_count=1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StoredImageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки хранятся одним файлом до последней ссылки"""
+        posts = [
+            Post.objects.create(
+                author=self.author,
+                text=name,
+                image=ContentFile(b'same bytes', name=name),
+            )
+            for name in ('first.gif', 'second.gif')
+        ]
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        storage = posts[0].image.storage
+        self.assertEqual(StoredImage.objects.get(name=name).references, 2)
+        posts[0].delete()
+        images.collect(name)
+        self.assertTrue(storage.exists(name))
+        posts[1].image = None
+        posts[1].save()
+        images.collect(name)
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+        # Собранный файл записывается заново при следующей загрузке.
+        post = Post.objects.create(
+            author=self.author,
+            text='third',
+            image=ContentFile(b'same bytes', name='third.gif'),
+        )
+        self.assertEqual(post.image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(StoredImage.objects.get(name=name).references, 1)
+
+    def test_sweep_rolled_back_files(self):
+        """sweep_images удаляет файлы откаченных сохранений постов"""
+        kept = Post.objects.create(
+            author=self.author,
+            text='kept',
+            image=ContentFile(b'kept bytes', name='kept.gif'),
+        )
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            orphan = Post.objects.create(
+                author=self.author,
+                text='orphan',
+                image=ContentFile(b'orphan bytes', name='orphan.gif'),
+            )
+            raise RuntimeError
+        storage = kept.image.storage
+        self.assertTrue(storage.exists(orphan.image.name))
+        self.assertFalse(
+            StoredImage.objects.filter(name=orphan.image.name).exists()
+        )
+        call_command('sweep_images', stdout=StringIO())
+        self.assertFalse(storage.exists(orphan.image.name))
+        self.assertTrue(storage.exists(kept.image.name))
+
+    def test_name_longer_than_max_length(self):
+        """Имя по содержимому длиннее max_length не сохраняется"""
+        storage = Post._meta.get_field('image').storage
+        content = ContentFile(b'bytes', name='long.gif')
+        with self.assertRaises(SuspiciousFileOperation):
+            storage.save('posts/long.gif', content, max_length=20)
+        name = storage.content_name('posts/long.gif', content)
+        self.assertGreater(len(name), 20)
+        self.assertFalse(storage.exists(name))
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def import_posts(self, content, suffix, **options):
+        '''Импортирует content, возвращает вывод в stderr.'''
+        stderr = StringIO()
+        with tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, encoding='utf-8'
+        ) as source:
+            source.write(content)
+            source.flush()
+            call_command(
+                'import_posts',
+                source.name,
+                stdout=StringIO(),
+                stderr=stderr,
+                **options,
+            )
+        return stderr.getvalue()
+
+    def test_import_jsonl(self):
+        """JSONL-импорт сохраняет даты и обновляет производные данные"""
+        records = [
+            {
+                'author': 'author',
+                'group': 'group',
+                'text': 'Импорт про котов',
+                'pub_date': '2020-01-02T03:04:05+00:00',
+                'comments': [{'author': 'reader', 'text': 'Отлично'}],
+            },
+            {'author': 'author', 'text': 'Второй'},
+            {'author': 'nobody', 'text': 'Пропускается'},
+        ]
+        self.import_posts(
+            '\n'.join(json.dumps(record) for record in records),
+            '.jsonl',
+            chunk_size=2,
+        )
+        post = Post.objects.get(text='Импорт про котов')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.comments.get().author, self.reader)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 2
+        )
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(
+            search.find(search.match_expression('котов'))[0][0], post.pk
+        )
+        self.assertFalse(Post.objects.filter(text='Пропускается').exists())
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_import_caps_timelines(self):
+        """Импорт не раздувает ленты дальше TIMELINE_MAX_LENGTH"""
+        self.import_posts(
+            '\n'.join(
+                json.dumps({'author': 'author', 'text': f'Пост {number}'})
+                for number in range(5)
+            ),
+            '.jsonl',
+            chunk_size=2,
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+
+    def test_import_skips_broken_records(self):
+        """Несуществующая дата и неверные комментарии пропускают запись"""
+        records = [
+            {'author': 'author', 'text': 'Плохая', 'pub_date': '2023-02-30'},
+            {'author': 'author', 'text': 'Плохая', 'comments': [5]},
+            {'author': 'author', 'text': 'Плохая', 'comments': 7},
+            {'author': 'author', 'text': 'Хорошая'},
+        ]
+        self.import_posts(
+            '\n'.join(json.dumps(record) for record in records), '.jsonl'
+        )
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Хорошая']
+        )
+        for model, name in ((Post, 'pub_date'), (Comment, 'created')):
+            with self.subTest(field=name):
+                field = model._meta.get_field(name)
+                self.assertTrue(field.auto_now_add)
+
+    def test_import_skips_malformed_lines(self):
+        """Неразобранные строки и поля не тех типов пропускаются"""
+        lines = [
+            json.dumps({'author': 'author', 'text': 'Первая'}),
+            '{"author": "author", "text": ',
+            '[1, 2]',
+            json.dumps({'author': ['author'], 'text': 'Плохая'}),
+            json.dumps({'author': 'author', 'group': {}, 'text': 'Плохая'}),
+            json.dumps({'author': 'author', 'text': 5}),
+            json.dumps(
+                {
+                    'author': 'author',
+                    'text': 'Плохая',
+                    'comments': [{'author': ['reader'], 'text': 'Да'}],
+                }
+            ),
+            json.dumps({'author': 'author', 'text': 'Последняя'}),
+        ]
+        stderr = self.import_posts('\n'.join(lines), '.jsonl', chunk_size=3)
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'Первая', 'Последняя'},
+        )
+        self.assertEqual(
+            stderr.splitlines(),
+            [f'Пропущена строка {line}' for line in range(2, 8)],
+        )
+
+    def test_import_strict(self):
+        """С --strict первая неверная строка обрывает импорт"""
+        content = '\n'.join(
+            [
+                json.dumps({'author': 'author', 'text': 'Первая'}),
+                json.dumps({'author': 'author', 'text': 'Вторая'}),
+                'не JSON',
+                json.dumps({'author': 'author', 'text': 'Последняя'}),
+            ]
+        )
+        with self.assertRaisesMessage(CommandError, 'Строка 3'):
+            self.import_posts(content, '.jsonl', chunk_size=2, strict=True)
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'Первая', 'Вторая'},
+        )
+        with self.assertRaisesMessage(CommandError, 'author — не строка'):
+            self.import_posts(
+                json.dumps({'author': [], 'text': 'Плохая'}),
+                '.jsonl',
+                strict=True,
+            )
+
+    def test_import_csv_creates_missing(self):
+        """CSV-импорт с --create-missing заводит авторов и группы"""
+        self.import_posts(
+            'author,group,text,pub_date\nnewcomer,new-group,Привет,\n',
+            '.csv',
+            create_missing=True,
+        )
+        post = Post.objects.get(text='Привет')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertEqual(post.group.slug, 'new-group')
+        self.assertEqual(post.author.stats.posts_count, 1)
+
+
+class SitemapTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def build(self):
+        return sitemaps.build(self.root, size=2)
+
+    def test_shards_and_index(self):
+        """Карта сайта делится на шарды, индекс ссылается на все"""
+        self.build()
+        files = set(os.listdir(self.root))
+        shards = {
+            sitemaps.shard_name(sitemaps.POSTS, post.pk // 2)
+            for post in self.posts
+        }
+        shards.add(sitemaps.shard_name(sitemaps.PROFILES, self.author.pk // 2))
+        self.assertEqual(
+            files, shards | {sitemaps.INDEX_NAME, sitemaps.MANIFEST_NAME}
+        )
+        with open(os.path.join(self.root, sitemaps.INDEX_NAME)) as index:
+            content = index.read()
+        for shard in shards:
+            self.assertIn(settings.SITEMAP_URL + shard, content)
+
+    def test_only_changed_shards_rewritten(self):
+        """Повторный запуск переписывает только изменившиеся шарды"""
+        written, _ = self.build()
+        self.assertEqual(self.build(), (0, written))
+        post = self.posts[-1]
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(self.build(), (1, written - 1))
+
+    def test_empty_shard_removed(self):
+        """Шард опустевшего диапазона удаляется"""
+        self.build()
+        post = self.posts[-1]
+        name = sitemaps.shard_name(sitemaps.POSTS, post.pk // 2)
+        Post.objects.filter(pk__gte=post.pk // 2 * 2).delete()
+        self.build()
+        self.assertNotIn(name, os.listdir(self.root))
+
+    def test_shard_size_limited(self):
+        """Шард шире протокольных 50 000 адресов не строится"""
+        for size in (0, sitemaps.MAX_SHARD_SIZE + 1):
+            with self.subTest(size=size), self.assertRaises(CommandError):
+                call_command(
+                    'build_sitemaps', output=self.root, shard_size=size
+                )
+        self.assertEqual(os.listdir(self.root), [])
+
+
+class SeedTest(TestCase):
+    def seed(self):
+        call_command(
+            'seed',
+            users=20,
+            groups=3,
+            posts=60,
+            comments=2,
+            follows=3,
+            seed=5,
+            chunk_size=7,
+            stdout=StringIO(),
+        )
+
+    def test_counts_and_counters(self):
+        """seed создаёт строки и согласованные с ними счётчики"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        for stats in AuthorStats.objects.all():
+            self.assertEqual(
+                stats.posts_count,
+                Post.objects.filter(author_id=stats.user_id).count(),
+            )
+        for post in Post.objects.all():
+            self.assertEqual(post.comments_count, post.comments.count())
+
+    def test_timelines_filled(self):
+        """Ленты подписчиков содержат посты их авторов"""
+        self.seed()
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertIsNotNone(follow)
+        self.assertTrue(
+            TimelineEntry.objects.filter(
+                user=follow.user, post__author=follow.author
+            ).exists()
+        )
+
+    def test_deterministic(self):
+        """Один и тот же seed даёт те же данные"""
+        self.seed()
+        first = list(
+            Post.objects.order_by('pk').values_list('author__username', 'text')
+        )
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed()
+        second = list(
+            Post.objects.order_by('pk').values_list('author__username', 'text')
+        )
+        self.assertEqual(first, second)
+
+    def test_seed_taken(self):
+        """Повторный запуск с тем же seed отклоняется"""
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(Post.objects.count(), 60)
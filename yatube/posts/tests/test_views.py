@@ -1,14 +1,34 @@
+import json
+import os
 import shutil
 import tempfile
+import zipfile
+from io import BytesIO, StringIO
+
 from django import forms
 from django.conf import settings
+from django.core.files.base import ContentFile
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 
-from posts.models import Comment, Follow, Group, Post, User
+from posts import search
+from posts.cards import render_cards
+from posts.models import (
+    Comment,
+    Follow,
+    Group,
+    Post,
+    ThumbnailJob,
+    TimelineEntry,
+    User,
+)
+from posts.utils import NEXT, encode_cursor
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -170,13 +190,106 @@ class PostPagesTests(TestCase):
         '''Проверка кеша главной страницы'''
         cache.clear()
         response_1 = self.guest_client.get(self.post_index)
-        Post.objects.all().delete()
+        # update() не отправляет сигналы, версия кеша остаётся прежней
+        Post.objects.update(text='Изменено в обход сигналов')
         response_2 = self.guest_client.get(self.post_index)
         self.assertEqual(response_1.content, response_2.content)
         cache.clear()
         response_3 = self.guest_client.get(self.post_index)
         self.assertNotEqual(response_1.content, response_3.content)
 
+    def test_post_cards_cache(self):
+        '''Карточка поста кешируется и обновляется при правке поста'''
+        cache.clear()
+        (card,) = render_cards(Post.objects.filter(pk=self.post.pk))
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Изменено в обход сигналов'
+        )
+        self.assertEqual(
+            render_cards(Post.objects.filter(pk=self.post.pk)), [card]
+        )
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный пост'
+        post.save()
+        (card,) = render_cards([post])
+        self.assertIn('Отредактированный пост', card)
+        self.assertNotEqual(
+            render_cards([post], hide_author_links=True), [card]
+        )
+
+    def test_post_cards_survive_neighbour_posts(self):
+        '''Новый пост автора не сбрасывает карточки, правка автора — да'''
+        cache.clear()
+        posts = Post.objects.filter(pk=self.post.pk).select_related('author')
+        (card,) = render_cards(posts.all())
+        posts.update(text='Изменено в обход сигналов')
+        Post.objects.create(
+            author=self.post.author, group=self.post.group, text='Соседний'
+        )
+        self.assertEqual(render_cards(posts.all()), [card])
+        author = User.objects.get(pk=self.post.author_id)
+        author.first_name = 'Переименованный'
+        author.save()
+        (card,) = render_cards(posts.all())
+        self.assertIn('Переименованный', card)
+
+    def test_cache_invalidated_on_write(self):
+        '''Запись поста сразу сбрасывает кеш лент'''
+        cache.clear()
+        urls = (
+            self.post_index,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(
+            text='Пост после кеширования', author=self.author, group=self.group
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Пост после кеширования')
+        self.post_1.delete()
+        response = self.guest_client.get(self.post_index)
+        self.assertNotContains(response, self.post_1.text)
+
+    def test_thumbnail_placeholder_until_worker(self):
+        '''Пока воркер не создал миниатюру, показывается заглушка'''
+        cache.clear()
+        self.assertTrue(ThumbnailJob.objects.filter(post=self.post).exists())
+        response = self.guest_client.get(self.post_detail)
+        self.assertContains(response, 'Изображение обрабатывается')
+        call_command(
+            'thumbnail_worker', processes=1, once=True, stdout=StringIO()
+        )
+        self.assertFalse(ThumbnailJob.objects.filter(post=self.post).exists())
+        for url in (self.post_detail, self.post_index):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, '<img class="card-img')
+        post = Post.objects.get(pk=self.post.pk)
+        post.image = None
+        post.save()
+        self.assertFalse(ThumbnailJob.objects.filter(post=post).exists())
+
+    def test_thumbnails_prefetched_for_page(self):
+        '''Миниатюры карточек страницы ищутся одним запросом'''
+        for ready in (False, True):
+            if ready:
+                call_command(
+                    'thumbnail_worker',
+                    processes=1,
+                    once=True,
+                    stdout=StringIO(),
+                )
+            cache.clear()
+            posts = list(Post.objects.select_related('author', 'group'))
+            with self.subTest(ready=ready), self.assertNumQueries(1):
+                cards = render_cards(posts)
+            for card in cards:
+                self.assertEqual('<img class="card-img' in card, ready)
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -230,11 +343,411 @@ class PaginatorViewsTest(TestCase):
                     len(response.context['page_obj']), page_count[0]
                 )
                 if page_count[1]:
-                    response = self.client.get(url + '?page=2')
+                    cursor = response.context['page_obj'].next_cursor
+                    response = self.client.get(url, {'cursor': cursor})
                     self.assertEqual(
                         len(response.context['page_obj']), page_count[1]
                     )
 
+    def test_pagination_previous_page(self):
+        '''Курсор предыдущей страницы возвращает на первую'''
+        cache.clear()
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        back_page = self.client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+
+    def test_pagination_broken_cursor(self):
+        '''Битый курсор отдаёт первую страницу'''
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': 'broken'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.NUMBER_OF_POSTS
+        )
+
+    def test_pagination_foreign_cursor(self):
+        '''Курсор поиска с числом вместо даты отдаёт первую страницу'''
+        cursor = encode_cursor(NEXT, (5, 3))
+        post = Post.objects.first()
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=[post.pk]),
+            reverse('api:post_list'),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.author, text='Тест пост')
+        cls.extra = 5
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Коммент #{i}')
+            for i in range(settings.NUMBER_OF_COMMENTS + cls.extra)
+        )
+        cls.newest = list(cls.post.comments.order_by('-created', '-id'))
+
+    def test_first_page_inline(self):
+        '''На странице поста только первая порция комментариев'''
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            list(comments), self.newest[: settings.NUMBER_OF_COMMENTS]
+        )
+        self.assertContains(response, 'data-more-comments')
+
+    def test_next_batch_fragment(self):
+        '''Следующая порция приходит HTML-фрагментом'''
+        first = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id}),
+            {'cursor': first.next_cursor},
+        )
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.newest[settings.NUMBER_OF_COMMENTS:],
+        )
+        self.assertNotContains(response, 'data-more-comments')
+
+    def test_next_batch_json(self):
+        '''Порции комментариев в JSON связаны курсором'''
+        url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id}
+        )
+        first = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(
+            [comment['id'] for comment in first['comments']],
+            [comment.id for comment in self.newest][
+                : settings.NUMBER_OF_COMMENTS
+            ],
+        )
+        second = self.client.get(
+            url, {'format': 'json', 'cursor': first['next_cursor']}
+        ).json()
+        self.assertEqual(len(second['comments']), self.extra)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_queries_do_not_grow_with_comments(self):
+        '''Число запросов порции не зависит от числа комментариев'''
+        url = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.id}
+        )
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.cats = [
+            Post.objects.create(
+                author=cls.author, text=f'Кошки любят молоко #{number}'
+            )
+            for number in range(settings.NUMBER_OF_POSTS + 2)
+        ]
+        cls.dogs = Post.objects.create(author=cls.author, text='Собаки')
+        cls.commented = Post.objects.create(author=cls.author, text='Без слов')
+        Comment.objects.create(
+            post=cls.commented, author=cls.author, text='Про собак'
+        )
+        cls.url = reverse('posts:search')
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        return response, response.context['page_obj']
+
+    def test_search_posts_and_comments(self):
+        '''Ищется текст постов и комментариев, текст поста весомее'''
+        _, page = self.search('собак')
+        self.assertEqual(list(page), [self.dogs, self.commented])
+        # Синтаксис FTS5 из ввода экранируется, а не исполняется.
+        _, page = self.search('"молоко')
+        self.assertEqual(len(page), settings.NUMBER_OF_POSTS)
+        self.assertEqual(list(self.search('NEAR( "')[1]), [])
+        self.assertIsNone(self.search('  ')[1])
+
+    def test_search_pagination(self):
+        '''Выдача листается курсором, ссылки сохраняют запрос'''
+        response, page = self.search('кошки')
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B8&')
+        _, next_page = self.search('кошки', cursor=page.next_cursor)
+        self.assertEqual(len(next_page), 2)
+        self.assertEqual({*page, *next_page}, set(self.cats))
+        # Курсор ленты с датой вместо оценки начинает выдачу сначала.
+        cursor = encode_cursor(NEXT, (self.cats[0].pub_date, 1))
+        _, restarted = self.search('кошки', cursor=cursor)
+        self.assertEqual(list(restarted), list(page))
+
+    def test_search_index_follows_writes(self):
+        '''Правки постов и комментариев сразу попадают в индекс'''
+        self.dogs.text = 'Теперь про хомяков'
+        self.dogs.save()
+        self.assertEqual(list(self.search('хомяк')[1]), [self.dogs])
+        self.assertEqual(list(self.search('собак')[1]), [self.commented])
+        self.commented.comments.all().delete()
+        self.assertEqual(list(self.search('собак')[1]), [])
+        Post.objects.filter(pk=self.commented.pk).update(text='Попугаи')
+        call_command('rebuild_search_index', chunk_size=3, stdout=StringIO())
+        self.assertEqual(list(self.search('попугаи')[1]), [self.commented])
+
+    def test_comment_write_touches_own_row(self):
+        '''Комментарий индексируется своей строкой, без соседей по посту'''
+        with CaptureQueriesContext(connection) as queries:
+            comment = Comment.objects.create(
+                post=self.commented, author=self.author, text='Про ежей'
+            )
+        indexed = [
+            query['sql']
+            for query in queries
+            if search.TABLE in query['sql']
+        ]
+        self.assertEqual(len(indexed), 2)
+        self.assertTrue(indexed[-1].endswith(f'WHERE id IN ({comment.pk})'))
+        self.assertEqual(list(self.search('ежей')[1]), [self.commented])
+        comment.delete()
+        self.assertEqual(list(self.search('ежей')[1]), [])
+        self.assertEqual(
+            list(self.search('собак')[1]), [self.dogs, self.commented]
+        )
+        Post.objects.filter(pk=self.commented.pk).delete()
+        self.assertEqual(list(self.search('собак')[1]), [self.dogs])
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.writer = User.objects.create_user(
+            username='leo_tolstoy', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Кошки и собаки', slug='pets', description='Описание'
+        )
+        cls.url = reverse('posts:autocomplete')
+
+    def labels(self, query):
+        response = self.client.get(self.url, {'q': query})
+        return [result['label'] for result in response.json()['results']]
+
+    def test_autocomplete_tolerates_typos(self):
+        '''Автор и группа находятся с опечатками'''
+        response = self.client.get(self.url, {'q': 'tolstoi'})
+        self.assertEqual(
+            response.json()['results'],
+            [
+                {
+                    'type': 'user',
+                    'label': 'Лев Толстой (leo_tolstoy)',
+                    'url': reverse('posts:profile', args=['leo_tolstoy']),
+                }
+            ],
+        )
+        self.assertEqual(self.labels('Толстый'), ['Лев Толстой (leo_tolstoy)'])
+        self.assertEqual(self.labels('кошкы'), ['Кошки и собаки'])
+        self.assertEqual(self.labels('zzz'), [])
+
+    def test_autocomplete_follows_writes(self):
+        '''Переименование и удаление сразу видны в подсказках'''
+        self.group.title = 'Хомяки'
+        self.group.save()
+        self.assertEqual(self.labels('хомяки'), ['Хомяки'])
+        self.assertEqual(self.labels('кошки'), [])
+        self.group.delete()
+        self.assertEqual(self.labels('хомяки'), [])
+
+    def test_admin_search_is_fuzzy(self):
+        '''Поиск групп и подписок в админке понимает опечатки'''
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'password')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.writer)
+        self.client.force_login(admin)
+        cases = (
+            ('admin:posts_group_changelist', 'кошкы', 'Кошки и собаки'),
+            ('admin:posts_follow_changelist', 'tolstoi', 'leo_tolstoy'),
+        )
+        for name, query, expected in cases:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name), {'q': query})
+                self.assertContains(response, expected)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.other = User.objects.create_user(username='Other')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author,
+                text=f'Пост #{number}',
+                image=ContentFile(b'same bytes', name=f'{number}.gif'),
+            )
+            for number in range(2)
+        ]
+        Post.objects.create(author=cls.other, text='Чужой пост')
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Свой комментарий'
+        )
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_export_jsonl(self):
+        '''JSONL-выгрузка содержит только посты и комментарии автора'''
+        response = self.author_client.get(reverse('posts:export'))
+        self.assertTrue(response.streaming)
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [(record['type'], record['id']) for record in records],
+            [
+                ('post', self.posts[0].id),
+                ('post', self.posts[1].id),
+                ('comment', self.comment.id),
+            ],
+        )
+
+    def test_export_zip(self):
+        '''Zip-выгрузка кладёт одинаковые картинки один раз'''
+        response = self.author_client.get(
+            reverse('posts:export'), {'format': 'zip'}
+        )
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content))
+        )
+        image = self.posts[0].image.name
+        self.assertEqual(
+            archive.namelist(), ['posts.jsonl', f'images/{image}']
+        )
+        self.assertEqual(archive.read(f'images/{image}'), b'same bytes')
+        self.assertEqual(
+            len(archive.read('posts.jsonl').splitlines()), 3
+        )
+
+    def test_export_command(self):
+        '''Команда export_user пишет ту же выгрузку в файл'''
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'export.jsonl')
+            call_command(
+                'export_user', 'Author', output=output, stdout=StringIO()
+            )
+            with open(output, encoding='utf-8') as exported:
+                self.assertEqual(len(exported.readlines()), 3)
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост для ленты', group=cls.group
+        )
+        cls.urls = (
+            reverse('posts:index_rss'),
+            reverse('posts:index_atom'),
+            reverse('posts:group_rss', kwargs={'slug': cls.group.slug}),
+            reverse('posts:group_atom', kwargs={'slug': cls.group.slug}),
+            reverse(
+                'posts:profile_rss', kwargs={'username': cls.author.username}
+            ),
+            reverse(
+                'posts:profile_atom',
+                kwargs={'username': cls.author.username},
+            ),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_list_posts(self):
+        '''RSS и Atom отдают посты сайта, группы и автора'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Пост для ленты')
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_repeated_poll_without_database(self):
+        '''Повторный опрос и 304 обходятся без запросов к базе'''
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with self.assertNumQueries(0):
+                    self.client.get(url)
+                    not_modified = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                    since = self.client.get(
+                        url,
+                        HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                    )
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(since.status_code, 304)
+
+    def test_new_post_changes_feed(self):
+        '''Новый пост меняет ETag и попадает в ленту'''
+        url = reverse('posts:index_rss')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Свежий пост')
+
+    def test_renamed_group_name_reused(self):
+        '''Группа, занявшая старый слаг, получает свою свежую ленту'''
+        url = reverse('posts:group_rss', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        successor = Group.objects.create(title='Новая', slug=self.group.slug)
+        self.assertNotContains(self.client.get(url), 'Пост для ленты')
+        Post.objects.create(
+            author=self.author, text='Пост новой группы', group=successor
+        )
+        self.assertContains(self.client.get(url), 'Пост новой группы')
+
+    def test_unknown_feed(self):
+        '''Лента несуществующей группы отвечает 404'''
+        response = self.client.get(
+            reverse('posts:group_rss', kwargs={'slug': 'missing'})
+        )
+        self.assertEqual(response.status_code, 404)
+
 
 class FollowTests(TestCase):
     @classmethod
@@ -286,3 +799,61 @@ class FollowTests(TestCase):
         self.follower_client.get(self.follow_url)
         response = self.user_client.get(reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_follow_page_after_unfollow(self):
+        """После отписки посты автора пропадают из ленты"""
+        self.follower_client.get(self.follow_url)
+        self.follower_client.get(
+            reverse(
+                'posts:profile_unfollow',
+                kwargs={'username': self.author.username},
+            )
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_new_post_reaches_follower_feed(self):
+        """Новый пост автора сразу попадает в ленту подписчика"""
+        self.follower_client.get(self.follow_url)
+        new_post = Post.objects.create(author=self.author, text='Свежий')
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+    def test_trim_timelines(self):
+        """Команда trim_timelines оставляет только свежие записи"""
+        self.follower_client.get(self.follow_url)
+        newest = Post.objects.create(author=self.author, text='Свежий')
+        call_command('trim_timelines', max_length=1, stdout=StringIO())
+        self.assertEqual(
+            list(
+                TimelineEntry.objects.filter(
+                    user=self.follower
+                ).values_list('post', flat=True)
+            ),
+            [newest.pk],
+        )
+
+    @override_settings(TIMELINE_MAX_LENGTH=1)
+    def test_timeline_capped_on_write(self):
+        """Лента не растёт дальше TIMELINE_MAX_LENGTH без trim_timelines"""
+        Post.objects.create(author=self.author, text='Старый')
+        self.follower_client.get(self.follow_url)
+        entries = TimelineEntry.objects.filter(user=self.follower)
+        self.assertEqual(entries.count(), 1)
+        newest = Post.objects.create(author=self.author, text='Свежий')
+        self.assertEqual(
+            list(entries.values_list('post', flat=True)), [newest.pk]
+        )
+
+    @override_settings(TIMELINE_PUSH_FOLLOWER_LIMIT=1)
+    def test_pulled_author_in_follow_page(self):
+        """Посты популярного автора подтягиваются при чтении ленты"""
+        self.follower_client.get(self.follow_url)
+        new_post = Post.objects.create(author=self.author, text='Свежий')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower).exists()
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
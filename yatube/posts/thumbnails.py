@@ -0,0 +1,186 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore
+
+from . import listings
+from .models import Post, ThumbnailJob
+
+
+def thumbnail_options(source, options):
+    '''Дополняет опции так же, как ThumbnailBackend.get_thumbnail.'''
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, name in backend.extra_options:
+        value = getattr(sorl_settings, name)
+        if value != getattr(sorl_defaults, name):
+            options.setdefault(key, value)
+    return options
+
+
+def source_file(image):
+    '''Исходник для sorl; имя файла ищется в хранилище Post.image.'''
+    if isinstance(image, str):
+        return ImageFile(image, Post._meta.get_field('image').storage)
+    return ImageFile(image)
+
+
+def thumbnail_file(image, preset):
+    '''Файл миниатюры картинки для пресета, без её создания.'''
+    geometry, options = settings.THUMBNAIL_PRESETS[preset]
+    source = source_file(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options)
+    )
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(image, preset):
+    '''Готовая миниатюра из хранилища ключей sorl или None.'''
+    if not image:
+        return None
+    return default.kvstore.get(thumbnail_file(image, preset))
+
+
+def prefetch(posts, presets=None):
+    '''Находит готовые миниатюры постов разом и кладёт их в посты.
+
+    Вместо отдельного обращения к хранилищу ключей sorl на каждую
+    картинку — один get_many к кешу и один запрос к базе за промахами.
+    Промахи кешируются так же, как это делает само хранилище.
+    '''
+    presets = presets or list(settings.THUMBNAIL_PRESETS)
+    posts = list(posts)
+    for post in posts:
+        post.prefetched_thumbnails = {}
+    wanted = [
+        (post, preset, add_prefix(thumbnail_file(post.image, preset).key))
+        for post in posts
+        if post.image
+        for preset in presets
+    ]
+    if not wanted:
+        return posts
+    if not isinstance(default.kvstore, CachedDBStore):
+        for post, preset, _ in wanted:
+            post.prefetched_thumbnails[preset] = ready_thumbnail(
+                post.image, preset
+            )
+        return posts
+    keys = {key for _, _, key in wanted}
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = keys - values.keys()
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kv_cache.set_many(
+            {key: stored.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT,
+        )
+        values.update(stored)
+    for post, preset, key in wanted:
+        value = values.get(key, EMPTY_VALUE)
+        post.prefetched_thumbnails[preset] = (
+            None if value == EMPTY_VALUE else deserialize_image_file(value)
+        )
+    return posts
+
+
+def post_thumbnail(post, preset):
+    '''Миниатюра из prefetch, а без него — отдельным обращением.'''
+    prefetched = getattr(post, 'prefetched_thumbnails', {})
+    if preset in prefetched:
+        return prefetched[preset]
+    return ready_thumbnail(post.image, preset)
+
+
+def enqueue(post):
+    '''Ставит картинку поста в очередь, если её миниатюры ещё не готовы.
+
+    Файлы названы по содержимому, поэтому повторно загруженная картинка
+    получает то же имя и уже готовые миниатюры.
+    '''
+    ready = post.image and all(
+        ready_thumbnail(post.image, preset)
+        for preset in settings.THUMBNAIL_PRESETS
+    )
+    if not post.image or ready:
+        ThumbnailJob.objects.filter(post=post).delete()
+        return
+    ThumbnailJob.objects.update_or_create(
+        post=post,
+        defaults={
+            'image': post.image.name,
+            'taken': None,
+            'attempts': 0,
+            'error': '',
+        },
+    )
+
+
+def claim(limit):
+    '''Забирает до limit задач: свободных и брошенных другим воркером.
+
+    Задача достаётся тому, чей UPDATE её изменил, поэтому несколько
+    воркеров не возьмут одну задачу дважды.
+    '''
+    now = timezone.now()
+    abandoned = now - timedelta(seconds=settings.THUMBNAIL_JOB_TIMEOUT)
+    available = ThumbnailJob.objects.filter(
+        Q(taken=None) | Q(taken__lt=abandoned),
+        attempts__lt=settings.THUMBNAIL_JOB_ATTEMPTS,
+    )
+    claimed = [
+        pk
+        for pk in available.values_list('pk', flat=True)[:limit]
+        if available.filter(pk=pk).update(
+            taken=now, attempts=F('attempts') + 1
+        )
+    ]
+    return list(ThumbnailJob.objects.filter(pk__in=claimed))
+
+
+def generate(image):
+    '''Создаёт миниатюры всех пресетов. Выполняется в процессе пула.'''
+    source = source_file(image)
+    if not source.exists():
+        raise FileNotFoundError(image)
+    for geometry, options in settings.THUMBNAIL_PRESETS.values():
+        get_thumbnail(source, geometry, **options)
+
+
+def finish(job):
+    '''Закрывает задачу и обновляет карточки поста с заглушкой.'''
+    # Пока миниатюры готовились, картинку могли заменить: тогда задача
+    # уже перезаписана и остаётся в очереди.
+    deleted, _ = ThumbnailJob.objects.filter(
+        pk=job.pk, image=job.image, taken=job.taken
+    ).delete()
+    if not deleted:
+        return
+    posts = Post.objects.filter(pk=job.post_id)
+    posts.update(updated=timezone.now())
+    listings.bump_posts(posts)
+
+
+def fail(job, error):
+    ThumbnailJob.objects.filter(pk=job.pk, taken=job.taken).update(
+        taken=None, error=str(error) or repr(error)
+    )
@@ -0,0 +1,249 @@
+from collections import defaultdict
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from .models import AuthorStats, Follow, Post, TimelineEntry, User
+from .search import in_chunks
+from .utils import FEED_KEY
+
+# SQLite ограничивает число частей UNION ALL в одном SELECT.
+COMPOUND_SELECT_LIMIT = 400
+
+
+def is_pulled(author_id):
+    '''Посты автора с большим числом подписчиков читаются, а не пишутся.'''
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_PUSH_FOLLOWER_LIMIT,
+    ).exists()
+
+
+def fan_out(post):
+    '''Раскладывает новый пост по лентам подписчиков автора.
+
+    Ленты, переросшие TIMELINE_MAX_LENGTH, тут же обрезаются.
+    '''
+    if is_pulled(post.author_id):
+        return
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True
+        )
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ),
+        ignore_conflicts=True,
+    )
+    trim_many(followers)
+
+
+def fan_out_many(posts):
+    '''Раскладывает пачку новых постов: один запрос на всех авторов.
+
+    Ленты, переросшие TIMELINE_MAX_LENGTH, тут же обрезаются.
+    Возвращает id пользователей, в ленты которых что-то добавилось.
+    '''
+    authors = {post.author_id for post in posts}
+    pulled = AuthorStats.objects.filter(
+        user_id__in=authors,
+        followers_count__gte=settings.TIMELINE_PUSH_FOLLOWER_LIMIT,
+    ).values_list('user_id', flat=True)
+    follows = Follow.objects.filter(
+        author_id__in=authors - set(pulled)
+    ).values_list('author_id', 'user_id')
+    followers = defaultdict(list)
+    for author_id, user_id in follows.iterator():
+        followers[author_id].append(user_id)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for post in posts
+            for user_id in followers[post.author_id]
+        ),
+        ignore_conflicts=True,
+    )
+    readers = {user_id for users in followers.values() for user_id in users}
+    trim_many(readers)
+    return readers
+
+
+def backfill(user_id, author_id, limit=None):
+    '''Добавляет в ленту последние посты автора, на которого подписались.'''
+    limit = limit or settings.TIMELINE_MAX_LENGTH
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=date)
+            for post_id, date in posts
+        ),
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def fill(user_id, limit=None):
+    '''Собирает ленту заново запросами INSERT ... SELECT.
+
+    От каждого раскладываемого автора берётся не больше limit свежих
+    постов по его индексу, из них в ленту идут limit самых свежих:
+    посты автора целиком не читаются и не сортируются.
+    '''
+    limit = int(limit or settings.TIMELINE_MAX_LENGTH)
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = list(
+        Follow.objects.filter(user_id=user_id)
+        .exclude(
+            author__stats__followers_count__gte=(
+                settings.TIMELINE_PUSH_FOLLOWER_LIMIT
+            )
+        )
+        .values_list('author_id', flat=True)
+    )
+    for start in range(0, len(authors), COMPOUND_SELECT_LIMIT):
+        insert_newest(
+            user_id, authors[start: start + COMPOUND_SELECT_LIMIT], limit
+        )
+    if len(authors) > COMPOUND_SELECT_LIMIT:
+        trim(user_id, limit)
+
+
+def insert_newest(user_id, authors, limit):
+    posts = Post._meta.db_table
+    newest = ' UNION ALL '.join(
+        f'''SELECT * FROM (
+            SELECT id, pub_date FROM {posts} WHERE author_id = %s
+            ORDER BY pub_date DESC, id DESC LIMIT {limit}
+        ) AS author_{number}'''
+        for number in range(len(authors))
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''INSERT INTO {TimelineEntry._meta.db_table}
+                (user_id, post_id, pub_date)
+            SELECT %s, id, pub_date FROM ({newest}) AS newest
+            ORDER BY pub_date DESC, id DESC LIMIT {limit}''',
+            [user_id, *authors],
+        )
+
+
+def remove(user_id, author_id):
+    '''Убирает из ленты посты автора после отписки.'''
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def followed(user_id, author_id):
+    if not is_pulled(author_id):
+        backfill(user_id, author_id)
+
+
+def unfollowed(user_id, author_id):
+    '''Чистит ленту после отписки.
+
+    Если автор при этом опустился ниже порога, его посты больше не
+    подтягиваются при чтении, поэтому раскладываем их по лентам
+    оставшихся подписчиков. Это происходит только в момент пересечения
+    порога и ограничено порогом, умноженным на длину ленты.
+    '''
+    remove(user_id, author_id)
+    demoted = AuthorStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.TIMELINE_PUSH_FOLLOWER_LIMIT - 1,
+    ).exists()
+    if demoted:
+        followers = Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True
+        )
+        for follower_id in followers.iterator():
+            backfill(follower_id, author_id)
+
+
+def feed_sources(user):
+    '''Источники ленты подписок для MergedCursorPaginator.
+
+    Разложенные записи читаются одним диапазоном по индексу ленты,
+    посты популярных авторов — отдельным диапазоном по каждому автору.
+    '''
+    pushed = TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+    sources = [(pushed, ('pub_date', 'post_id'), attrgetter('post'))]
+    pulled_authors = Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=(
+            settings.TIMELINE_PUSH_FOLLOWER_LIMIT
+        ),
+    ).values_list('author_id', flat=True)
+    for author_id in pulled_authors:
+        posts = Post.objects.filter(author_id=author_id).select_related(
+            'author', 'group'
+        )
+        sources.append((posts, FEED_KEY, None))
+    return sources
+
+
+def trim(user_id, max_length=None):
+    '''Обрезает ленту пользователя до max_length свежих записей.'''
+    max_length = max_length or settings.TIMELINE_MAX_LENGTH
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    cutoff = (
+        entries.order_by('-pub_date', '-post_id')
+        .values_list('pub_date', 'post_id')[max_length: max_length + 1]
+        .first()
+    )
+    if cutoff is None:
+        return 0
+    date, post_id = cutoff
+    deleted, _ = entries.filter(
+        Q(pub_date__lt=date) | Q(pub_date=date, post_id__lte=post_id)
+    ).delete()
+    return deleted
+
+
+def trim_many(user_ids, max_length=None):
+    '''Обрезает те из лент user_ids, что длиннее max_length.
+
+    Переросшие ленты находятся одним запросом на пачку читателей:
+    у каждого проверяется, есть ли запись за max_length-й по индексу
+    ленты. Обрезаются только они, остальным хватает этой проверки.
+    '''
+    max_length = max_length or settings.TIMELINE_MAX_LENGTH
+    beyond = (
+        TimelineEntry.objects.filter(user_id=OuterRef('pk'))
+        .order_by()
+        .values('id')[max_length: max_length + 1]
+    )
+    deleted = 0
+    for chunk in in_chunks(list(user_ids)):
+        overgrown = (
+            User.objects.filter(pk__in=chunk)
+            .annotate(beyond=Subquery(beyond))
+            .filter(beyond__isnull=False)
+            .values_list('pk', flat=True)
+        )
+        deleted += sum(trim(user_id, max_length) for user_id in overgrown)
+    return deleted
+
+
+def trim_all(max_length=None):
+    '''Обрезает все ленты длиннее max_length, возвращает число удалённых.'''
+    max_length = max_length or settings.TIMELINE_MAX_LENGTH
+    overgrown = (
+        TimelineEntry.objects.order_by()
+        .values('user_id')
+        .annotate(total=Count('id'))
+        .filter(total__gt=max_length)
+        .values_list('user_id', flat=True)
+    )
+    return sum(trim(user_id, max_length) for user_id in overgrown)
@@ -1,8 +1,194 @@
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_PARAM = 'cursor'
+NEXT = 'n'
+PREVIOUS = 'p'
+FEED_KEY = ('pub_date', 'id')
+COMMENT_KEY = ('created', 'id')
+
+
+def encode_cursor(direction, values):
+    '''Упаковывает направление и ключ (дата или число, id) в токен.'''
+    first, pk = values
+    if hasattr(first, 'isoformat'):
+        first = first.isoformat()
+    raw = json.dumps([direction, first, pk])
+    return base64.urlsafe_b64encode(raw.encode()).rstrip(b'=').decode()
+
+
+def decode_cursor(token):
+    '''Возвращает (направление, дата или число, id) или None.'''
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, first, pk = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(first, str):
+            first = parse_datetime(first)
+        elif not isinstance(first, (int, float)):
+            first = None
+        pk = int(pk)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if direction not in (NEXT, PREVIOUS) or first is None:
+        return None
+    return direction, first, pk
+
+
+def assign_ids(model, objects):
+    '''Проставляет id заранее, если база не возвращает их из bulk_create.
+
+    Вызывается внутри транзакции пачки, поэтому id до её коммита не
+    займёт никто другой, а при гонке пачка откатится целиком.
+    '''
+    if connection.features.can_return_ids_from_bulk_insert:
+        return
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    for number, obj in enumerate(objects, start=last + 1):
+        obj.pk = number
+
+
+class CursorPaginator(Paginator):
+    '''Keyset-пагинатор по ключу (дата, id).
+
+    Страница выбирается условием на ключ вместо COUNT(*) и OFFSET,
+    поэтому любая страница стоит одного поиска по индексу. Чтобы шаблоны
+    продолжали работать с обычным Page, номер страницы и число страниц
+    считаются относительно текущей: первая страница имеет номер 1,
+    любая другая — 2.
+    '''
+
+    # Тип первой части ключа: курсор другого пагинатора не подходит.
+    key_types = (datetime,)
+
+    def __init__(self, object_list, per_page, key=FEED_KEY):
+        super().__init__(object_list, per_page)
+        self.key = key
+        self.has_next = False
+        self.has_previous = False
+
+    @property
+    def num_pages(self):
+        return 1 + self.has_previous + self.has_next
+
+    def key_values(self, row):
+        if isinstance(row, dict):
+            return tuple(row[name] for name in self.key)
+        return tuple(getattr(row, name) for name in self.key)
+
+    def ordering(self, descending):
+        prefix = '-' if descending else ''
+        return [prefix + name for name in self.key]
+
+    def seek(self, queryset, values, descending):
+        '''Оставляет строки строго после ключа в порядке обхода.
+
+        Условие записано как «дата <= X и (дата < X или id < Y)», чтобы
+        первая часть давала диапазонный поиск по индексу.
+        '''
+        (date_field, id_field), (date, pk) = self.key, values
+        lookup = 'lt' if descending else 'gt'
+        return queryset.filter(
+            **{f'{date_field}__{lookup}e': date}
+        ).filter(
+            Q(**{f'{date_field}__{lookup}': date})
+            | Q(**{f'{id_field}__{lookup}': pk})
+        )
+
+    def accepts(self, cursor):
+        first = cursor[1]
+        return isinstance(first, self.key_types) and not isinstance(
+            first, bool
+        )
+
+    def fetch(self, values, descending, limit):
+        queryset = self.object_list
+        if values is not None:
+            queryset = self.seek(queryset, values, descending)
+        return list(queryset.order_by(*self.ordering(descending))[:limit])
+
+    def get_page(self, token):
+        cursor = decode_cursor(token)
+        if cursor is not None and not self.accepts(cursor):
+            cursor = None
+        limit = self.per_page + 1
+        self.has_next = self.has_previous = False
+        if cursor is None:
+            rows = self.fetch(None, True, limit)
+            self.has_next = len(rows) > self.per_page
+        elif cursor[0] == NEXT:
+            rows = self.fetch(cursor[1:], True, limit)
+            self.has_previous = True
+            self.has_next = len(rows) > self.per_page
+        else:
+            rows = self.fetch(cursor[1:], False, limit)
+            self.has_next = True
+            self.has_previous = len(rows) > self.per_page
+            rows = rows[: self.per_page][::-1]
+        if not rows and cursor is not None:
+            # Ключ из токена больше ничего не находит — начинаем сначала.
+            return self.get_page(None)
+        return self.make_page(rows[: self.per_page], token)
+
+    def make_page(self, rows, token):
+        page = Page(rows, 1 + self.has_previous, self)
+        page.cursor = token or ''
+        page.next_cursor = page.previous_cursor = None
+        if self.has_next:
+            page.next_cursor = encode_cursor(NEXT, self.key_values(rows[-1]))
+        if self.has_previous:
+            page.previous_cursor = encode_cursor(
+                PREVIOUS, self.key_values(rows[0])
+            )
+        return page
+
+
+class MergedCursorPaginator(CursorPaginator):
+    '''Keyset-пагинатор поверх нескольких источников.
+
+    Каждый источник — тройка (queryset, ключ, извлечение строки). Из
+    каждого берётся не больше страницы после курсора, затем потоки
+    сливаются кучей по общему ключу, повторы отбрасываются.
+    '''
+
+    def __init__(self, sources, per_page, key=FEED_KEY):
+        super().__init__(sources, per_page, key)
+        self.sources = sources
+
+    def fetch(self, values, descending, limit):
+        streams = []
+        for queryset, key, extract in self.sources:
+            source = CursorPaginator(queryset, self.per_page, key)
+            rows = source.fetch(values, descending, limit)
+            streams.append(map(extract, rows) if extract else rows)
+        merged = heapq.merge(
+            *streams, key=self.key_values, reverse=descending
+        )
+        unique = {}
+        for row in merged:
+            unique.setdefault(row.pk, row)
+            if len(unique) == limit:
+                break
+        return list(unique.values())
+
+
+def make_page(request, posts, key=FEED_KEY, per_page=None):
+    paginator = CursorPaginator(
+        posts, per_page or settings.NUMBER_OF_POSTS, key=key
+    )
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
 
 
-def make_page(request, posts):
-    paginator = Paginator(posts, settings.NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def make_merged_page(request, sources):
+    paginator = MergedCursorPaginator(sources, settings.NUMBER_OF_POSTS)
+    return paginator.get_page(request.GET.get(CURSOR_PARAM))
@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.utils.http import urlencode
 
-from .models import Follow, Group, Post, User
+from . import export, listings, lookup, search, timeline
+from .models import Follow, Group, LookupTerm, Post, User
 from .forms import CommentForm, PostForm
-from .utils import make_page
+from .utils import COMMENT_KEY, make_merged_page, make_page
 
 
 @login_required
@@ -30,7 +35,7 @@ def post_create(request):
 def post_edit(request, post_id):
     '''Редактирование поста под авторизацией.'''
     post = get_object_or_404(Post, id=post_id)
-    if post.author != request.user:
+    if post.author_id != request.user.id:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
         request.POST or None, files=request.FILES or None, instance=post
@@ -47,10 +52,15 @@ def post_edit(request, post_id):
 
 
 def index(request):
-    '''Главная страница c кешем 20 секунд.'''
+    '''Главная страница с версионированным кешем.'''
     posts = Post.objects.select_related('group', 'author')
     return render(
-        request, 'posts/index.html', {'page_obj': make_page(request, posts)}
+        request,
+        'posts/index.html',
+        {
+            'page_obj': make_page(request, posts),
+            **listings.listing_context(listings.INDEX),
+        },
     )
 
 
@@ -61,15 +71,21 @@ def group_posts(request, slug):
     return render(
         request,
         'posts/group_list.html',
-        {'group': group, 'page_obj': make_page(request, posts)},
+        {
+            'group': group,
+            'page_obj': make_page(request, posts),
+            **listings.listing_context(listings.group_namespace(group.pk)),
+        },
     )
 
 
 def profile(request, username):
     '''Страница профиля пользователя.'''
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     posts = Post.objects.select_related('group', 'author').filter(
-        author__username=username
+        author=author
     )
     following = (
         request.user.is_authenticated
@@ -83,6 +99,7 @@ def profile(request, username):
             'author': author,
             'page_obj': make_page(request, posts),
             'following': following,
+            **listings.listing_context(listings.profile_namespace(author.pk)),
         },
     )
 
@@ -90,9 +107,8 @@ def profile(request, username):
 def post_detail(request, post_id):
     '''Отдельная запись.'''
     post = get_object_or_404(
-        Post.objects.select_related('author', 'group'), id=post_id
+        Post.objects.select_related('author__stats', 'group'), id=post_id
     )
-    comments = post.comments.all().select_related('author')
     form = CommentForm()
     author = request.user.id
     return render(
@@ -102,11 +118,63 @@ def post_detail(request, post_id):
             'post': post,
             'author': author,
             'form': form,
-            'comments': comments,
+            'comments': comments_page(request, post),
         },
     )
 
 
+def comments_page(request, post):
+    '''Страница комментариев поста: от новых к старым, по курсору.'''
+    return make_page(
+        request,
+        post.comments.select_related('author'),
+        key=COMMENT_KEY,
+        per_page=settings.NUMBER_OF_COMMENTS,
+    )
+
+
+def post_comments(request, post_id):
+    '''Следующая порция комментариев: HTML-фрагмент или JSON.'''
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    comments = comments_page(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse(
+            {
+                'comments': [
+                    {
+                        'id': comment.id,
+                        'author': comment.author.username,
+                        'text': comment.text,
+                        'created': comment.created.isoformat(),
+                    }
+                    for comment in comments
+                ],
+                'next_cursor': comments.next_cursor,
+            }
+        )
+    return render(
+        request,
+        'includes/comments.html',
+        {'post': post, 'comments': comments},
+    )
+
+
+@login_required
+def export_data(request):
+    '''Выгрузка своих постов и комментариев: JSONL или zip с картинками.'''
+    fmt = request.GET.get('format')
+    if fmt not in export.FORMATS:
+        fmt = export.JSONL
+    response = StreamingHttpResponse(
+        export.stream(request.user, fmt),
+        content_type=export.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{export.filename(request.user, fmt)}"'
+    )
+    return response
+
+
 @login_required
 def add_comment(request, post_id):
     '''Добавление комментариев под авторизацией'''
@@ -122,16 +190,55 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     '''Страница постов автора, на которого подписан пользователь'''
-    posts = Post.objects.filter(author__following__user=request.user)
     return render(
         request,
         'posts/follow.html',
         {
-            'page_obj': make_page(request, posts),
+            'page_obj': make_merged_page(
+                request, timeline.feed_sources(request.user)
+            ),
+        },
+    )
+
+
+def search_posts(request):
+    '''Поиск по текстам постов и комментариев.'''
+    query = request.GET.get('q', '').strip()
+    return render(
+        request,
+        'posts/search.html',
+        {
+            'query': query,
+            'page_obj': search.make_search_page(request, query),
+            'page_query': urlencode({'q': query}) + '&',
         },
     )
 
 
+def autocomplete(request):
+    '''Авторы и группы, похожие на запрос, даже с опечатками.'''
+    terms = lookup.similar(request.GET.get('q', ''))
+    ids = {LookupTerm.USER: [], LookupTerm.GROUP: []}
+    for term in terms:
+        ids[term.kind].append(term.object_id)
+    users = User.objects.in_bulk(ids[LookupTerm.USER])
+    groups = Group.objects.in_bulk(ids[LookupTerm.GROUP])
+    results = []
+    for term in terms:
+        if term.kind == LookupTerm.USER and term.object_id in users:
+            url = reverse(
+                'posts:profile', args=[users[term.object_id].username]
+            )
+        elif term.kind == LookupTerm.GROUP and term.object_id in groups:
+            url = reverse(
+                'posts:group_list', args=[groups[term.object_id].slug]
+            )
+        else:
+            continue
+        results.append({'type': term.kind, 'label': term.label, 'url': url})
+    return JsonResponse({'results': results})
+
+
 @login_required
 def profile_follow(request, username):
     """Функция подписывания на автора."""
@@ -49,16 +49,21 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
+    'benchmarks.apps.BenchmarksConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.QueryProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -69,7 +74,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -136,6 +141,10 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки сразу пишутся во временный файл, а не держатся в памяти.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'users:logout'
@@ -143,15 +152,93 @@ CSRF_FAILURE_VIEW = 'core.views.page_not_found'
 PAGE_NOT_FOUND_VIEW = 'core.views.csrf_failure'
 NUMBER_OF_POSTS: int = 10
 NUMBER_OF_POSTS_PAGE_TWO: int = 3
+NUMBER_OF_COMMENTS: int = 20
 POST_URL: int = 0
 SLICE_LETTERS: int = 15
+# Сколько последних постов хранится в материализованной ленте подписок.
+TIMELINE_MAX_LENGTH: int = 1000
+# Посты авторов с таким числом подписчиков и больше не раскладываются
+# по лентам, а подтягиваются при чтении ленты.
+TIMELINE_PUSH_FOLLOWER_LIMIT: int = 1000
+
+# Фрагменты лент версионируются и сбрасываются при записи, поэтому
+# могут жить долго.
+LISTING_CACHE_TIMEOUT: int = 60 * 60 * 12
+# Карточка поста в ключе несёт время изменения поста, поэтому тоже
+# может жить долго.
+POST_CARD_CACHE_TIMEOUT: int = 60 * 60 * 24
+# Сколько постов в RSS/Atom. Готовая лента кешируется под версией
+# своей ленты, поэтому тоже может жить долго.
+FEED_LENGTH: int = 20
+FEED_CACHE_TIMEOUT: int = 60 * 60 * 12
+
+# Карта сайта пишется статическими файлами в SITEMAP_ROOT, их отдаёт
+# веб-сервер по адресу SITEMAP_URL. Шард — диапазон id такой ширины.
+SITE_URL = 'https://alexman2505.pythonanywhere.com'
+SITEMAP_ROOT = os.path.join(BASE_DIR, 'sitemaps')
+SITEMAP_URL = SITE_URL + '/sitemaps/'
+SITEMAP_SHARD_SIZE: int = 50_000
+
+# Куда load_test сохраняет JSON с результатами прогонов.
+BENCHMARK_ROOT = os.path.join(BASE_DIR, 'benchmark-results')
+
+# Картинки постов при загрузке уменьшаются до этой стороны и
+# пережимаются; слишком большие по числу пикселей отклоняются.
+POST_IMAGE_MAX_SIDE: int = 1920
+POST_IMAGE_MAX_PIXELS: int = 50_000_000
+POST_IMAGE_JPEG_QUALITY: int = 85
+
+# Миниатюры, которые thumbnail_worker готовит сразу после загрузки
+# картинки. Шаблоны берут их по имени и до готовности показывают заглушку.
+THUMBNAIL_PRESETS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Взятая задача, не закрытая за это время, снова выдаётся воркеру.
+THUMBNAIL_JOB_TIMEOUT: int = 60 * 10
+THUMBNAIL_JOB_ATTEMPTS: int = 3
+
+# Общий для всех процессов хоста кеш. Тестовые прогоны получают свой
+# чистый файл и временные каталоги метрик и профилей: их подменяют
+# core.testing.TestRunner и tests/conftest.py.
+CACHE_PATH = os.environ.get(
+    'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache', 'cache.sqlite3')
+)
+# Метрики запросов: каждый процесс не чаще раза в METRICS_FLUSH_INTERVAL
+# секунд пишет свой снимок в METRICS_ROOT, /metrics складывает снимки
+# всех процессов хоста. Каталог очищается при деплое.
+METRICS_ROOT = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL: int = 5
+# Профиль SQL по отпечаткам запросов включается на время разбора
+# переменной окружения; снимки процессов пишутся в SQL_PROFILE_ROOT.
+# Для запросов не быстрее SQL_PROFILE_EXPLAIN_MS сохраняется план.
+SQL_PROFILE = os.environ.get('YATUBE_SQL_PROFILE') == '1'
+SQL_PROFILE_ROOT = os.path.join(BASE_DIR, 'sql-profile')
+SQL_PROFILE_EXPLAIN_MS: int = 25
+SQL_PROFILE_FLUSH_INTERVAL: int = 5
+# Профили cProfile отдельных запросов: по заголовку X-Profile с этим
+# токеном (пустой отключает заголовок), по ?profile=1 у сотрудников и
+# для случайной доли PROFILE_SAMPLE_RATE всех запросов.
+PROFILE_TOKEN = os.environ.get('YATUBE_PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE: float = 0.0
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles')
+TEST_RUNNER = 'core.testing.TestRunner'
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': CACHE_PATH,
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+# /metrics отдаётся по заголовку Authorization: Bearer с этим токеном
+# (пустой отключает токен) или сотруднику. За прокси адрес клиента
+# всегда локальный, поэтому список адресов — только дополнительная
+# проверка.
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = INTERNAL_IPS